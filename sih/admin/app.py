@@ -1,6 +1,20 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify
-import mysql.connector
-from .db import create_connection
+import csv
+import io
+from datetime import datetime
+from common.repository import get_repository, repository_stats, RepositoryError, DuplicateKey, ForeignKeyError
+from common.repository.base import LOOKUPS
+from common.write_behind import write_behind_stats
+from common.cache import cached_json, prime, reference_cache
+from common import timetable
+from common.timetable import cached_teacher_timetable
+from common.geofence import forget_fences
+from common.credentials import authenticate, hash_new_password, credential_stats, LoginBusy
+from common.rollup import COUNTED, with_percentage
+from common import admission, archive
+from common.assets import render_page
+from .schedule_conflicts import normalize, find_conflicts, from_db, format_time
+from .provisioning import UserImporter, iter_rows, BATCH_CAPACITY, USER_TYPES
 
 
 # Create blueprint for admin
@@ -18,23 +32,20 @@ def login():
         email = request.form['email']
         password = request.form['password']
         try:
-            conn = create_connection()
-            if not conn:
+            repo = get_repository()
+            if not repo:
                 return render_template('login.html', error='Database connection failed.')
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM admins WHERE email = %s AND password = %s", (email, password))
-            admin = cursor.fetchone()
+            admin = authenticate(repo, 'Admins', email, password)
             if admin:
+                repo.commit()  # keeps an upgraded password hash
                 session['admin_logged_in'] = True
                 return redirect(url_for('admin.dashboard'))
             else:
                 return render_template('login.html', error='Invalid Credentials.')
-        except mysql.connector.Error as err:
+        except LoginBusy:
+            return render_template('login.html', error='Too many logins right now, please try again.'), 503
+        except RepositoryError as err:
             return render_template('login.html', error=f'Database error: {err}')
-        finally:
-            if 'conn' in locals() and conn.is_connected():
-                cursor.close()
-                conn.close()
     return render_template('login.html')
 
 @admin_bp.route('/logout')
@@ -57,88 +68,135 @@ def admin_required(func):
 @admin_required
 def dashboard():
     """Renders the single-page admin portal."""
-    return render_template('admin_portal.html')
+    return render_page('admin_portal.html')
+
+def required_repository():
+    """The request's repository; raises if the DB is unreachable (for cache loaders)."""
+    repo = get_repository()
+    if not repo: raise RepositoryError('Database connection failed')
+    return repo
+
+def fetch_lookup(key):
+    """Loads a reference-data list for the cache; raises if the DB is unreachable."""
+    return {'success': True, 'data': required_repository().lookup(key)}
+
+def warm_lookups():
+    """Fills the reference cache for every lookup list (worker warm-up)."""
+    for key in LOOKUPS:
+        prime(key, lambda: fetch_lookup(key))
+
+def cached_lookup(key):
+    """Serves a lookup list from the reference cache (ETag/304 aware)."""
+    try:
+        return cached_json(key, lambda: fetch_lookup(key))
+    except RepositoryError as err:
+        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
 
 @admin_bp.route('/classes')
 @admin_required
 def get_classes():
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT class_id as id, class_name as name FROM Classes ORDER BY name")
-        return jsonify({'success': True, 'data': cursor.fetchall()})
-    finally:
-        if conn and conn.is_connected(): conn.close()
+    return cached_lookup('classes')
 
 @admin_bp.route('/subjects')
 @admin_required
 def get_subjects():
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT subject_id as id, subject_name as name FROM Subjects ORDER BY subject_name")
-        return jsonify({'success': True, 'data': cursor.fetchall()})
-    finally:
-        if conn and conn.is_connected(): conn.close()
+    return cached_lookup('subjects')
 
 @admin_bp.route('/teachers')
 @admin_required
 def get_teachers():
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT teacher_id as id, name FROM Teachers ORDER BY name")
-        return jsonify({'success': True, 'data': cursor.fetchall()})
-    finally:
-        if conn and conn.is_connected(): conn.close()
+    return cached_lookup('teachers')
 
 @admin_bp.route('/api/batches')
 @admin_required
 def get_batches():
     """Provides a list of available batches from the database."""
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT batch_id as id, batch_name as name FROM Batches ORDER BY name")
-        batches = cursor.fetchall()
-        return jsonify({'success': True, 'data': batches})
-    except mysql.connector.Error as err:
-        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
+    return cached_lookup('batches')
 
 @admin_bp.route('/api/schedules')
 @admin_required
 def get_schedules():
-    teacher_id = request.args.get('teacher_id')
+    """A teacher's weekly timetable, served from the per-teacher cache."""
+    teacher_id = request.args.get('teacher_id', type=int)
     if not teacher_id: return jsonify({'success': False, 'message': 'Teacher ID is required.'}), 400
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT s.schedule_id, s.day_of_week, s.start_time, s.end_time, s.batch,
-                   c.class_name, sub.subject_name
-            FROM Schedules s
-            JOIN Classes c ON s.class_id = c.class_id
-            JOIN Subjects sub ON s.subject_id = sub.subject_id
-            WHERE s.teacher_id = %s
-            ORDER BY FIELD(s.day_of_week, 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'), s.start_time
-        """
-        cursor.execute(query, (teacher_id,))
-        schedules = cursor.fetchall()
-        for schedule in schedules:
-            schedule['start_time'] = str(schedule['start_time'])
-            schedule['end_time'] = str(schedule['end_time'])
-        return jsonify({'success': True, 'data': schedules})
-    finally:
-        if conn and conn.is_connected(): conn.close()
+        return cached_teacher_timetable(required_repository, teacher_id)
+    except RepositoryError as err:
+        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
+
+@admin_bp.route('/api/attendance_report')
+@admin_required
+def attendance_report():
+    """Attendance percentages for a batch, per student and per schedule, from the monthly rollup.
+
+    Query params: batch (required), student_id, from / to (YYYY-MM, inclusive).
+    """
+    batch = request.args.get('batch')
+    if not batch: return jsonify({'success': False, 'message': 'Batch is required.'}), 400
+    try:
+        month_from = datetime.strptime(request.args['from'], '%Y-%m').date() if request.args.get('from') else None
+        month_to = datetime.strptime(request.args['to'], '%Y-%m').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Months must be YYYY-MM.'}), 400
+
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
+    try:
+        students, schedules = repo.attendance_report(batch, month_from, month_to, request.args.get('student_id', type=int))
+        students = [with_percentage(row) for row in students]
+        schedules = [with_percentage(row) for row in schedules]
+        totals = with_percentage({column: sum(row[column] for row in students) for column in COUNTED.values()})
+        return jsonify({'success': True, 'data': {'batch': dict(totals, batch=batch), 'students': students, 'schedules': schedules}})
+    except RepositoryError as err:
+        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
+
+@admin_bp.route('/api/archives')
+@admin_required
+def list_archives():
+    """Archived terms: one entry per term and batch file."""
+    return jsonify({'success': True, 'data': [f.summary() for f in archive.archive_files()]})
+
+@admin_bp.route('/api/archive/attendance')
+@admin_required
+def archived_attendance():
+    """Historical rows read from the archive files only.
+
+    Query params: term, batch, student_id, from / to (YYYY-MM-DD, inclusive),
+    table (attendance or attendance_log), limit.
+    """
+    table = request.args.get('table', 'attendance')
+    if table not in archive.TABLES: return jsonify({'success': False, 'message': 'Unknown table.'}), 400
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD.'}), 400
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), 10000)
+    try:
+        rows = archive.history(table, request.args.get('term'), request.args.get('batch'),
+                               request.args.get('student_id', type=int), date_from, date_to)
+    except (archive.ArchiveError, OSError) as err:
+        return jsonify({'success': False, 'message': f"Archive Error: {err}"}), 500
+    return jsonify({'success': True, 'total': len(rows), 'data': rows[:limit]})
+
+@admin_bp.route('/api/archive/report')
+@admin_required
+def archived_report():
+    """Per student counts and percentages for archived terms, like /api/attendance_report."""
+    batch = request.args.get('batch')
+    if not batch: return jsonify({'success': False, 'message': 'Batch is required.'}), 400
+    try:
+        students = archive.status_counts(request.args.get('term'), batch, request.args.get('student_id', type=int))
+    except (archive.ArchiveError, OSError) as err:
+        return jsonify({'success': False, 'message': f"Archive Error: {err}"}), 500
+    totals = with_percentage({column: sum(row[column] for row in students) for column in COUNTED.values()})
+    return jsonify({'success': True, 'data': {'batch': dict(totals, batch=batch), 'students': students}})
 
 # --- API Endpoints for Data Management ---
+def schedule_values(row):
+    return (row['class_id'], row['subject_id'], row['teacher_id'], row['batch'], row['day_of_week'],
+            format_time(row['start_time']), format_time(row['end_time']))
+
 @admin_bp.route('/api/create_user', methods=['POST'])
 @admin_required
 def create_user_api():
@@ -152,33 +210,84 @@ def create_user_api():
 
     if not all([user_type, name, email, password]) or (user_type == 'student' and not batch):
         return jsonify({'success': False, 'message': 'Missing required fields.'}), 400
-    
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    if user_type not in USER_TYPES:
+        return jsonify({'success': False, 'message': 'Invalid user type.'}), 400
     try:
-        cursor = conn.cursor()
-        
-        if user_type == 'student':
-            cursor.execute("SELECT COUNT(*) FROM Students WHERE batch = %s", (batch,))
-            count = cursor.fetchone()[0]
-            if count >= 60:
-                return jsonify({'success': False, 'message': f'Error: Batch "{batch}" is full (60 students max).'}), 409
+        # Hash before the batch row is locked, so the lock is held for the insert only
+        password_hash = hash_new_password(password)
+    except LoginBusy:
+        return jsonify({'success': False, 'message': 'Server busy, please try again.'}), 503
 
-        table_name = f"{user_type.capitalize()}s"
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
+    try:
         if user_type == 'student':
-            query = f"INSERT INTO {table_name} (name, email, password, batch) VALUES (%s, %s, %s, %s)"
-            cursor.execute(query, (name, email, password, batch))
-        else:
-            query = f"INSERT INTO {table_name} (name, email, password) VALUES (%s, %s, %s)"
-            cursor.execute(query, (name, email, password))
-        conn.commit()
+            # Lock the batch row first so two concurrent inserts cannot both see 59
+            if not repo.lock_batch(batch):
+                return jsonify({'success': False, 'message': f'Error: Batch "{batch}" does not exist.'}), 400
+            if repo.count_students(batch) >= BATCH_CAPACITY:
+                return jsonify({'success': False, 'message': f'Error: Batch "{batch}" is full ({BATCH_CAPACITY} students max).'}), 409
+
+        repo.create_user(user_type, name, email, password_hash, batch)
+        repo.commit()
+        if user_type == 'teacher':
+            reference_cache.invalidate('teachers')
         return jsonify({'success': True, 'message': f"{user_type.capitalize()} created successfully!"})
-    except mysql.connector.Error as err:
-        conn.rollback()
-        if err.errno == 1062: return jsonify({'success': False, 'message': f'Error: Email "{email}" already exists.'}), 409
+    except DuplicateKey:
+        repo.rollback()
+        return jsonify({'success': False, 'message': f'Error: Email "{email}" already exists.'}), 409
+    except RepositoryError as err:
+        repo.rollback()
+        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
+
+@admin_bp.route('/api/import_users', methods=['POST'])
+@admin_required
+def import_users_api():
+    """Bulk-creates students/teachers from a streamed CSV or NDJSON upload.
+
+    Send the file as form field 'file' or as the raw request body. Query
+    options: format (csv|ndjson), user_type (default for rows without one),
+    dry_run. Returns per-line errors; valid rows are inserted in one transaction.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload: return jsonify({'success': False, 'message': 'No file uploaded.'}), 400
+        stream, filename = upload.stream, upload.filename or ''
+    else:
+        stream, filename = io.BufferedReader(request.stream), ''
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) or request.mimetype == 'application/x-ndjson' else 'csv'
+    if fmt not in ('csv', 'ndjson'): return jsonify({'success': False, 'message': 'format must be csv or ndjson.'}), 400
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
+    try:
+        importer = UserImporter(repo, default_type=request.args.get('user_type'), dry_run=dry_run)
+        try:
+            for line, row in iter_rows(stream, fmt):
+                importer.feed(line, row)
+        except (UnicodeDecodeError, csv.Error) as err:
+            repo.rollback()
+            return jsonify({'success': False, 'message': f'Could not parse upload: {err}'}), 400
+        importer.save()
+        if dry_run:
+            repo.rollback()
+        else:
+            repo.commit()
+            if importer.created['teacher']:
+                reference_cache.invalidate('teachers')
+        created = sum(importer.created.values())
+        return jsonify({
+            'success': not importer.errors,
+            'message': f"{created} users {'would be ' if dry_run else ''}created, {len(importer.errors)} rows rejected.",
+            'created': importer.created,
+            'errors': sorted(importer.errors, key=lambda error: error['line']),
+        })
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn.is_connected(): conn.close()
 
 @admin_bp.route('/api/schedule_class', methods=['POST'])
 @admin_required
@@ -188,127 +297,213 @@ def schedule_class_api():
     if not all(data.get(field) for field in required):
         return jsonify({'success': False, 'message': 'All fields, including batch, are required.'}), 400
 
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    clean, error = normalize(data)
+    if error: return jsonify({'success': False, 'message': error}), 400
+
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor()
-        conflict_query = "SELECT schedule_id FROM Schedules WHERE teacher_id = %s AND day_of_week = %s AND (%s < end_time AND %s > start_time)"
-        cursor.execute(conflict_query, (data['teacher_id'], data['day_of_week'], data['start_time'], data['end_time']))
-        if cursor.fetchone():
-            return jsonify({'success': False, 'message': 'Scheduling conflict: Teacher is already booked at this time.'}), 409
-
-        insert_query = """
-            INSERT INTO Schedules (class_id, subject_id, teacher_id, batch, day_of_week, start_time, end_time)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        values = (data['class_id'], data['subject_id'], data['teacher_id'], data['batch'], data['day_of_week'], data['start_time'], data['end_time'])
-        cursor.execute(insert_query, values)
-        conn.commit()
+        # Teacher, batch and classroom must all be free for the slot
+        existing = [from_db(row) for row in repo.overlapping_schedules(
+            clean['teacher_id'], clean['batch'], clean['class_id'], clean['day_of_week'],
+            format_time(clean['start_time']), format_time(clean['end_time']))]
+        conflicts = find_conflicts(existing, [dict(clean, ref={'row': 1})])
+        if conflicts:
+            return jsonify({'success': False, 'message': f"Scheduling conflict: {conflicts[0]['message']}", 'conflicts': conflicts}), 409
+
+        repo.insert_schedules([schedule_values(clean)])
+        repo.commit()
+        timetable.invalidate(clean)
         return jsonify({'success': True, 'message': "Class scheduled successfully!"})
-    except mysql.connector.Error as err:
-        conn.rollback()
+    except RepositoryError as err:
+        repo.rollback()
+        return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
+
+def read_timetable_upload():
+    """Rows from an uploaded CSV file (form field 'file') or a JSON {"rows": [...]} body."""
+    upload = request.files.get('file')
+    if upload:
+        return list(csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'))), request.form
+    data = request.get_json(silent=True) or {}
+    return data.get('rows') or [], data
+
+@admin_bp.route('/api/import_schedules', methods=['POST'])
+@admin_required
+def import_schedules_api():
+    """Validates a whole timetable at once and inserts the conflict-free rows in one transaction.
+
+    Options: dry_run (validate only), atomic (insert nothing unless every row is valid).
+    """
+    rows, options = read_timetable_upload()
+    if not rows: return jsonify({'success': False, 'message': 'No timetable rows provided.'}), 400
+    dry_run = str(options.get('dry_run', '')).lower() in ('1', 'true')
+    atomic = str(options.get('atomic', '')).lower() in ('1', 'true')
+
+    errors, candidates = [], []
+    for number, row in enumerate(rows, start=1):
+        clean, error = normalize(row)
+        if error:
+            errors.append({'row': number, 'message': error})
+        else:
+            candidates.append(dict(clean, ref={'row': number}))
+
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
+    try:
+        # Lock the current timetable so a concurrent import cannot slip in between check and insert
+        existing = [from_db(row) for row in repo.lock_schedules()]
+        conflicts = find_conflicts(existing, candidates)
+
+        rejected = {error['row'] for error in errors}
+        for conflict in conflicts:
+            rejected.add(conflict['schedule']['row'])
+            rejected.add(conflict['conflicts_with'].get('row'))
+        valid = [row for row in candidates if row['ref']['row'] not in rejected]
+
+        inserted = 0
+        if valid and not dry_run and not (atomic and rejected):
+            repo.insert_schedules([schedule_values(row) for row in valid])
+            repo.commit()
+            timetable.invalidate(*valid)
+            inserted = len(valid)
+        return jsonify({
+            'success': not errors and not conflicts,
+            'message': f"{inserted} of {len(rows)} schedules imported.",
+            'inserted': inserted,
+            'valid': len(valid),
+            'errors': errors,
+            'conflicts': conflicts,
+        }), 200 if not errors and not conflicts else 409
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
 
 @admin_bp.route('/api/remove_schedule', methods=['POST'])
 @admin_required
 def remove_schedule_api():
     schedule_id = request.json.get('schedule_id')
     if not schedule_id: return jsonify({'success': False, 'message': 'Schedule ID is required.'}), 400
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Schedules WHERE schedule_id = %s", (schedule_id,))
-        conn.commit()
-        if cursor.rowcount == 0:
+        removed = repo.remove_schedule(schedule_id)
+        repo.commit()
+        if not removed:
             return jsonify({'success': False, 'message': 'Schedule not found.'}), 404
+        timetable.invalidate(removed)
         return jsonify({'success': True, 'message': 'Schedule removed successfully!'})
-    except mysql.connector.Error as err:
-        conn.rollback()
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f'Database Error: {err}'}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
 
 @admin_bp.route('/api/manage_classes', methods=['POST'])
 @admin_required
 def manage_classes_api():
     data, action = request.json, request.json.get('action')
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor()
         if action == 'add':
-            cursor.execute("INSERT INTO Classes (class_name) VALUES (%s)", (data['class_name'],))
+            repo.add_class(data['class_name'], data.get('latitude'), data.get('longitude'), data.get('radius_m') or 50)
             message = "Class added successfully."
         elif action == 'remove':
-            cursor.execute("DELETE FROM Classes WHERE class_id = %s", (data['class_id'],))
+            repo.remove_class(data['class_id'])
             message = "Class removed successfully."
-        conn.commit()
+        elif action == 'set_location':
+            repo.set_class_location(data['class_id'], data.get('latitude'), data.get('longitude'), data.get('radius_m') or 50)
+            message = "Class location updated."
+        repo.commit()
+        reference_cache.invalidate('classes')
+        if action == 'remove':
+            timetable.invalidate_all()
+        forget_fences()
         return jsonify({'success': True, 'message': message})
-    except mysql.connector.Error as err:
-        conn.rollback()
-        if err.errno == 1451: return jsonify({'success': False, 'message': 'Cannot remove: this class is used in existing schedules.'}), 409
+    except ForeignKeyError:
+        repo.rollback()
+        return jsonify({'success': False, 'message': 'Cannot remove: this class is used in existing schedules.'}), 409
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
 
 @admin_bp.route('/api/manage_subjects', methods=['POST'])
 @admin_required
 def manage_subjects_api():
     data, action = request.json, request.json.get('action')
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor()
         if action == 'add':
-            cursor.execute("INSERT INTO Subjects (subject_name) VALUES (%s)", (data['subject_name'],))
+            repo.add_subject(data['subject_name'])
             message = "Subject added successfully."
         elif action == 'remove':
-            cursor.execute("DELETE FROM Subjects WHERE subject_id = %s", (data['subject_id'],))
+            repo.remove_subject(data['subject_id'])
             message = "Subject removed successfully."
-        conn.commit()
+        repo.commit()
+        reference_cache.invalidate('subjects')
+        if action == 'remove':
+            timetable.invalidate_all()
         return jsonify({'success': True, 'message': message})
-    except mysql.connector.Error as err:
-        conn.rollback()
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
 
 @admin_bp.route('/api/manage_batches', methods=['POST'])
 @admin_required
 def manage_batches_api():
     """Handles adding and removing batches."""
     data, action = request.json, request.json.get('action')
-    conn = create_connection()
-    if not conn: return jsonify({'success': False, 'message': 'Database error'}), 500
+    repo = get_repository()
+    if not repo: return jsonify({'success': False, 'message': 'Database error'}), 500
     try:
-        cursor = conn.cursor()
         if action == 'add':
-            cursor.execute("INSERT INTO Batches (batch_name) VALUES (%s)", (data['batch_name'],))
+            repo.add_batch(data['batch_name'])
             message = "Batch added successfully."
         elif action == 'remove':
-            batch_name_cursor = conn.cursor(dictionary=True)
-            batch_name_cursor.execute("SELECT batch_name FROM Batches WHERE batch_id = %s", (data['batch_id'],))
-            batch = batch_name_cursor.fetchone()
-            if batch:
-                batch_name = batch['batch_name']
-                cursor.execute("SELECT 1 FROM Students WHERE batch = %s LIMIT 1", (batch_name,))
-                if cursor.fetchone():
-                    return jsonify({'success': False, 'message': 'Cannot remove: this batch is in use by students.'}), 409
-                cursor.execute("SELECT 1 FROM Schedules WHERE batch = %s LIMIT 1", (batch_name,))
-                if cursor.fetchone():
-                    return jsonify({'success': False, 'message': 'Cannot remove: this batch is in use by schedules.'}), 409
-            
-            cursor.execute("DELETE FROM Batches WHERE batch_id = %s", (data['batch_id'],))
+            batch_name = repo.batch_name(data['batch_id'])
+            if batch_name:
+                in_use = repo.batch_in_use(batch_name)
+                if in_use:
+                    return jsonify({'success': False, 'message': f'Cannot remove: this batch is in use by {in_use}.'}), 409
+
+            repo.remove_batch(data['batch_id'])
             message = "Batch removed successfully."
-        conn.commit()
+        repo.commit()
+        reference_cache.invalidate('batches')
         return jsonify({'success': True, 'message': message})
-    except mysql.connector.Error as err:
-        conn.rollback()
-        if err.errno == 1062:
-            return jsonify({'success': False, 'message': f'Error: Batch "{data["batch_name"]}" already exists.'}), 409
+    except DuplicateKey:
+        repo.rollback()
+        return jsonify({'success': False, 'message': f'Error: Batch "{data["batch_name"]}" already exists.'}), 409
+    except RepositoryError as err:
+        repo.rollback()
         return jsonify({'success': False, 'message': f"Database Error: {err}"}), 500
-    finally:
-        if conn and conn.is_connected(): conn.close()
+
+@admin_bp.route('/api/db_stats')
+@admin_required
+def db_stats():
+    """Reports connection pool usage and wait times, plus prepared statement reuse on MySQL."""
+    return jsonify({'success': True, 'data': repository_stats()})
+
+@admin_bp.route('/api/write_behind_stats')
+@admin_required
+def write_behind_stats_api():
+    """Reports the attendance write-behind queue depth and flush counters."""
+    return jsonify({'success': True, 'data': write_behind_stats()})
+
+@admin_bp.route('/api/cache_stats')
+@admin_required
+def cache_stats():
+    """Reports hit rates and versions for the reference-data cache."""
+    return jsonify({'success': True, 'data': reference_cache.stats()})
+
+@admin_bp.route('/api/login_stats')
+@admin_required
+def login_stats():
+    """Reports password verification counts and the verifier queue."""
+    return jsonify({'success': True, 'data': credential_stats()})
+
+
+@admin_bp.route('/api/admission_stats')
+@admin_required
+def admission_stats():
+    """Reports the student endpoints' admission counts and the concurrency limiter's state."""
+    return jsonify({'success': True, 'data': admission.admission_stats()})
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import re
+
+from common.credentials import hash_new_passwords
+
+BATCH_CAPACITY = 60
+USER_TYPES = ('student', 'teacher')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def iter_rows(stream, fmt):
+    """Yield (line_number, row_dict) from a CSV or NDJSON byte stream without reading it all."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'_invalid': True}
+
+
+class UserImporter:
+    """Validates and hashes users while the upload is read, then inserts them in the caller's transaction.
+
+    `feed` checks each row on its own and hashes valid rows a chunk at a time
+    on the import pool, before any transaction is open. `save` then locks the
+    Batches rows, reads occupancy once and keeps it up to date in memory, so
+    capacity is reserved without re-counting and without racing other writers
+    that lock the same batch rows; the locks are held for the inserts only.
+    """
+
+    def __init__(self, repo, default_type=None, chunk_size=500, dry_run=False):
+        self.repo = repo
+        self.default_type = default_type
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.errors = []
+        self.created = {user_type: 0 for user_type in USER_TYPES}
+        self._seen_emails = set()
+        self._chunk = []
+        self._hashed = []  # chunks ready for `save`
+
+    def _error(self, line, email, message):
+        self.errors.append({'line': line, 'email': email, 'message': message})
+
+    def feed(self, line, row):
+        """Validate one parsed row; valid ones are hashed with the rest of their chunk."""
+        if row.get('_invalid'):
+            return self._error(line, None, 'Malformed record.')
+        clean = {key: str(row.get(key) or '').strip() for key in ('user_type', 'name', 'email', 'password', 'batch')}
+        user_type = clean['user_type'].lower() or self.default_type
+        email = clean['email'].lower()
+        if user_type not in USER_TYPES:
+            return self._error(line, email, 'user_type must be student or teacher.')
+        if not all([clean['name'], email, clean['password']]) or (user_type == 'student' and not clean['batch']):
+            return self._error(line, email, 'Missing required fields.')
+        if not EMAIL_RE.match(email):
+            return self._error(line, email, 'Invalid email address.')
+        if email in self._seen_emails:
+            return self._error(line, email, 'Duplicate email in file.')
+        self._seen_emails.add(email)
+        self._chunk.append((line, user_type, clean['name'], email, clean['password'], clean['batch']))
+        if len(self._chunk) >= self.chunk_size:
+            self._hash_chunk()
+
+    def _hash_chunk(self):
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        if not self.dry_run:
+            hashes = hash_new_passwords([row[4] for row in chunk])
+            chunk = [row[:4] + (hashed,) + row[5:] for row, hashed in zip(chunk, hashes)]
+        self._hashed.append(chunk)
+
+    def save(self):
+        """Lock the batches, then insert every hashed chunk that still fits; the caller commits."""
+        self._hash_chunk()
+        # Nothing was read before this, so the counts are current once the batch rows are locked
+        occupancy = {batch: 0 for batch in self.repo.lock_batches()}
+        for batch, count in self.repo.students_per_batch().items():
+            if batch in occupancy:
+                occupancy[batch] = count
+        chunks, self._hashed = self._hashed, []
+        for chunk in chunks:
+            self._insert(chunk, occupancy)
+
+    def _insert(self, chunk, occupancy):
+        """Check one chunk against the DB and capacity, then insert it in one bulk insert per user type."""
+        existing = {
+            user_type: self.repo.existing_emails(user_type, [row[3] for row in chunk if row[1] == user_type])
+            for user_type in USER_TYPES
+        }
+        inserts = {user_type: [] for user_type in USER_TYPES}
+        for line, user_type, name, email, password, batch in chunk:
+            if email in existing[user_type]:
+                self._error(line, email, f'Email "{email}" already exists.')
+            elif user_type == 'student':
+                if batch not in occupancy:
+                    self._error(line, email, f'Unknown batch "{batch}".')
+                    continue
+                if occupancy[batch] >= BATCH_CAPACITY:
+                    self._error(line, email, f'Batch "{batch}" is full ({BATCH_CAPACITY} students max).')
+                    continue
+                occupancy[batch] += 1
+                inserts['student'].append((name, email, password, batch))
+            else:
+                inserts['teacher'].append((name, email, password))
+        for user_type, rows in inserts.items():
+            if rows and not self.dry_run:
+                self.repo.insert_users(user_type, rows)
+            self.created[user_type] += len(rows)
@@ -0,0 +1,120 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+REQUIRED_FIELDS = ['class_id', 'subject_id', 'teacher_id', 'batch', 'day_of_week', 'start_time', 'end_time']
+
+# Each resource that can be double-booked, and the message used when it is.
+RESOURCES = {
+    'teacher_id': 'Teacher is already booked at this time.',
+    'batch': 'Batch already has a class at this time.',
+    'class_id': 'Classroom is already booked at this time.',
+}
+
+
+def resource_key(value):
+    """A resource value as MySQL's default collation compares it: text ignores case."""
+    return value.casefold() if isinstance(value, str) else value
+
+
+def with_keys(row):
+    """`row` plus the `keys` its resources are bucketed by in `find_conflicts`."""
+    row['keys'] = {resource: resource_key(row[resource]) for resource in RESOURCES}
+    return row
+
+
+def to_seconds(value):
+    """Seconds since midnight for 'HH:MM', 'HH:MM:SS' or a MySQL TIME (timedelta)."""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    parts = [int(p) for p in str(value).strip().split(':')]
+    if len(parts) == 2:
+        parts.append(0)
+    hours, minutes, seconds = parts
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(value)
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def normalize(row):
+    """Validate one timetable row; returns (clean_row, error_message)."""
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        return None, f"Missing fields: {', '.join(missing)}"
+    day = str(row['day_of_week']).strip().capitalize()
+    if day not in DAYS:
+        return None, f"Invalid day_of_week: {row['day_of_week']}"
+    try:
+        start, end = to_seconds(row['start_time']), to_seconds(row['end_time'])
+        clean = {
+            'class_id': int(row['class_id']),
+            'subject_id': int(row['subject_id']),
+            'teacher_id': int(row['teacher_id']),
+            'batch': str(row['batch']).strip(),
+            'day_of_week': day,
+        }
+    except (TypeError, ValueError):
+        return None, 'Invalid ids or times.'
+    if start >= end:
+        return None, 'start_time must be before end_time.'
+    clean['start_time'], clean['end_time'] = start, end
+    return with_keys(clean), None
+
+
+def find_conflicts(existing, new):
+    """Report every overlap that involves at least one row from `new`.
+
+    `existing` and `new` are lists of normalized rows (see `normalize`); each
+    must carry a `ref` identifying it in the report. Rows are bucketed per
+    (resource, key, day), so 'b1' and 'B1' are the same batch, and each bucket is swept in start-time order with
+    a heap of active intervals, so the cost is O(N log N) plus the number of
+    conflicts found. Overlaps inside `new` are reported as well.
+    """
+    buckets = defaultdict(list)
+    for is_new, rows in ((False, existing), (True, new)):
+        for row in rows:
+            for resource in RESOURCES:
+                buckets[(resource, row['keys'][resource], row['day_of_week'])].append(
+                    (row['start_time'], row['end_time'], is_new, row['ref'], row[resource]))
+
+    conflicts = []
+    for (resource, _, day), intervals in buckets.items():
+        if len(intervals) < 2:
+            continue
+        intervals.sort(key=lambda interval: interval[0])
+        active = []  # heap of (end_time, counter, interval)
+        for counter, interval in enumerate(intervals):
+            start, end, is_new, ref, value = interval
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for _, _, (_, _, other_is_new, other_ref, other_value) in active:
+                if is_new or other_is_new:
+                    conflicts.append({
+                        'resource': resource,
+                        'value': value if is_new else other_value,
+                        'day_of_week': day,
+                        'schedule': ref if is_new else other_ref,
+                        'conflicts_with': other_ref if is_new else ref,
+                        'message': RESOURCES[resource],
+                    })
+            heapq.heappush(active, (end, counter, interval))
+    return conflicts
+
+
+def from_db(row):
+    """Normalize a Schedules row as returned by the connector."""
+    return with_keys({
+        'ref': {'schedule_id': row['schedule_id']},
+        'class_id': row['class_id'],
+        'subject_id': row['subject_id'],
+        'teacher_id': row['teacher_id'],
+        'batch': row['batch'],
+        'day_of_week': row['day_of_week'],
+        'start_time': to_seconds(row['start_time']),
+        'end_time': to_seconds(row['end_time']),
+    })
+
+
+def format_time(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
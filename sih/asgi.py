@@ -0,0 +1,260 @@
+"""ASGI entry point: the student scan endpoints as coroutines, the rest of the portal as before.
+
+    uvicorn asgi:app            # or: hypercorn asgi:app
+
+mark_attendance, get_schedule, get_results and get_attendance run on the
+event loop and reach the database through one AsyncRepositoryPool, so a
+single worker process can hold hundreds of in-flight scans while only
+DB_POOL_SIZE threads touch the database. Every other route is handed to the
+Flask app on a small thread pool, unchanged. main.py stays the WSGI entry
+point for a fully synchronous deployment.
+"""
+import asyncio
+import contextvars
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+
+from common import admission, metrics
+from common.repository.aio import create_pool
+from student import aio as student_aio
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ASGI_WSGI_THREADS': 16,        # threads serving the routes that still run through WSGI
+}
+
+ASYNC_VIEWS = {
+    'student.mark_attendance': student_aio.mark_attendance,
+    'student.get_schedule': student_aio.get_schedule,
+    'student.get_results': student_aio.get_results,
+    'student.get_attendance': student_aio.get_attendance,
+}
+
+SPOOL_BYTES = 1024 * 1024  # request bodies for the WSGI routes stay in memory up to this size
+
+
+class Request:
+    """The parts of an HTTP request the coroutine views read."""
+    __slots__ = ('method', 'path', 'args', 'headers', 'body', 'session')
+
+    def __init__(self, scope, body, session):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+        self.session = session
+
+    def get_json(self):
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+class PortalASGI:
+    """Dispatches ASYNC_VIEWS on the event loop and everything else to the WSGI app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        for key, value in DEFAULT_CONFIG.items():
+            flask_app.config.setdefault(key, value)
+        self.db = None
+        self._wsgi_executor = None
+        self._urls = flask_app.url_map.bind('localhost')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        self._start()
+        endpoint, view_args = self._match(scope)
+        if endpoint in ASYNC_VIEWS:
+            return await self._async_view(endpoint, view_args, scope, receive, send)
+        return await self._wsgi(scope, receive, send)
+
+    # --- Lifecycle ---
+
+    def _start(self):
+        if self.db is None:
+            if self.flask_app.config['WARM_UP']:
+                from main import warm_up
+                warm_up(self.flask_app)
+            self.db = create_pool(self.flask_app, self.flask_app.config['STUDENT_DB_NAME'])
+            self._wsgi_executor = ThreadPoolExecutor(self.flask_app.config['ASGI_WSGI_THREADS'],
+                                                     thread_name_prefix='asgi-wsgi')
+
+    def _stop(self):
+        if self.db is not None:
+            self.db.close()
+            self._wsgi_executor.shutdown(wait=True)
+            self.db = self._wsgi_executor = None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self._start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- Coroutine views ---
+
+    def _match(self, scope):
+        try:
+            return self._urls.match(scope['path'], scope['method'])
+        except HTTPException:
+            return None, None  # let Flask produce the 404/405/redirect
+
+    def _session(self, scope):
+        """The Flask session from the signed cookie; these views only read it."""
+        cookie_name = self.flask_app.config['SESSION_COOKIE_NAME']
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                morsel = SimpleCookie(value.decode('latin-1')).get(cookie_name)
+                if morsel is None:
+                    continue
+                serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+                try:
+                    return serializer.loads(morsel.value,
+                                            max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+                except BadSignature:
+                    return {}
+        return {}
+
+    async def _async_view(self, endpoint, view_args, scope, receive, send):
+        started = time.perf_counter()
+        body = b''.join([chunk async for chunk in _body_chunks(receive)])
+        request = Request(scope, body, self._session(scope))
+        with self.flask_app.app_context():
+            limited = admission.applies(endpoint)
+            result = await admission.admit_async(endpoint, request.session.get('student_id')) if limited else None
+            if result is None:
+                try:
+                    result = await ASYNC_VIEWS[endpoint](request, self.db, **view_args)
+                finally:
+                    if limited:
+                        admission.release()
+            payload, status, headers = result if len(result) == 3 else (*result, {})
+            if isinstance(payload, bytes):
+                content, mimetype = payload, 'application/json'  # already serialized (cached bodies)
+            else:
+                response = self.flask_app.json.response(payload)  # same body and mimetype as jsonify()
+                content, mimetype = response.get_data(), response.mimetype
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, scope['method'], str(status))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', mimetype.encode()), (b'content-length', str(len(content)).encode()),
+                        *((name.lower().encode(), value.encode()) for name, value in headers.items())],
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    # --- Everything else, through WSGI ---
+
+    async def _wsgi(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        async for chunk in _body_chunks(receive):
+            body.write(chunk)
+        body.seek(0)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+            return body.write  # the legacy write() callable; Flask never uses it
+
+        # One context for the whole response, so a streamed body sees the request it was started in
+        context = contextvars.copy_context()
+        try:
+            iterable = await loop.run_in_executor(self._wsgi_executor, context.run, self.flask_app,
+                                                  wsgi_environ(scope, body), start_response)
+            try:
+                chunks = iter(iterable)
+                first = await loop.run_in_executor(self._wsgi_executor, context.run, next, chunks, None)
+                await send({
+                    'type': 'http.response.start',
+                    'status': response['status'],
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in response['headers']],
+                })
+                chunk = first
+                while chunk is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await loop.run_in_executor(self._wsgi_executor, context.run, next, chunks, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    await loop.run_in_executor(self._wsgi_executor, context.run, iterable.close)
+        finally:
+            body.close()
+
+
+async def _body_chunks(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        yield message.get('body', b'')
+        if not message.get('more_body'):
+            return
+
+
+def wsgi_environ(scope, body):
+    """A PEP 3333 environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,  # the whole body is buffered, so it can be read to EOF without a length
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(config=None):
+    from main import create_app
+    return PortalASGI(create_app(config))
+
+
+app = create_asgi_app()
@@ -0,0 +1,13 @@
+"""Load tests for the attendance hot paths.
+
+Run from the sih/ directory against a scratch database (it is wiped and
+re-seeded, so never point it at real data):
+
+    python -m bench run --out before.json                 # seed, boot main.app, replay every scenario
+    python -m bench run --scenario scan_burst --no-seed   # reuse the last seed
+    python -m bench compare before.json after.json        # exit 1 if a route's p95 got worse
+
+By default the app runs on a throwaway SQLite file (WAL mode), so no
+database server is needed. With --backend mysql the settings come from
+--db-host/--db-user/--db-password/--db-name (default database: portal_bench).
+"""
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from bench import __doc__ as USAGE
+from bench.load import SCENARIOS
+
+
+def commit_id():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(options):
+    """Create the scratch database if needed and build the app against it."""
+    if options.backend == 'mysql':
+        import mysql.connector
+
+        server = mysql.connector.connect(host=options.db_host, user=options.db_user, password=options.db_password)
+        try:
+            server.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{options.db_name}`")
+        finally:
+            server.close()
+
+    from main import create_app
+    return create_app(dict(
+        DB_BACKEND=options.backend,
+        SQLITE_PATH=options.sqlite_path or os.path.join(tempfile.mkdtemp(prefix='bench-db-'), 'portal.db'),
+        DB_HOST=options.db_host, DB_USER=options.db_user, DB_PASSWORD=options.db_password,
+        DB_NAME=options.db_name, STUDENT_DB_NAME=options.db_name,
+        DB_POOL_SIZE=options.pool_size,
+        ATTENDANCE_JOURNAL_DIR=tempfile.mkdtemp(prefix='bench-journal-'),
+        # Match the seeded hashes so logins don't re-hash at production cost mid-run
+        PASSWORD_HASH_ALGORITHM='pbkdf2_sha256', PASSWORD_PBKDF2_ITERATIONS=1000,
+        # Let the session setup log everyone in at full concurrency instead of answering LoginBusy
+        LOGIN_QUEUE_LIMIT=options.concurrency,
+    ))
+
+
+def run(options):
+    from common.db import pooled_connection
+    from common.migrate import migrate
+    from common.repository import repository_session
+    from bench.load import replay
+    from bench.seed import seed
+
+    app = prepare_database(options)
+    with app.app_context():
+        if options.backend == 'mysql':
+            with pooled_connection(options.db_name) as conn:
+                migrate(conn)
+        with repository_session(options.db_name) as repo:
+            summary = None
+            if options.seed:
+                summary = seed(repo, batches=options.batches, teachers=options.teachers, months=options.months)
+            results = replay(app, repo, options)
+
+    report = {
+        'meta': {
+            'commit': commit_id(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'options': {key: value for key, value in vars(options).items()
+                        if key not in ('db_password', 'command', 'out')},
+        },
+        'seed': summary,
+        'scenarios': results,
+    }
+    if options.out:
+        with open(options.out, 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+        print(f"Wrote {options.out}")
+    return 0
+
+
+def compare(options):
+    """Print per-route p95 and throughput changes; exit 1 when a p95 regressed past the threshold."""
+    with open(options.before) as handle:
+        before = json.load(handle)
+    with open(options.after) as handle:
+        after = json.load(handle)
+    regressions = 0
+    for scenario, result in after['scenarios'].items():
+        old_routes = before['scenarios'].get(scenario, {}).get('routes', {})
+        for route, stats in result['routes'].items():
+            old = old_routes.get(route)
+            if not old:
+                print(f"{scenario:<16} {route:<40} new")
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+            worse = change > options.threshold and stats['p95_ms'] - old['p95_ms'] > options.min_ms
+            regressions += worse
+            print(f"{scenario:<16} {route:<40} p95 {old['p95_ms']:>8} -> {stats['p95_ms']:>8} ms ({change:+.0%})  "
+                  f"rps {old['rps']} -> {stats['rps']}{'  REGRESSION' if worse else ''}")
+    return 1 if regressions else 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m bench', description=USAGE,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed the scratch database and replay scenarios')
+    run_parser.add_argument('--scenario', dest='scenarios', action='append', choices=list(SCENARIOS),
+                            help='scenario to run (repeatable, default: all)')
+    run_parser.add_argument('--out', help='write the JSON report here')
+    run_parser.add_argument('--no-seed', dest='seed', action='store_false', help='keep the data from the last run')
+    run_parser.add_argument('--batches', type=int, default=4)
+    run_parser.add_argument('--teachers', type=int, default=12)
+    run_parser.add_argument('--months', type=int, default=3)
+    run_parser.add_argument('--concurrency', type=int, default=64, help='client threads for burst scenarios')
+    run_parser.add_argument('--duration', type=float, default=10.0, help='seconds for the polling scenarios')
+    run_parser.add_argument('--admins', type=int, default=4)
+    run_parser.add_argument('--admin-email', default='admin@example.com')
+    run_parser.add_argument('--admin-password', default='admin123')
+    run_parser.add_argument('--pool-size', type=int, default=10)
+    run_parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite',
+                            help='database backend for the app under test (default: sqlite)')
+    run_parser.add_argument('--sqlite-path', help='SQLite file to use (default: a fresh temporary file)')
+    run_parser.add_argument('--db-host', default=os.environ.get('BENCH_DB_HOST', 'localhost'))
+    run_parser.add_argument('--db-user', default=os.environ.get('BENCH_DB_USER', 'root'))
+    run_parser.add_argument('--db-password', default=os.environ.get('BENCH_DB_PASSWORD', ''))
+    run_parser.add_argument('--db-name', default='portal_bench')
+
+    compare_parser = commands.add_parser('compare', help='diff two JSON reports')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative p95 increase')
+    compare_parser.add_argument('--min-ms', type=float, default=1.0, help='ignore p95 changes smaller than this')
+
+    options = parser.parse_args(argv[1:])
+    if options.command == 'run':
+        options.scenarios = options.scenarios or list(SCENARIOS)
+        return run(options)
+    return compare(options)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
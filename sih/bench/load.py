@@ -0,0 +1,328 @@
+"""Boots main.app on a local port and replays the benchmark scenarios against it over HTTP."""
+import http.client
+import itertools
+import json
+import queue
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from bench.seed import DAYS, PASSWORD
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    # HTTP/1.1 so each simulated user reuses one connection, like a browser would
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Server:
+    """The Flask app on a background thread, serving one thread per connection."""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self._server = make_server(host, port, app, threaded=True, request_handler=KeepAliveHandler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name='bench-server', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._thread.join()
+
+
+class Recorder:
+    """Latency samples and error counts per route label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._errors = {}
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self._samples.setdefault(route, []).append(seconds)
+            if not ok:
+                self._errors[route] = self._errors.get(route, 0) + 1
+
+    def summary(self, wall_seconds):
+        routes = {}
+        with self._lock:
+            for route, samples in sorted(self._samples.items()):
+                ordered = sorted(samples)
+                routes[route] = {
+                    'count': len(ordered),
+                    'errors': self._errors.get(route, 0),
+                    'rps': round(len(ordered) / wall_seconds, 1) if wall_seconds else None,
+                    'mean_ms': round(1000 * sum(ordered) / len(ordered), 2),
+                    'p50_ms': percentile_ms(ordered, 50),
+                    'p95_ms': percentile_ms(ordered, 95),
+                    'p99_ms': percentile_ms(ordered, 99),
+                    'max_ms': round(1000 * ordered[-1], 2),
+                }
+        total = sum(route['count'] for route in routes.values())
+        return {'wall_s': round(wall_seconds, 3), 'requests': total,
+                'rps': round(total / wall_seconds, 1) if wall_seconds else None, 'routes': routes}
+
+
+def percentile_ms(ordered, pct):
+    """Nearest-rank percentile of sorted samples (seconds), in milliseconds."""
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return round(1000 * ordered[rank - 1], 2)
+
+
+class Client:
+    """One simulated user: a persistent connection plus that user's session cookie."""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.cookie = None
+        self._conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, route, json_body=None, form=None, record=True):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        started = time.perf_counter()
+        try:
+            self._conn.request(method, path, body=body, headers=headers)
+            response = self._conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            self._conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            if record:
+                self.recorder.add(route, time.perf_counter() - started, False)
+            return None, b''
+        if record:
+            # a redirect here means the session was lost and the app bounced us to a login page
+            self.recorder.add(route, time.perf_counter() - started, response.status < 300 or response.status == 304)
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, payload
+
+    def close(self):
+        self._conn.close()
+
+
+def run_jobs(jobs, concurrency):
+    """Run callables on `concurrency` threads; returns wall-clock seconds."""
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+
+    def worker():
+        while True:
+            try:
+                job = pending.get_nowait()
+            except queue.Empty:
+                return
+            job()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def run_for(seconds, clients, step):
+    """Each client calls `step(client)` back to back for `seconds`; returns wall-clock seconds."""
+    deadline = time.perf_counter() + seconds
+
+    def loop(client):
+        while time.perf_counter() < deadline:
+            step(client)
+
+    return run_jobs([lambda client=client: loop(client) for client in clients], len(clients))
+
+
+# --- Scenarios ---
+
+class Context:
+    """Seeded IDs and logged-in clients shared by the scenarios."""
+
+    def __init__(self, app, port, repo, options):
+        self.app = app
+        self.port = port
+        self.options = options
+        self.students = [tuple(row.values()) for row in repo.select_rows('Students', ('student_id', 'email', 'batch'))]
+        self.teachers = [tuple(row.values()) for row in repo.select_rows('Teachers', ('teacher_id', 'email'))]
+        self.batches = [row['batch_name'] for row in repo.select_rows('Batches', ('batch_name',))]
+        # Sunday has no classes; use last Monday's timetable, and its seeded scans, instead.
+        today = date.today()
+        self.class_date = today if today.weekday() < len(DAYS) else today - timedelta(days=today.weekday())
+        self.todays_schedules = [tuple(row.values()) for row in repo.schedules_on(DAYS[self.class_date.weekday()])]
+        self.fences = {schedule_id: repo.classroom_fence(schedule_id) for schedule_id, _, _ in self.todays_schedules}
+        self.student_clients = {}
+        self.teacher_clients = {}
+        self.admin_clients = []
+
+    def close(self):
+        for client in [*self.student_clients.values(), *self.teacher_clients.values(), *self.admin_clients]:
+            client.close()
+
+
+def login_storm(ctx, recorder):
+    """Every student and teacher logs in at once (start of the day)."""
+    clients = {}
+
+    def student_login(student_id, email):
+        client = clients[('student', student_id)] = Client(ctx.port, recorder)
+        client.request('POST', '/student/login', 'POST /student/login', form={'email': email, 'password': PASSWORD})
+
+    def teacher_login(teacher_id, email):
+        client = clients[('teacher', teacher_id)] = Client(ctx.port, recorder)
+        client.request('POST', '/teacher/login', 'POST /teacher/login', json_body={'email': email, 'password': PASSWORD})
+
+    jobs = [lambda s=s: student_login(s[0], s[1]) for s in ctx.students]
+    jobs += [lambda t=t: teacher_login(t[0], t[1]) for t in ctx.teachers]
+    wall = run_jobs(jobs, ctx.options.concurrency)
+    ctx.student_clients = {key[1]: client for key, client in clients.items() if key[0] == 'student'}
+    ctx.teacher_clients = {key[1]: client for key, client in clients.items() if key[0] == 'teacher'}
+    return wall
+
+
+OFF_CAMPUS_EVERY = 5        # every fifth student scans from outside the classroom fence
+OFF_CAMPUS_OFFSET = 0.01    # degrees of latitude, about 1.1 km
+
+
+def scan_burst(ctx, recorder):
+    """Each batch's first class of the day: all 60 students scan the QR code at once.
+
+    Most scan from inside their classroom's fence and are Present at once;
+    the off-campus ones stay Pending for `bulk_approvals`.
+    """
+    from common.qr_tokens import issue_token
+
+    first_class = {}
+    for schedule_id, batch, _ in ctx.todays_schedules:
+        first_class.setdefault(batch, schedule_id)
+    with ctx.app.app_context():
+        tokens = {batch: issue_token(schedule_id)[0] for batch, schedule_id in first_class.items()}
+
+    def scan(student_id, batch):
+        client = ctx.student_clients[student_id]
+        client.recorder = recorder
+        latitude, longitude, _ = ctx.fences[first_class[batch]]
+        if student_id % OFF_CAMPUS_EVERY == 0:
+            latitude += OFF_CAMPUS_OFFSET
+        client.request('POST', '/student/mark_attendance', 'POST /student/mark_attendance',
+                       json_body={'qr_code': tokens[batch], 'latitude': latitude, 'longitude': longitude})
+
+    jobs = [lambda s=s: scan(s[0], s[2]) for s in ctx.students if s[2] in tokens]
+    return run_jobs(jobs, ctx.options.concurrency)
+
+
+def teacher_polling(ctx, recorder):
+    """Every teacher refreshes today's attendance back to back."""
+    clients = list(ctx.teacher_clients.values())
+    for client in clients:
+        client.recorder = recorder
+    return run_for(ctx.options.duration, clients,
+                   lambda client: client.request('GET', '/teacher/today_attendance', 'GET /teacher/today_attendance'))
+
+
+def bulk_approvals(ctx, recorder):
+    """Teachers approve every pending scan of today's classes, one request per class.
+
+    Each teacher works through their own classes one after another, on their
+    one connection; the teachers run in parallel.
+    """
+    class_date = ctx.class_date.isoformat()
+    classes = {}
+    for schedule_id, _, teacher_id in ctx.todays_schedules:
+        if teacher_id in ctx.teacher_clients:
+            classes.setdefault(teacher_id, []).append(schedule_id)
+
+    def approve(teacher_id, schedule_ids):
+        client = ctx.teacher_clients[teacher_id]
+        client.recorder = recorder
+        for schedule_id in schedule_ids:
+            client.request('POST', '/teacher/bulk_update_status', 'POST /teacher/bulk_update_status', json_body={
+                'status': 'Present', 'filter': {'schedule_id': schedule_id, 'date': class_date, 'status': 'Pending'}})
+
+    jobs = [lambda t=t, s=s: approve(t, s) for t, s in classes.items()]
+    return run_jobs(jobs, ctx.options.concurrency)
+
+
+def admin_dashboard(ctx, recorder):
+    """Admins open the dashboard and its lookups, a schedule list and a batch report, repeatedly."""
+    admin_email, admin_password = ctx.options.admin_email, ctx.options.admin_password
+    if not ctx.admin_clients:
+        for _ in range(ctx.options.admins):
+            client = Client(ctx.port, recorder)
+            client.request('POST', '/admin/', 'POST /admin/', form={'email': admin_email, 'password': admin_password},
+                           record=False)
+            ctx.admin_clients.append(client)
+    teacher_ids = [teacher[0] for teacher in ctx.teachers]
+    turns = itertools.count()
+
+    def load(client):
+        client.recorder = recorder
+        turn = next(turns)
+        client.request('GET', '/admin/dashboard', 'GET /admin/dashboard')
+        for path in ('/admin/classes', '/admin/subjects', '/admin/teachers', '/admin/api/batches'):
+            client.request('GET', path, f'GET {path}')
+        client.request('GET', f"/admin/api/schedules?teacher_id={teacher_ids[turn % len(teacher_ids)]}",
+                       'GET /admin/api/schedules')
+        client.request('GET', f"/admin/api/attendance_report?batch={ctx.batches[turn % len(ctx.batches)]}",
+                       'GET /admin/api/attendance_report')
+
+    return run_for(ctx.options.duration, ctx.admin_clients, load)
+
+
+# In replay order: later scenarios rely on the sessions and scans of earlier ones.
+SCENARIOS = {
+    'login_storm': login_storm,
+    'scan_burst': scan_burst,
+    'teacher_polling': teacher_polling,
+    'bulk_approvals': bulk_approvals,
+    'admin_dashboard': admin_dashboard,
+}
+
+
+def replay(app, repo, options, log=print):
+    """Run the selected scenarios in order; returns {scenario: summary}."""
+    results = {}
+    with Server(app) as server:
+        ctx = Context(app, server.port, repo, options)
+        try:
+            for name, scenario in SCENARIOS.items():
+                needed = name in options.scenarios or (name == 'login_storm' and options.scenarios)
+                if not needed:
+                    continue
+                recorder = Recorder()
+                wall = scenario(ctx, recorder)
+                if name in options.scenarios:
+                    results[name] = recorder.summary(wall)
+                    log(format_summary(name, results[name]))
+        finally:
+            ctx.close()
+    return results
+
+
+def format_summary(name, summary):
+    lines = [f"{name}: {summary['requests']} requests in {summary['wall_s']} s ({summary['rps']} req/s)"]
+    for route, stats in summary['routes'].items():
+        lines.append(f"  {route:<40} n={stats['count']:<6} err={stats['errors']:<4} "
+                     f"p50={stats['p50_ms']:>8} p95={stats['p95_ms']:>8} p99={stats['p99_ms']:>8} ms")
+    return '\n'.join(lines)
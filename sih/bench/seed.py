@@ -0,0 +1,108 @@
+"""Deterministic benchmark data: batches of 60, a week of schedules, months of attendance."""
+import random
+from datetime import date, datetime, time, timedelta
+
+from common.credentials import hash_password
+
+BATCH_SIZE = 60
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+SLOT_START_HOUR = 9
+CAMPUS = (28.6139, 77.2090)
+PASSWORD = 'bench-password'
+# Cheap hash so logging in hundreds of simulated users doesn't dominate the run.
+BENCH_HASH_PARAMS = ('pbkdf2_sha256', 1000)
+INSERT_CHUNK = 2000
+ATTENDANCE_COLUMNS = ('student_id', 'schedule_id', 'date', 'status', 'latitude', 'longitude')
+SCHEDULE_COLUMNS = ('class_id', 'subject_id', 'teacher_id', 'batch', 'day_of_week', 'start_time', 'end_time')
+
+# Children before parents, so DELETE order satisfies the foreign keys.
+TABLES = ['attendance_rollup', 'attendance', 'attendance_log', 'Schedules', 'Students',
+          'Teachers', 'Classes', 'Subjects', 'Batches']
+
+
+def _chunks(rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        yield rows[start:start + INSERT_CHUNK]
+
+
+def seed(repo, batches=4, teachers=12, slots_per_day=6, months=3, today=None, seed=1, log=print):
+    """Wipe the benchmark tables and insert a reproducible dataset; returns a summary dict.
+
+    Every batch has `slots_per_day` one-hour classes on each of DAYS. History
+    covers `months` x 30 days before `today`, with roughly 85% Present, 5%
+    Denied and 10% still Pending.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    password = hash_password(PASSWORD, BENCH_HASH_PARAMS)
+    repo.clear_tables(TABLES)
+
+    batch_names = [f"B{n + 1}" for n in range(batches)]
+    repo.insert_rows('Batches', ('batch_name',), [(name,) for name in batch_names])
+    repo.insert_rows('Subjects', ('subject_name',), [(f"Subject {n + 1}",) for n in range(slots_per_day)])
+    repo.insert_rows(
+        'Classes', ('class_name', 'latitude', 'longitude', 'radius_m'),
+        [(f"Room {n + 1}", CAMPUS[0] + n * 0.001, CAMPUS[1], 50) for n in range(batches)]
+    )
+    repo.insert_rows(
+        'Teachers', ('name', 'email', 'password'),
+        [(f"Teacher {n + 1}", f"teacher{n + 1}@bench.local", password) for n in range(teachers)]
+    )
+    repo.insert_rows(
+        'Students', ('name', 'email', 'password', 'batch'),
+        [(f"Student {b}-{n + 1}", f"{b.lower()}.{n + 1}@bench.local", password, b)
+         for b in batch_names for n in range(BATCH_SIZE)]
+    )
+
+    ids = {}
+    for table, key in (('Classes', 'class_id'), ('Subjects', 'subject_id'), ('Teachers', 'teacher_id')):
+        ids[table] = [row[key] for row in repo.select_rows(table, (key,))]
+    students = {}
+    for row in repo.select_rows('Students', ('student_id', 'batch')):
+        students.setdefault(row['batch'], []).append(row['student_id'])
+
+    # Each batch keeps its own room; teachers rotate so no one teaches two batches at once.
+    schedules = []
+    for b, batch in enumerate(batch_names):
+        for d, day in enumerate(DAYS):
+            for slot in range(slots_per_day):
+                start = time(SLOT_START_HOUR + slot)
+                end = time(SLOT_START_HOUR + slot + 1)
+                teacher = ids['Teachers'][(b + slot * batches + d) % teachers]
+                schedules.append((ids['Classes'][b], ids['Subjects'][slot], teacher, batch, day, start, end))
+    repo.insert_rows('Schedules', SCHEDULE_COLUMNS, schedules)
+    # IDs are handed out in insert order, so they line up with `schedules`
+    by_day = {}
+    for row, (_, _, _, batch, day, start, _) in zip(repo.select_rows('Schedules', ('schedule_id',)), schedules):
+        by_day.setdefault(day, []).append((row['schedule_id'], batch, start))
+
+    rows = 0
+    history = []
+    for offset in range(months * 30, 0, -1):
+        day = today - timedelta(days=offset)
+        if day.weekday() >= len(DAYS):
+            continue
+        for schedule_id, batch, start in by_day[DAYS[day.weekday()]]:
+            scanned = datetime.combine(day, start) + timedelta(minutes=rng.randint(0, 10))
+            for student_id in students[batch]:
+                roll = rng.random()
+                status = 'Present' if roll < 0.85 else 'Denied' if roll < 0.90 else 'Pending'
+                history.append((student_id, schedule_id, scanned, status,
+                                CAMPUS[0] + rng.uniform(-0.0003, 0.0003), CAMPUS[1] + rng.uniform(-0.0003, 0.0003)))
+        if len(history) >= INSERT_CHUNK:
+            rows += _insert_history(repo, history)
+            history = []
+    rows += _insert_history(repo, history)
+
+    repo.rebuild_rollup()
+    repo.commit()
+    summary = {'batches': batches, 'students': batches * BATCH_SIZE, 'teachers': teachers,
+               'schedules': len(schedules), 'attendance_rows': rows}
+    log(f"Seeded {summary}")
+    return summary
+
+
+def _insert_history(repo, history):
+    for chunk in _chunks(history):
+        repo.insert_rows('attendance', ATTENDANCE_COLUMNS, chunk)
+    return len(history)
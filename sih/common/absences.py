@@ -0,0 +1,203 @@
+"""End-of-class absence finalization.
+
+A student who never scans has no attendance row. Once a class has ended
+(plus ABSENCE_GRACE_MINUTES) `finalize_slot` writes an Absent row for every
+student of its batch that has none, with one INSERT ... SELECT anti-join,
+turns the class's leftover Pending scans into Absent and counts both in the
+rollup, all in one transaction. The (schedule_id, class_date) row it claims
+in finalized_slots turns a re-run, or another worker racing it, into a no-op.
+
+Only classes that were held are finalized: a slot nobody scanned for (a
+holiday, a class added mid-week) is left alone. Every run looks back
+ABSENCE_CATCH_UP_DAYS days, so classes that ended while nothing was running
+are finalized by the next run.
+
+Run it from cron, from the sih/ directory:
+
+    python -m common.absences run
+
+or set ABSENCE_FINALIZER to run it in a background thread of each worker
+process, which wakes up as each class ends.
+"""
+import os
+import sys
+import threading
+from datetime import datetime, time, timedelta
+
+from flask import current_app, has_app_context
+
+from common.repository import RepositoryError, repository_session
+from common.repository.base import clock
+from common.journal import get_journal
+from common.feed import attendance_changes
+from common import rollup
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ABSENCE_FINALIZER': False,       # finalize classes from a background thread in each worker
+    'ABSENCE_GRACE_MINUTES': 10,      # finalize a class this long after its end_time
+    'ABSENCE_CATCH_UP_DAYS': 7,       # how far back each run looks for classes it missed
+    'ABSENCE_POLL_SECONDS': 300,      # longest the background thread sleeps between runs
+}
+
+# Schedules.day_of_week values, indexed by date.weekday()
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+_finalizer = None
+_finalizer_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def finalize_slot(repo, slot, day):
+    """Finalize one class (a `Repository.due_slots` row) held on `day`, without committing.
+
+    Returns (absent, expired_ids), or None when the class was already finalized.
+    """
+    schedule_id = slot['schedule_id']
+    if not repo.claim_slot(schedule_id, day):
+        return None
+    started_at = datetime.combine(day, time.fromisoformat(clock(slot['start_time'])))
+    absent = repo.insert_absences(schedule_id, slot['batch'], day, started_at)
+    if absent:
+        repo.add_absences_to_rollup(schedule_id, day, rollup.month_of(day))
+
+    scans = repo.lock_scans(schedule_id, day, day + timedelta(days=1), 'Pending')
+    locked = {row['id']: (row['student_id'], row['schedule_id'], row['date'], row['status']) for row in scans}
+    expired = list(locked)
+    if expired:
+        repo.set_status(expired, 'Absent', 'expired')
+        rollup.apply(repo, rollup.status_transitions(locked, expired, 'Absent'))
+    repo.record_finalized(schedule_id, day, absent, len(expired))
+    return absent, expired
+
+
+def finalize_due(repo, now=None, log=print):
+    """Finalize every held class that ended within the catch-up window, one transaction each.
+
+    Returns [(schedule_id, day, absent, expired)] for the classes this run finalized.
+    """
+    now = now or datetime.now()
+    cutoff = now - timedelta(minutes=config_value('ABSENCE_GRACE_MINUTES'))
+    finalized = []
+    for days_back in range(config_value('ABSENCE_CATCH_UP_DAYS'), -1, -1):
+        day = cutoff.date() - timedelta(days=days_back)
+        ended_by = cutoff.strftime('%H:%M:%S') if days_back == 0 else None
+        for slot in repo.due_slots(DAYS[day.weekday()], day, ended_by):
+            try:
+                result = finalize_slot(repo, slot, day)
+                repo.commit()
+            except RepositoryError:
+                repo.rollback()
+                raise
+            if result is None:
+                continue
+            absent, expired = result
+            journal = get_journal()
+            for attendance_id in expired:
+                journal.update_status(attendance_id, 'Absent', verification='expired')
+            finalized.append((slot['schedule_id'], day, absent, len(expired)))
+            log(f"Finalized schedule {slot['schedule_id']} on {day}: {absent} absent, {len(expired)} pending expired.")
+    if finalized:
+        attendance_changes.notify()
+    return finalized
+
+
+def seconds_until_next(repo, now=None):
+    """Seconds until the next class of the day becomes due, capped at ABSENCE_POLL_SECONDS."""
+    now = now or datetime.now()
+    grace = timedelta(minutes=config_value('ABSENCE_GRACE_MINUTES'))
+    poll = config_value('ABSENCE_POLL_SECONDS')
+    cutoff = now - grace
+    end_time = repo.next_slot_end(DAYS[cutoff.weekday()], cutoff.strftime('%H:%M:%S'))
+    if end_time is None:
+        return poll
+    due = datetime.combine(cutoff.date(), time.fromisoformat(end_time)) + grace
+    return min(max((due - now).total_seconds(), 1.0), poll)
+
+
+class AbsenceFinalizer:
+    """Runs `finalize_due` in a background thread of one worker process.
+
+    Every worker may run one: the claim in finalized_slots lets exactly one
+    of them finalize each class.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='absence-finalizer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                delay = self._tick()
+            self._stop.wait(delay)
+
+    def _tick(self):
+        try:
+            with repository_session() as repo:
+                finalize_due(repo, log=self.app.logger.info)
+                return seconds_until_next(repo)
+        except RepositoryError as e:
+            self.app.logger.warning("Absence finalization failed: %s", e)
+            return config_value('ABSENCE_POLL_SECONDS')
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+def start_finalizer(app):
+    """Start this process's finalizer if ABSENCE_FINALIZER is set; safe to call on every request."""
+    global _finalizer
+    if _finalizer is None and app.config.get('ABSENCE_FINALIZER'):
+        with _finalizer_lock:
+            if _finalizer is None:
+                _finalizer = AbsenceFinalizer(app)
+    return _finalizer
+
+
+def stop_finalizer():
+    if _finalizer is not None:
+        _finalizer.stop()
+
+
+def _reset_after_fork():
+    # The thread does not survive a fork; the child starts its own on first request
+    global _finalizer, _finalizer_lock
+    _finalizer, _finalizer_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _start_on_request():
+    start_finalizer(current_app._get_current_object())
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.before_request(_start_on_request)
+
+
+def main(argv):
+    from main import create_app
+
+    if len(argv) < 2 or argv[1] != 'run':
+        print(__doc__)
+        return 2
+    with create_app().app_context(), repository_session() as repo:
+        finalized = finalize_due(repo)
+    print(f"Finalized {len(finalized)} classes.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
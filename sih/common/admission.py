@@ -0,0 +1,306 @@
+"""Admission control for the student endpoints: a token bucket per student and a global concurrency limit.
+
+In a QR burst every scan, and every retry a client fires in a loop, would
+otherwise go straight to the database and could take every pooled
+connection from the teachers and admins. In front of the student blueprint:
+
+- each student's scans draw on a token bucket (ADMISSION_SCAN_BURST scans
+  back to back, refilled at ADMISSION_SCAN_RATE per second); past that the
+  client gets 429 with Retry-After until its bucket refills;
+- at most ADMISSION_MAX_CONCURRENT student requests use the database at
+  once (keep it below DB_POOL_SIZE). Up to ADMISSION_QUEUE_SIZE more wait
+  their turn in arrival order for at most ADMISSION_QUEUE_TIMEOUT, and
+  anything beyond that is answered 429 straight away.
+
+The same limiter serves WSGI threads and asgi.py's coroutines. Like the
+other in-memory state the limits and counts are per process. The counts
+are at /admin/api/admission_stats and in /metrics.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import current_app, g, has_app_context, request, session
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ADMISSION_CONTROL': True,
+    'ADMISSION_SCAN_RATE': 0.5,       # scans per second a student's bucket refills
+    'ADMISSION_SCAN_BURST': 5,        # scans a student can make back to back
+    'ADMISSION_MAX_CONCURRENT': 8,    # student requests using the database at once
+    'ADMISSION_QUEUE_SIZE': 128,      # requests waiting for a slot before new ones are shed
+    'ADMISSION_QUEUE_TIMEOUT': 2.0,   # longest a request waits for a slot, in seconds
+}
+
+# Student endpoints that hold a database connection for the whole request. Login has
+# its own queue (LOGIN_QUEUE_LIMIT) and the export streams on a connection of its own.
+LIMITED = frozenset({'student.mark_attendance', 'student.get_schedule', 'student.get_results',
+                     'student.get_attendance'})
+RATE_LIMITED = frozenset({'student.mark_attendance'})
+BUCKETS_KEPT = 100_000  # students tracked; the least recently seen are forgotten (a new bucket starts full)
+
+# Limiter outcomes, also the counter names
+ADMITTED = 'admitted'       # a slot was free
+QUEUED = 'queued'           # got a slot after waiting
+FULL = 'shed_queue_full'    # the wait queue was full
+TIMED_OUT = 'shed_timeout'  # waited ADMISSION_QUEUE_TIMEOUT without getting a slot
+RATE = 'shed_rate'          # the student's bucket was empty
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+class TokenBuckets:
+    """A token bucket per key, refilled lazily whenever it is used."""
+
+    def __init__(self, rate, burst, capacity=BUCKETS_KEPT):
+        self.rate = rate
+        self.burst = burst
+        self.capacity = capacity
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of the last update)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.capacity:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def give_back(self, key):
+        """Return a token taken for a request that was then shed for another reason."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.burst, tokens + 1), updated)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class _LoopWaiter:
+    """threading.Event's set / is_set for a coroutine, which awaits `future` instead of blocking."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self._set = False
+
+    def set(self):
+        self._set = True
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+    def is_set(self):
+        return self._set
+
+
+class ConcurrencyLimiter:
+    """`limit` holders at once, then a FIFO queue of at most `queue_size` waiters.
+
+    A release hands its slot straight to the oldest waiter, so a newcomer
+    cannot overtake the queue.
+    """
+
+    def __init__(self, limit, queue_size, timeout):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _enter(self, make_waiter):
+        """(outcome, None) when decided at once, else (None, waiter) after queueing `make_waiter()`."""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return ADMITTED, None
+            if len(self._waiters) >= self.queue_size:
+                return FULL, None
+            waiter = make_waiter()
+            self._waiters.append(waiter)
+            return None, waiter
+
+    def _give_up(self, waiter):
+        with self._lock:
+            if waiter.is_set():
+                return QUEUED  # handed a slot just as the wait ran out
+            self._waiters.remove(waiter)
+            return TIMED_OUT
+
+    def acquire(self):
+        """Block until admitted or shed; returns the outcome."""
+        outcome, waiter = self._enter(threading.Event)
+        if waiter is None:
+            return outcome
+        return QUEUED if waiter.wait(self.timeout) else self._give_up(waiter)
+
+    async def acquire_async(self):
+        """`acquire` for a coroutine: waiting in the queue does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        outcome, waiter = self._enter(lambda: _LoopWaiter(loop))
+        if waiter is None:
+            return outcome
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+            return QUEUED
+        except asyncio.TimeoutError:
+            return self._give_up(waiter)
+        except asyncio.CancelledError:
+            # Leave the queue, and pass on a slot that was handed over as the task was cancelled
+            if self._give_up(waiter) == QUEUED:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes on; `active` is unchanged
+            else:
+                self.active -= 1
+
+
+class AdmissionControl:
+    """The per-student buckets and the concurrency limiter of one process, with their counts."""
+
+    def __init__(self, rate, burst, limit, queue_size, timeout):
+        self.buckets = TokenBuckets(rate, burst)
+        self.limiter = ConcurrencyLimiter(limit, queue_size, timeout)
+        self._counts = dict.fromkeys((ADMITTED, QUEUED, RATE, FULL, TIMED_OUT), 0)
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def _over_rate(self, endpoint, student_id):
+        if endpoint not in RATE_LIMITED or student_id is None:
+            return None
+        wait = self.buckets.take(student_id)
+        if wait:
+            self._count(RATE)
+            return wait
+        return None
+
+    def _decide(self, endpoint, student_id, outcome):
+        self._count(outcome)
+        if outcome in (ADMITTED, QUEUED):
+            return None
+        if endpoint in RATE_LIMITED and student_id is not None:
+            self.buckets.give_back(student_id)
+        return 1.0
+
+    def admit(self, endpoint, student_id):
+        """None once the request holds a slot (`release` it after), else seconds to tell the client to wait."""
+        wait = self._over_rate(endpoint, student_id)
+        if wait is not None:
+            return wait
+        return self._decide(endpoint, student_id, self.limiter.acquire())
+
+    async def admit_async(self, endpoint, student_id):
+        wait = self._over_rate(endpoint, student_id)
+        if wait is not None:
+            return wait
+        return self._decide(endpoint, student_id, await self.limiter.acquire_async())
+
+    def release(self):
+        self.limiter.release()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {'counts': counts, 'active': self.limiter.active, 'waiting': self.limiter.waiting,
+                'max_concurrent': self.limiter.limit, 'queue_size': self.limiter.queue_size,
+                'students_tracked': len(self.buckets)}
+
+
+def get_admission():
+    """The process-wide admission control, built from the config on first use."""
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionControl(
+                    config_value('ADMISSION_SCAN_RATE'),
+                    config_value('ADMISSION_SCAN_BURST'),
+                    config_value('ADMISSION_MAX_CONCURRENT'),
+                    config_value('ADMISSION_QUEUE_SIZE'),
+                    config_value('ADMISSION_QUEUE_TIMEOUT'),
+                )
+    return _admission
+
+
+def _reset_after_fork():
+    # Slots held by the parent's requests mean nothing in the child
+    global _admission, _admission_lock
+    _admission, _admission_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def applies(endpoint):
+    return endpoint in LIMITED and config_value('ADMISSION_CONTROL')
+
+
+def rejection(retry_after):
+    """The 429 answer, as (payload, status, headers)."""
+    return ({"status": "fail", "message": "Too many requests right now, please try again shortly."}, 429,
+            {"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+async def admit_async(endpoint, student_id):
+    """For asgi.py: None once admitted (call `release` when done), else the 429 answer."""
+    retry_after = await get_admission().admit_async(endpoint, student_id)
+    return None if retry_after is None else rejection(retry_after)
+
+
+def release():
+    get_admission().release()
+
+
+def admit_request():
+    """before_request for the student blueprint."""
+    if not applies(request.endpoint):
+        return None
+    retry_after = get_admission().admit(request.endpoint, session.get("student_id"))
+    if retry_after is not None:
+        return rejection(retry_after)
+    g.admission_slot = True
+    return None
+
+
+def release_request(exc=None):
+    """teardown_request for the student blueprint: frees the slot `admit_request` took."""
+    if g.pop('admission_slot', False):
+        release()
+
+
+def admission_stats():
+    stats = get_admission().stats()
+    stats['enabled'] = config_value('ADMISSION_CONTROL')
+    return stats
@@ -0,0 +1,390 @@
+"""Hot/cold archiving: closed terms move out of the live attendance tables into column files.
+
+`archive_term` copies one term's `attendance` and `attendance_log` rows,
+batch by batch, into one compressed, column-oriented file per term and
+batch (ARCHIVE_DIR/<term>/<batch>.cols). After the file is safely renamed
+into place it deletes the rows from the live tables, along with the term's
+attendance_rollup months. The live tables keep only open terms, and old
+data stays readable through `history` and `status_counts`, which read the
+files alone.
+
+A file is the magic bytes, a JSON header and one zlib block per column:
+ids and timestamps are delta-encoded int64s, coordinates float64s, and
+names, statuses and QR codes dictionary-encoded. Rows are sorted by
+student, so a student's rows are found by bisecting one column, and a
+query decompresses only the columns it returns.
+
+Archiving is safe to re-run. A row changed after it was copied stays in
+the live table until the next run, which merges it into the existing file.
+
+Run it from the sih/ directory once a term has ended (months are inclusive):
+
+    python -m common.archive run --term 2025-odd --from 2025-07 --to 2025-12
+    python -m common.archive list
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from operator import itemgetter
+from urllib.parse import quote, unquote
+
+from flask import current_app, has_app_context
+
+from common.rollup import COUNTED, with_percentage
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ARCHIVE_DIR': 'attendance_archive',
+    'ARCHIVE_COMPRESSION_LEVEL': 9,
+    'ARCHIVE_CHUNK_ROWS': 1000,     # rows per fetch, and per delete transaction
+    'ARCHIVE_OPEN_FILES': 32,       # files whose decoded columns stay in memory
+}
+
+MAGIC = b'PORTALC1'
+SUFFIX = '.cols'
+TERM_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+NULL_INT = -2 ** 63
+EPOCH = datetime(1970, 1, 1)
+
+# Archived columns and how each is encoded, per table
+TABLES = {
+    'attendance': {'id': 'int', 'student_id': 'int', 'name': 'text', 'schedule_id': 'int', 'date': 'time',
+                   'status': 'text', 'verification': 'text', 'latitude': 'float', 'longitude': 'float',
+                   'updated_at': 'time'},
+    'attendance_log': {'id': 'int', 'student_id': 'int', 'qr_code': 'text', 'latitude': 'float',
+                       'longitude': 'float', 'timestamp': 'time'},
+}
+SORT_KEYS = {'attendance': ('student_id', 'date', 'id'), 'attendance_log': ('student_id', 'timestamp', 'id')}
+TIME_COLUMNS = {'attendance': 'date', 'attendance_log': 'timestamp'}
+
+_open_files = OrderedDict()  # path -> (mtime_ns, ArchiveFile)
+_open_files_lock = threading.Lock()
+
+
+class ArchiveError(Exception):
+    """A term that cannot be archived, or a file that is not an archive."""
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+# --- Column encoding ---
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _pack(kind, values, level):
+    """(header entry, compressed block) for one column."""
+    meta = {'kind': kind}
+    if kind == 'text':
+        codes = {}
+        data = array('I', [codes.setdefault(value, len(codes)) for value in values])
+        meta['values'] = list(codes)
+    elif kind == 'float':
+        data = array('d', [float('nan') if value is None else float(value) for value in values])
+    else:
+        ints = [NULL_INT if value is None else _micros(value) if kind == 'time' else int(value) for value in values]
+        if NULL_INT not in ints:
+            # Sorted ids and timestamps turn into small, repetitive deltas that compress well
+            ints = [b - a for a, b in zip([0] + ints, ints)]
+            meta['delta'] = True
+        data = array('q', ints)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return meta, zlib.compress(data.tobytes(), level)
+
+
+def _unpack(meta, block):
+    kind = meta['kind']
+    data = array({'text': 'I', 'float': 'd'}.get(kind, 'q'))
+    data.frombytes(zlib.decompress(block))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    if kind == 'text':
+        values = meta['values']
+        return [values[code] for code in data]
+    if kind == 'float':
+        return [None if value != value else value for value in data]
+    ints = list(accumulate(data)) if meta.get('delta') else data
+    if kind == 'time':
+        return [None if value == NULL_INT else EPOCH + timedelta(microseconds=value) for value in ints]
+    return [None if value == NULL_INT else value for value in ints]
+
+
+def write_archive(path, header, tables, level):
+    """Write {table: rows} as one column file, replacing `path` atomically."""
+    header = dict(header, format=1, tables={})
+    blocks, offset = [], 0
+    for table, rows in tables.items():
+        rows = sorted(rows, key=itemgetter(*SORT_KEYS[table]))
+        columns = {}
+        for name, kind in TABLES[table].items():
+            meta, block = _pack(kind, [row[name] for row in rows], level)
+            columns[name] = dict(meta, offset=offset, length=len(block))
+            blocks.append(block)
+            offset += len(block)
+        times = [row[TIME_COLUMNS[table]] for row in rows if row[TIME_COLUMNS[table]] is not None]
+        header['tables'][table] = {'rows': len(rows), 'first': min(times, default=None),
+                                   'last': max(times, default=None), 'columns': columns}
+    encoded = json.dumps(header, separators=(',', ':'), default=str).encode()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(4, 'little'))
+        f.write(encoded)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+# --- Reading ---
+
+class ArchiveFile:
+    """One term x batch file. Columns are decompressed on first use and kept."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ArchiveError(f"{path} is not an archive file")
+            length = int.from_bytes(f.read(4), 'little')
+            self.header = json.loads(f.read(length))
+        self.data_start = len(MAGIC) + 4 + length
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    @property
+    def term(self):
+        return self.header['term']
+
+    @property
+    def batch(self):
+        return self.header['batch']
+
+    def summary(self):
+        return {'term': self.term, 'batch': self.batch, 'from': self.header['from'], 'to': self.header['to'],
+                'archived_at': self.header['archived_at'], 'bytes': os.path.getsize(self.path),
+                'rows': {table: info['rows'] for table, info in self.header['tables'].items()}}
+
+    def column(self, table, name):
+        """Every value of one column, in the file's (student, time) order."""
+        key = (table, name)
+        with self._lock:
+            values = self._columns.get(key)
+            if values is None:
+                meta = self.header['tables'][table]['columns'][name]
+                with open(self.path, 'rb') as f:
+                    f.seek(self.data_start + meta['offset'])
+                    values = self._columns[key] = _unpack(meta, f.read(meta['length']))
+        return values
+
+    def select(self, table, columns=None, student_id=None, date_from=None, date_to=None):
+        """Rows of `table` as dicts of `columns` (all by default); `date_to` is exclusive."""
+        info = self.header['tables'][table]
+        if not info['rows'] or (date_from and info['last'] < str(date_from)) or (date_to and info['first'] >= str(date_to)):
+            return []
+        start, stop = 0, info['rows']
+        if student_id is not None:
+            students = self.column(table, 'student_id')
+            start, stop = bisect_left(students, student_id), bisect_right(students, student_id)
+        indexes = range(start, stop)
+        if date_from or date_to:
+            times = self.column(table, TIME_COLUMNS[table])
+            indexes = [i for i in indexes
+                       if (date_from is None or times[i] >= date_from) and (date_to is None or times[i] < date_to)]
+        names = list(columns or TABLES[table])
+        values = [self.column(table, name) for name in names]
+        return [dict(zip(names, (column[i] for column in values))) for i in indexes]
+
+
+def archive_path(term, batch):
+    return os.path.join(config_value('ARCHIVE_DIR'), term, quote(batch, safe='') + SUFFIX)
+
+
+def open_archive(path):
+    """The ArchiveFile for `path`, shared by every reader until the file is rewritten."""
+    mtime = os.stat(path).st_mtime_ns
+    with _open_files_lock:
+        entry = _open_files.get(path)
+        if entry and entry[0] == mtime:
+            _open_files.move_to_end(path)
+            return entry[1]
+    archive = ArchiveFile(path)
+    with _open_files_lock:
+        _open_files[path] = (mtime, archive)
+        _open_files.move_to_end(path)
+        while len(_open_files) > config_value('ARCHIVE_OPEN_FILES'):
+            _open_files.popitem(last=False)
+    return archive
+
+
+def archive_files(term=None, batch=None):
+    """Archive files for a term and/or batch (all by default), oldest term first."""
+    root = config_value('ARCHIVE_DIR')
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for term_dir in sorted(os.listdir(root)):
+        if term not in (None, term_dir) or not os.path.isdir(os.path.join(root, term_dir)):
+            continue
+        for filename in sorted(os.listdir(os.path.join(root, term_dir))):
+            if filename.endswith(SUFFIX) and batch in (None, unquote(filename[:-len(SUFFIX)])):
+                found.append(open_archive(os.path.join(root, term_dir, filename)))
+    return found
+
+
+def _as_datetime(value):
+    return datetime.combine(value, datetime.min.time()) if type(value) is date else value
+
+
+def history(table='attendance', term=None, batch=None, student_id=None, date_from=None, date_to=None, columns=None):
+    """Archived rows from every matching file; dates are inclusive days."""
+    date_from = _as_datetime(date_from)
+    date_to = _as_datetime(date_to + timedelta(days=1)) if date_to else None
+    rows = []
+    for archive in archive_files(term, batch):
+        for row in archive.select(table, columns, student_id, date_from, date_to):
+            rows.append(dict(row, term=archive.term, batch=archive.batch))
+    return rows
+
+
+def status_counts(term=None, batch=None, student_id=None):
+    """Per student counts and percentage, the archived counterpart of the rollup report."""
+    counts = {}
+    for archive in archive_files(term, batch):
+        for row in archive.select('attendance', ('student_id', 'name', 'status'), student_id):
+            entry = counts.get(row['student_id'])
+            if entry is None:
+                entry = counts[row['student_id']] = dict(student_id=row['student_id'], name=row['name'],
+                                                          **dict.fromkeys(COUNTED.values(), 0))
+            if row['status'] in COUNTED:
+                entry[COUNTED[row['status']]] += 1
+    return [with_percentage(entry) for entry in sorted(counts.values(), key=itemgetter('name', 'student_id'))]
+
+
+# --- Archiving ---
+
+def month_range(month_from, month_to):
+    """[start, end) dates covering the inclusive months `month_from`..`month_to` (dates or 'YYYY-MM')."""
+    try:
+        if isinstance(month_from, str):
+            month_from = datetime.strptime(month_from, '%Y-%m').date()
+        if isinstance(month_to, str):
+            month_to = datetime.strptime(month_to, '%Y-%m').date()
+    except ValueError:
+        raise ArchiveError("Months must be YYYY-MM.") from None
+    start = month_from.replace(day=1)
+    end = (month_to.replace(day=1) + timedelta(days=32)).replace(day=1)
+    if end <= start:
+        raise ArchiveError("The term ends before it starts.")
+    return start, end
+
+
+def archive_batch(repo, term, batch, start, end, log=print):
+    """Move one batch's rows in [start, end) into its term file; returns rows removed from the live tables."""
+    path = archive_path(term, batch)
+    chunk_size = config_value('ARCHIVE_CHUNK_ROWS')
+    live = {table: [row for rows in repo.archive_rows(table, batch, start, end, chunk_size) for row in rows]
+            for table in TABLES}
+    if not any(live.values()):
+        return 0
+    existing = open_archive(path) if os.path.exists(path) else None
+    if existing and (existing.header['from'], existing.header['to']) != (str(start), str(end)):
+        raise ArchiveError(f"{path} holds {existing.header['from']}..{existing.header['to']}, not {start}..{end}")
+
+    tables = {}
+    for table, rows in live.items():
+        merged = {row['id']: row for row in existing.select(table)} if existing else {}
+        merged.update((row['id'], row) for row in rows)
+        tables[table] = list(merged.values())
+    write_archive(path, {'term': term, 'batch': batch, 'from': start, 'to': end, 'archived_at': datetime.now()},
+                  tables, config_value('ARCHIVE_COMPRESSION_LEVEL'))
+
+    # The file is durable; now drop what it holds from the live tables, a chunk per transaction
+    removed, changed = 0, 0
+    try:
+        copied = {row['id']: row['updated_at'] for row in live['attendance']}
+        ids = list(copied)
+        for i in range(0, len(ids), chunk_size):
+            current = repo.lock_updated_at(ids[i:i + chunk_size])
+            unchanged = [row_id for row_id, updated_at in current.items() if copied[row_id] == updated_at]
+            changed += len(current) - len(unchanged)
+            removed += repo.delete_by_id('attendance', unchanged)
+            repo.commit()
+        ids = [row['id'] for row in live['attendance_log']]
+        for i in range(0, len(ids), chunk_size):
+            removed += repo.delete_by_id('attendance_log', ids[i:i + chunk_size])
+            repo.commit()
+        if changed:
+            log(f"{batch}: {changed} rows changed while archiving stay live; run again to archive them.")
+        else:
+            repo.delete_rollup(batch, start, end)
+            repo.commit()
+    except Exception:
+        repo.rollback()
+        raise
+    log(f"{batch}: {removed} rows moved to {path} ({os.path.getsize(path)} bytes).")
+    return removed
+
+
+def archive_term(repo, term, month_from, month_to, batches=None, log=print):
+    """Archive a closed term for `batches` (every batch by default); returns rows removed per batch."""
+    if not TERM_RE.match(term):
+        raise ArchiveError("Term names may only use letters, digits, '.', '_' and '-'.")
+    start, end = month_range(month_from, month_to)
+    if end > date.today():
+        raise ArchiveError(f"The term runs until {end - timedelta(days=1)}; archive it once it has ended.")
+    return {batch: archive_batch(repo, term, batch, start, end, log)
+            for batch in batches or [row['name'] for row in repo.lookup('batches')]}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m common.archive', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='move a closed term into archive files')
+    run_parser.add_argument('--term', required=True, help='name of the archive, e.g. 2025-odd')
+    run_parser.add_argument('--from', dest='month_from', required=True, help='first month, YYYY-MM')
+    run_parser.add_argument('--to', dest='month_to', required=True, help='last month, YYYY-MM')
+    run_parser.add_argument('--batch', dest='batches', action='append', help='only this batch (repeatable)')
+    commands.add_parser('list', help='list archive files')
+    options = parser.parse_args(argv[1:])
+
+    from main import create_app
+    from common.repository import repository_session
+
+    with create_app().app_context():
+        if options.command == 'list':
+            for archive in archive_files():
+                print(json.dumps(archive.summary()))
+            return 0
+        try:
+            # Bad arguments fail before a connection is opened
+            month_range(options.month_from, options.month_to)
+            with repository_session() as repo:
+                moved = archive_term(repo, options.term, options.month_from, options.month_to, options.batches)
+        except ArchiveError as e:
+            print(f"Archive failed: {e}")
+            return 1
+    print(f"Archived {sum(moved.values())} rows from {len(moved)} batches.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
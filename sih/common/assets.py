@@ -0,0 +1,262 @@
+"""Fingerprinted, precompressed script and style bundles for the portal pages.
+
+The pages in PAGES carry all their CSS and JS inline and need no template
+variables. The build step renders each one, moves its inline <style> and
+<script> blocks into <page>.<content hash>.css / .js under ASSET_DIR and
+writes a .gz copy of every file, plus a .br copy when the brotli module is
+installed. Third-party scripts in VENDOR are served from VENDOR_DIR instead
+of their CDN when a copy is there; `--fetch` downloads the missing ones.
+Run it from the sih/ directory after changing a page:
+
+    python -m common.assets build [--fetch]
+
+`render_page` serves a page with its inline blocks swapped for links to the
+bundles. It renders each page once per process and answers repeat loads
+with 304 by ETag. /assets/<name> serves the bundles with a year-long
+immutable Cache-Control (a change gets a new name), precompressed for the
+client's Accept-Encoding. If there is no build, or the build is older than
+the page, the page is served inline as before.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+import urllib.request
+
+from flask import abort, current_app, has_app_context, request, send_file
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ASSET_DIR': 'static/dist',       # where the build writes the bundles and manifest.json
+    'VENDOR_DIR': 'static/vendor',    # local copies of the VENDOR scripts
+    'ASSET_MAX_AGE': 365 * 24 * 3600, # Cache-Control max-age of a bundle, in seconds
+}
+
+# Templates with no variables, rendered once and served with bundled CSS/JS
+PAGES = ('admin_portal.html', 'teacher_portal.html', 'teacher_fronted.html', 'full_style.html', 'index.html')
+
+# CDN script -> file name of its local copy in VENDOR_DIR
+VENDOR = {
+    'https://cdn.tailwindcss.com': 'tailwindcss.js',
+    'https://cdn.jsdelivr.net/npm/qrcodejs@1.0.0/qrcode.min.js': 'qrcode.min.js',
+    'https://unpkg.com/html5-qrcode': 'html5-qrcode.min.js',
+}
+
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # in order of preference
+HASH_LENGTH = 12
+
+INLINE_STYLE = re.compile(r'([ \t]*)<style>(.*?)</style>(\n?)', re.S)
+INLINE_SCRIPT = re.compile(r'([ \t]*)<script>(.*?)</script>(\n?)', re.S)
+EXTERNAL_SCRIPT = re.compile(r'<script src="([^"]+)"')
+
+_manifest = None
+_pages = {}  # template -> Page
+_lock = threading.Lock()
+
+
+class Page:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body):
+        self.body = body.encode()
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def bundle_name(stem, extension, content):
+    digest = hashlib.sha256(content.encode() if isinstance(content, str) else content).hexdigest()
+    return f"{stem}.{digest[:HASH_LENGTH]}.{extension}"
+
+
+def split_page(html):
+    """(html, css, js): the page without its inline blocks, with a marker where each bundle goes."""
+    styles = [m.group(2).strip('\n') for m in INLINE_STYLE.finditer(html)]
+    scripts = [m.group(2).strip('\n') for m in INLINE_SCRIPT.finditer(html)]
+    # The stylesheet takes the place of the first <style>, the script that of the last <script>
+    first_style = styles and INLINE_STYLE.search(html).start()
+    html = INLINE_STYLE.sub(lambda m: f'{m.group(1)}\0css\0{m.group(3)}' if m.start() == first_style else '', html)
+    last_script = scripts and list(INLINE_SCRIPT.finditer(html))[-1].start()
+    html = INLINE_SCRIPT.sub(lambda m: f'{m.group(1)}\0js\0{m.group(3)}' if m.start() == last_script else '', html)
+    return html, '\n'.join(styles), '\n'.join(scripts)
+
+
+def bundled_page(template, html, manifest):
+    """`html` (the rendered `template`) pointing at the built bundles; None when the build doesn't match it."""
+    stem = template.rsplit('.', 1)[0]
+    page, css, js = split_page(html)
+    tags = {}
+    if css:
+        tags['css'] = (bundle_name(stem, 'css', css), '<link rel="stylesheet" href="{}">')
+    if js:
+        tags['js'] = (bundle_name(stem, 'js', js), '<script src="{}"></script>')
+    if any(name not in manifest['files'] for name, _ in tags.values()):
+        return None
+    for kind, (name, tag) in tags.items():
+        page = page.replace(f'\0{kind}\0', tag.format(f'/assets/{name}'), 1)
+    return page
+
+
+def with_vendor(html, manifest):
+    """Point the VENDOR scripts that have a built local copy at it."""
+    vendor = manifest.get('vendor', {})
+    return EXTERNAL_SCRIPT.sub(lambda m: f'<script src="/assets/{vendor[m.group(1)]}"' if m.group(1) in vendor
+                               else m.group(0), html)
+
+
+def load_manifest():
+    """This process's copy of the build manifest (empty before the first build)."""
+    global _manifest
+    if _manifest is None or current_app.jinja_env.auto_reload:
+        try:
+            with open(os.path.join(config_value('ASSET_DIR'), MANIFEST)) as handle:
+                _manifest = json.load(handle)
+        except FileNotFoundError:
+            _manifest = {'files': {}, 'vendor': {}}
+    return _manifest
+
+
+def _render(template):
+    html = current_app.jinja_env.get_template(template).render()
+    manifest = load_manifest()
+    bundled = bundled_page(template, html, manifest)
+    if bundled is None and manifest['files']:
+        current_app.logger.warning("%s changed since the last asset build; serving it inline.", template)
+    return Page(with_vendor(bundled or html, manifest))
+
+
+def render_page(template):
+    """Response for one of PAGES, rendered once per process (every time while templates auto-reload)."""
+    page = None if current_app.jinja_env.auto_reload else _pages.get(template)
+    if page is None:
+        with _lock:
+            page = _pages[template] = _render(template)
+    response = current_app.response_class(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def serve_asset(name):
+    """A bundle from the manifest, precompressed for the client when a variant exists."""
+    encodings = load_manifest()['files'].get(name)
+    if encodings is None:
+        abort(404)
+    path, encoding = os.path.join(config_value('ASSET_DIR'), name), None
+    for candidate, suffix in ENCODINGS:
+        if candidate in encodings and request.accept_encodings[candidate]:
+            path, encoding = path + suffix, candidate
+            break
+    response = send_file(os.path.abspath(path), mimetype=mimetypes.guess_type(name)[0], conditional=True,
+                         max_age=config_value('ASSET_MAX_AGE'))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _write(directory, name, content, written):
+    """Write a bundle and its compressed variants; records name -> encodings in `written`."""
+    data = content.encode() if isinstance(content, str) else content
+    path = os.path.join(directory, name)
+    variants = {'': data, '.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    for suffix, body in variants.items():
+        with open(path + suffix + '.tmp', 'wb') as handle:
+            handle.write(body)
+        os.replace(path + suffix + '.tmp', path + suffix)
+    written[name] = [encoding for encoding, suffix in ENCODINGS if suffix in variants]
+
+
+def fetch_vendor():
+    """Download the VENDOR scripts missing from VENDOR_DIR."""
+    directory = config_value('VENDOR_DIR')
+    os.makedirs(directory, exist_ok=True)
+    for url, filename in VENDOR.items():
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            with urllib.request.urlopen(url, timeout=30) as source:
+                body = source.read()
+            with open(path + '.tmp', 'wb') as handle:
+                handle.write(body)
+            os.replace(path + '.tmp', path)
+            print(f"Fetched {url} -> {path}")
+
+
+def build(log=print):
+    """Write every page's bundles, the local VENDOR copies and the manifest; returns the manifest."""
+    directory = config_value('ASSET_DIR')
+    os.makedirs(directory, exist_ok=True)
+    files, vendor = {}, {}
+    for url, filename in VENDOR.items():
+        path = os.path.join(config_value('VENDOR_DIR'), filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as handle:
+                body = handle.read()
+            stem, extension = filename.rsplit('.', 1)
+            vendor[url] = bundle_name(stem, extension, body)
+            _write(directory, vendor[url], body, files)
+        else:
+            log(f"No local copy of {url} in {config_value('VENDOR_DIR')}; pages keep loading it from the CDN.")
+    for template in PAGES:
+        stem = template.rsplit('.', 1)[0]
+        _, css, js = split_page(current_app.jinja_env.get_template(template).render())
+        for extension, content in (('css', css), ('js', js)):
+            if content:
+                _write(directory, bundle_name(stem, extension, content), content, files)
+    manifest = {'files': files, 'vendor': vendor}
+    with open(os.path.join(directory, MANIFEST + '.tmp'), 'w') as handle:
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+    os.replace(os.path.join(directory, MANIFEST + '.tmp'), os.path.join(directory, MANIFEST))
+    # Bundles of earlier builds are no longer in the manifest, so nothing serves them
+    kept = {name + suffix for name in files for suffix in ('', '.gz', '.br')} | {MANIFEST}
+    for name in os.listdir(directory):
+        if name not in kept:
+            os.remove(os.path.join(directory, name))
+    log(f"Built {len(files)} bundles in {directory}.")
+    return manifest
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.add_url_rule('/assets/<path:name>', 'assets', serve_asset)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m common.assets', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='write the page bundles and manifest')
+    build_parser.add_argument('--fetch', action='store_true', help='download missing VENDOR scripts first')
+    options = parser.parse_args(argv[1:])
+
+    from main import create_app
+
+    with create_app().app_context():
+        if options.fetch:
+            fetch_vendor()
+        build()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
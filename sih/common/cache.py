@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+
+from flask import current_app, request
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    # Entries also expire after this many seconds, so other worker processes
+    # pick up changes they did not see invalidated.
+    'REFERENCE_CACHE_TTL': 300,
+}
+
+
+class CacheEntry:
+    __slots__ = ('version', 'body', 'etag', 'loaded_at')
+
+    def __init__(self, version, body, etag, loaded_at):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.loaded_at = loaded_at
+
+
+class ReferenceCache:
+    """Versioned cache of serialized lookup responses (classes, subjects, ...).
+
+    Each key keeps a version number that writers bump through `invalidate`.
+    Entries hold the already-serialized JSON body and a strong ETag derived
+    from it, so a hit costs neither a query nor a re-serialization. Only one
+    request loads a cold key; the others asking for it meanwhile wait for
+    that result instead of all running the query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._versions = {}
+        self._loading = {}
+        self._stats = {}
+
+    def _count(self, key, stat):
+        stats = self._stats.setdefault(key, {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0})
+        stats[stat] += 1
+
+    def _fresh(self, key, now, ttl):
+        entry = self._entries.get(key)
+        if entry and entry.version == self._versions.get(key, 0) and now - entry.loaded_at < ttl:
+            return entry
+        return None
+
+    def peek(self, key, ttl):
+        """The entry for `key` if it is cached and fresh, else None; never loads."""
+        with self._lock:
+            entry = self._fresh(key, time.monotonic(), ttl)
+            if entry:
+                self._count(key, 'hits')
+            return entry
+
+    def get(self, key, loader, ttl):
+        """Return the entry for `key`, calling `loader()` for the payload on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._fresh(key, now, ttl)
+            if entry:
+                self._count(key, 'hits')
+                return entry
+            self._count(key, 'misses')
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                # Filled by the request this one waited behind
+                entry = self._fresh(key, now, ttl)
+                version = self._versions.setdefault(key, 0)
+            if entry:
+                return entry
+            body = current_app.json.dumps(loader()).encode()
+            entry = CacheEntry(version, body, hashlib.sha1(body).hexdigest(), time.monotonic())
+            with self._lock:
+                # Don't store a payload that a concurrent write has already made stale.
+                if self._versions.get(key, 0) == version:
+                    self._entries[key] = entry
+        return entry
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+                self._count(key, 'invalidations')
+
+    def invalidate_prefix(self, prefix):
+        """Invalidate every key starting with `prefix` that has been loaded so far."""
+        with self._lock:
+            keys = [key for key in self._versions if key.startswith(prefix)]
+        self.invalidate(*keys)
+
+    def record_not_modified(self, key):
+        with self._lock:
+            self._count(key, 'not_modified')
+
+    def stats(self):
+        with self._lock:
+            stats = {key: dict(value, version=self._versions.get(key, 0)) for key, value in self._stats.items()}
+        for value in stats.values():
+            lookups = value['hits'] + value['misses']
+            value['hit_rate'] = value['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+reference_cache = ReferenceCache()
+
+
+def _ttl():
+    return current_app.config.get('REFERENCE_CACHE_TTL', DEFAULT_CONFIG['REFERENCE_CACHE_TTL'])
+
+
+def prime(key, loader):
+    """Load `key` ahead of its first request (worker warm-up)."""
+    reference_cache.get(key, loader, _ttl())
+
+
+def cached_entry(key, loader):
+    """The cache entry for `key`, loading it on a miss, for callers that write the response themselves."""
+    return reference_cache.get(key, loader, _ttl())
+
+
+def fresh_entry(key):
+    """The cache entry for `key` if it is fresh, without loading it."""
+    return reference_cache.peek(key, _ttl())
+
+
+def cached_json(key, loader):
+    """Serve `loader()`'s payload from the cache, answering 304 when the client's ETag still matches."""
+    entry = reference_cache.get(key, loader, _ttl())
+    if request.if_none_match.contains(entry.etag):
+        reference_cache.record_not_modified(key)
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    # Let the browser keep the body but revalidate it on every use.
+    response.cache_control.no_cache = True
+    return response
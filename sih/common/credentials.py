@@ -0,0 +1,297 @@
+"""Password hashing and login verification.
+
+Hashes are stored as self-describing strings, so the cost can be raised
+later and old rows are upgraded on their owner's next login:
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+
+Anything else in the password column is a legacy plaintext value; it is
+still accepted once and replaced with a hash on that login.
+
+Verification runs in a small process pool so a burst of logins can't hold
+every request thread on CPU; when too many are already waiting, new ones
+are turned away with LoginBusy instead of queueing without bound. Bulk
+imports hash on a pool of their own, so an upload never puts logins behind
+thousands of hashes.
+
+Run from the sih/ directory to measure throughput at each cost setting:
+
+    python -m common.credentials bench [seconds_per_setting]
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+
+from common.repository.base import USER_TABLES
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'PASSWORD_HASH_ALGORITHM': 'pbkdf2_sha256',   # or 'scrypt'
+    'PASSWORD_PBKDF2_ITERATIONS': 200000,
+    'PASSWORD_SCRYPT_N': 2 ** 14,
+    'PASSWORD_SCRYPT_R': 8,
+    'PASSWORD_SCRYPT_P': 1,
+    'LOGIN_WORKERS': 2,            # verifier processes; 0 verifies in the request thread
+    'LOGIN_QUEUE_LIMIT': 16,       # verifications running or waiting before LoginBusy
+    'IMPORT_HASH_WORKERS': 1,      # processes hashing bulk-import passwords; 0 hashes in the request thread
+}
+
+SALT_BYTES = 16
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+_executor = None
+_import_executor = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+_stats = {'verified': 0, 'failed': 0, 'unknown_email': 0, 'busy': 0, 'rehashed': 0}
+_stats_lock = threading.Lock()
+
+
+class LoginBusy(Exception):
+    """Raised when the verification queue is full; the client should retry shortly."""
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def hash_params():
+    """Current hashing parameters from the config, in the form the hash functions take."""
+    if config_value('PASSWORD_HASH_ALGORITHM') == 'scrypt':
+        return ('scrypt', config_value('PASSWORD_SCRYPT_N'), config_value('PASSWORD_SCRYPT_R'),
+                config_value('PASSWORD_SCRYPT_P'))
+    return ('pbkdf2_sha256', config_value('PASSWORD_PBKDF2_ITERATIONS'))
+
+
+# --- Pure functions (also run inside the verifier processes) ---
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _derive(password, salt, params):
+    if params[0] == 'scrypt':
+        _, n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=32)
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params[1])
+
+
+def hash_password(password, params):
+    salt = secrets.token_bytes(SALT_BYTES)
+    fields = [str(value) for value in params] + [_b64(salt), _b64(_derive(password, salt, params))]
+    return '$'.join(fields)
+
+
+def _parse(stored):
+    """(params, salt, digest) of a stored hash, or None for a legacy plaintext value."""
+    fields = stored.split('$')
+    try:
+        if fields[0] == 'pbkdf2_sha256' and len(fields) == 4:
+            return ('pbkdf2_sha256', int(fields[1])), _unb64(fields[2]), _unb64(fields[3])
+        if fields[0] == 'scrypt' and len(fields) == 6:
+            return ('scrypt', int(fields[1]), int(fields[2]), int(fields[3])), _unb64(fields[4]), _unb64(fields[5])
+    except ValueError:
+        pass
+    return None
+
+
+def verify_and_upgrade(password, stored, params):
+    """(matches, new_hash) where new_hash is set when the stored value should be replaced."""
+    parsed = _parse(stored)
+    if parsed is None:
+        matches = hmac.compare_digest(password.encode(), stored.encode())
+        return matches, hash_password(password, params) if matches else None
+    stored_params, salt, digest = parsed
+    matches = hmac.compare_digest(_derive(password, salt, stored_params), digest)
+    if matches and stored_params != tuple(params):
+        return True, hash_password(password, params)
+    return matches, None
+
+
+def _hash_many(passwords, params):
+    return [hash_password(password, params) for password in passwords]
+
+
+# --- Bounded verifier pool ---
+
+def _new_pool(workers):
+    # spawn, not fork: the web process has background threads holding locks
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _new_pool(workers)
+        return _executor
+
+
+def _get_import_executor(workers):
+    global _import_executor
+    with _executor_lock:
+        if _import_executor is None:
+            _import_executor = _new_pool(workers)
+        return _import_executor
+
+
+def start_executor():
+    """Spawn the verifier processes now instead of on the first login (worker warm-up)."""
+    workers = config_value('LOGIN_WORKERS')
+    if workers:
+        _get_executor(workers).submit(int).result()
+
+
+def _reset_after_fork():
+    # The parent's pool and its manager thread don't exist in a forked child; it spawns its own
+    global _executor, _import_executor, _executor_lock, _in_flight, _stats_lock
+    _executor, _import_executor, _in_flight = None, None, 0
+    _executor_lock, _stats_lock = threading.Lock(), threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _run(function, *args):
+    """Run `function` on the verifier pool, or inline when LOGIN_WORKERS is 0."""
+    global _in_flight
+    workers = config_value('LOGIN_WORKERS')
+    if not workers:
+        return function(*args)
+    with _stats_lock:
+        if _in_flight >= config_value('LOGIN_QUEUE_LIMIT'):
+            _stats['busy'] += 1
+            raise LoginBusy()
+        _in_flight += 1
+    try:
+        return _get_executor(workers).submit(function, *args).result()
+    finally:
+        with _stats_lock:
+            _in_flight -= 1
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def hash_new_password(password):
+    """Hash a password being set by an admin, at the current cost."""
+    return _run(hash_password, password, hash_params())
+
+
+def hash_new_passwords(passwords):
+    """Hash a list of passwords for a bulk import, on the import pool rather than the login verifiers."""
+    workers = config_value('IMPORT_HASH_WORKERS')
+    if not passwords:
+        return []
+    if not workers:
+        return _hash_many(passwords, hash_params())
+    executor = _get_import_executor(workers)
+    size = -(-len(passwords) // workers)
+    parts = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    futures = [executor.submit(_hash_many, part, hash_params()) for part in parts]
+    return [hashed for future in futures for hashed in future.result()]
+
+
+def authenticate(repo, table, email, password, columns='*'):
+    """The user row for these credentials, or None.
+
+    Looks the email up first, so an unknown address is rejected with one
+    indexed read and no hashing. On success a legacy or outdated hash is
+    replaced in the caller's transaction; the caller commits. `columns`
+    is what the returned row contains; the password is never in it.
+    """
+    if not email or not password:
+        return None
+    user = repo.find_login(table, email, columns)
+    if not user:
+        _count('unknown_email')
+        return None
+    stored = user.pop('stored_password')
+    user.pop('password', None)
+    matches, new_hash = _run(verify_and_upgrade, password, stored, hash_params())
+    if not matches:
+        _count('failed')
+        return None
+    _count('verified')
+    if new_hash:
+        repo.set_password(table, user[USER_TABLES[table]], new_hash)
+        _count('rehashed')
+    return user
+
+
+def credential_stats():
+    with _stats_lock:
+        return dict(_stats, in_flight=_in_flight, workers=config_value('LOGIN_WORKERS'),
+                    queue_limit=config_value('LOGIN_QUEUE_LIMIT'), params=list(hash_params()))
+
+
+def shutdown_executor():
+    global _executor, _import_executor
+    with _executor_lock:
+        for pool in (_executor, _import_executor):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        _executor = _import_executor = None
+
+
+# --- Benchmark ---
+
+BENCH_SETTINGS = [
+    ('pbkdf2_sha256', 100000),
+    ('pbkdf2_sha256', 200000),
+    ('pbkdf2_sha256', 400000),
+    ('scrypt', 2 ** 14, 8, 1),
+    ('scrypt', 2 ** 15, 8, 1),
+]
+
+
+def bench(seconds=3.0, workers=None, log=print):
+    """Logins per second through the verifier pool for each BENCH_SETTINGS entry."""
+    workers = workers or os.cpu_count() or 1
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for params in BENCH_SETTINGS:
+            stored = hash_password('correct horse', params)
+            started = time.perf_counter()
+            verify_and_upgrade('correct horse', stored, params)
+            single_ms = (time.perf_counter() - started) * 1000
+
+            done, started = 0, time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                futures = [executor.submit(verify_and_upgrade, 'correct horse', stored, params) for _ in range(workers * 4)]
+                done += sum(1 for future in futures if future.result()[0])
+            rate = done / (time.perf_counter() - started)
+            results.append({'params': '$'.join(map(str, params)), 'single_ms': round(single_ms, 1),
+                            'logins_per_sec': round(rate, 1), 'workers': workers})
+            log(f"{results[-1]['params']:<24} {single_ms:8.1f} ms/login  {rate:8.1f} logins/s on {workers} workers")
+    return results
+
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == 'bench':
+        bench(float(argv[2]) if len(argv) > 2 else 3.0)
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,241 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+from flask import current_app, g, has_app_context
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'DB_HOST': 'localhost',
+    'DB_USER': 'root',
+    'DB_PASSWORD': '',
+    'DB_NAME': 'portal',
+    'STUDENT_DB_NAME': 'portal',  # student tables now live in the unified schema
+    'DB_POOL_SIZE': 10,
+    'DB_POOL_TIMEOUT': 5.0,        # seconds to wait for a free connection
+    'DB_HEALTH_CHECK_AFTER': 30.0,  # ping connections idle longer than this
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolExhausted(Error):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+def config_value(key):
+    """Read a DB setting from the app config, falling back to the defaults."""
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+class ConnectionPool:
+    """A fixed-size, thread-safe pool of MySQL connections to one database."""
+
+    def __init__(self, size, timeout, health_check_after, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'max_in_use': 0,
+        }
+
+    def _connect(self):
+        conn = mysql.connector.connect(
+            auth_plugin='mysql_native_password',
+            buffered=True,
+            **self.connect_args
+        )
+        with self._lock:
+            self._stats['connects'] += 1
+        return conn
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return True
+        return False
+
+    def _free_slot(self):
+        with self._lock:
+            self._created -= 1
+
+    def _check_health(self, conn, idle_since):
+        """Ping connections that sat idle too long, reconnecting if the server dropped them."""
+        if time.monotonic() - idle_since < self.health_check_after:
+            return conn
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Error:
+            pass
+        try:
+            conn.close()
+        except Error:
+            pass
+        conn = self._connect()
+        with self._lock:
+            self._stats['reconnects'] += 1
+        return conn
+
+    def acquire(self):
+        """Check a connection out, waiting up to `timeout` seconds if all are in use."""
+        try:
+            conn, idle_since = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve_slot():
+                try:
+                    conn = self._connect()
+                except Error:
+                    self._free_slot()
+                    raise
+                idle_since = time.monotonic()
+            else:
+                started = time.monotonic()
+                try:
+                    conn, idle_since = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolExhausted(msg=f"No connection available after {self.timeout}s")
+                waited = time.monotonic() - started
+                with self._lock:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += waited
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+        try:
+            conn = self._check_health(conn, idle_since)
+        except Error:
+            self._free_slot()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            self._stats['max_in_use'] = max(self._stats['max_in_use'], self._in_use)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back anything left uncommitted."""
+        with self._lock:
+            self._in_use -= 1
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Error:
+                discard = True
+        if discard:
+            try:
+                conn.close()
+            except Error:
+                pass
+            self._free_slot()
+            with self._lock:
+                self._stats['discarded'] += 1
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=self.size, open=self._created, in_use=self._in_use, idle=self._idle.qsize())
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+
+def get_pool(database=None):
+    """Return the shared pool for `database`, creating it on first use."""
+    database = database or config_value('DB_NAME')
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(
+                    size=config_value('DB_POOL_SIZE'),
+                    timeout=config_value('DB_POOL_TIMEOUT'),
+                    health_check_after=config_value('DB_HEALTH_CHECK_AFTER'),
+                    host=config_value('DB_HOST'),
+                    user=config_value('DB_USER'),
+                    password=config_value('DB_PASSWORD'),
+                    database=database,
+                )
+                _pools[database] = pool
+    return pool
+
+
+def _reset_after_fork():
+    # A forked worker connects on its own. The parent's connections stay referenced,
+    # because closing the copies here would end the parent's sessions.
+    global _pools_lock
+    _inherited_at_fork.append(dict(_pools))
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+_inherited_at_fork = []
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_db(database=None):
+    """Return the pooled connection checked out for the current request, or None on failure."""
+    database = database or config_value('DB_NAME')
+    conns = g.setdefault('_db_conns', {})
+    if database not in conns:
+        try:
+            conns[database] = get_pool(database).acquire()
+        except Error as e:
+            print(f"Error while connecting to MySQL: {e}")
+            return None
+    return conns[database]
+
+
+def close_db(exc=None):
+    """Give every connection checked out by this request back to its pool."""
+    conns = g.pop('_db_conns', {})
+    for database, conn in conns.items():
+        _pools[database].release(conn)
+
+
+@contextmanager
+def pooled_connection(database=None):
+    """Borrow a connection outside of a request (scripts, background jobs)."""
+    pool = get_pool(database)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def pool_stats():
+    """Usage and wait metrics for every pool, keyed by database name."""
+    return {database: pool.stats() for database, pool in list(_pools.items())}
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+import zlib
+
+from common.repository import open_repository
+
+EXPORT_COLUMNS = ['id', 'student_id', 'name', 'batch', 'schedule_id', 'date', 'status', 'latitude', 'longitude']
+FETCH_SIZE = 1000
+
+
+def _encode_rows(rows, fmt):
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([row[column] for column in EXPORT_COLUMNS] for row in rows)
+        return buffer.getvalue()
+    return ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+
+
+def stream_export(filters, fmt='ndjson', compress=False, database=None):
+    """Yield the export chunk by chunk from an unbuffered cursor, so memory stays flat.
+
+    `filters` are `Repository.export_rows` keywords. The connection is held
+    only while the generator runs and is discarded (not pooled) if the
+    client disconnects with rows still unread.
+    """
+    repo = open_repository(database)
+    finished = False
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip framing
+
+    def emit(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    try:
+        if fmt == 'csv':
+            yield emit(','.join(EXPORT_COLUMNS) + '\r\n')
+        for rows in repo.export_rows(FETCH_SIZE, **filters):
+            chunk = emit(_encode_rows(rows, fmt))
+            if chunk:
+                yield chunk
+        finished = True
+        if compressor:
+            yield compressor.flush()
+    finally:
+        repo.close(discard=not finished)
@@ -0,0 +1,32 @@
+import threading
+
+
+class ChangeNotifier:
+    """Wakes long-poll and SSE waiters in this process when attendance rows change.
+
+    Waiters remember the version they last saw; `wait` returns as soon as it
+    moves on, or after `timeout` so changes made by other processes are still
+    picked up by re-querying.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def notify(self):
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, seen_version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != seen_version, timeout)
+            return self._version
+
+
+attendance_changes = ChangeNotifier()
+
@@ -0,0 +1,163 @@
+import math
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback: same results, one scan at a time
+    np = None
+
+EARTH_RADIUS_M = 6371008.8
+DUPLICATE_PRECISION = 5      # decimal places (~1 m) at which two scans count as the same spot
+GEOFENCE_TTL = 60            # seconds a schedule's fence is cached on the write path
+
+INSIDE = 'inside'
+OUTSIDE = 'outside'
+NO_LOCATION = 'no_location'
+DUPLICATE = 'duplicate_location'
+
+_fences = {}
+_fences_lock = threading.Lock()
+
+
+def distances_m(latitudes, longitudes, center_lat, center_lon):
+    """Haversine distance of every point to the fence centre; NaN where a coordinate is missing."""
+    if np is None:
+        return [_distance_m(lat, lon, center_lat, center_lon) for lat, lon in zip(latitudes, longitudes)]
+    lat = np.radians(np.array(latitudes, dtype=float))
+    lon = np.radians(np.array(longitudes, dtype=float))
+    center_lat, center_lon = math.radians(float(center_lat)), math.radians(float(center_lon))
+    a = np.sin((lat - center_lat) / 2) ** 2 + math.cos(center_lat) * np.cos(lat) * np.sin((lon - center_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _distance_m(lat, lon, center_lat, center_lon):
+    if lat is None or lon is None:
+        return math.nan
+    lat, lon = math.radians(float(lat)), math.radians(float(lon))
+    center_lat, center_lon = math.radians(float(center_lat)), math.radians(float(center_lon))
+    a = math.sin((lat - center_lat) / 2) ** 2 + math.cos(center_lat) * math.cos(lat) * math.sin((lon - center_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def evaluate(scans, fence):
+    """Classify a whole class's scans in one pass.
+
+    `scans` is a list of (attendance_id, latitude, longitude); `fence` is
+    (latitude, longitude, radius_m). Returns {attendance_id: (verdict, distance_m)}
+    where verdict is INSIDE, OUTSIDE, NO_LOCATION or DUPLICATE (several
+    students reporting the same coordinates, e.g. one phone scanning for many).
+    """
+    if not scans:
+        return {}
+    ids = [scan[0] for scan in scans]
+    latitudes = [scan[1] for scan in scans]
+    longitudes = [scan[2] for scan in scans]
+    center_lat, center_lon, radius = fence
+    distances = distances_m(latitudes, longitudes, center_lat, center_lon)
+
+    if np is not None:
+        distances = np.asarray(distances)
+        missing = np.isnan(distances)
+        points = np.round(np.column_stack([np.array(latitudes, dtype=float), np.array(longitudes, dtype=float)]), DUPLICATE_PRECISION)
+        _, inverse, counts = np.unique(points, axis=0, return_inverse=True, return_counts=True)
+        duplicated = (counts[inverse.ravel()] > 1) & ~missing
+        inside = ~missing & (distances <= float(radius))
+        verdicts = np.where(missing, NO_LOCATION, np.where(duplicated, DUPLICATE, np.where(inside, INSIDE, OUTSIDE)))
+        return {attendance_id: (str(verdict), None if is_missing else round(float(distance), 1))
+                for attendance_id, verdict, distance, is_missing in zip(ids, verdicts, distances, missing)}
+
+    seen = {}
+    for lat, lon in zip(latitudes, longitudes):
+        if lat is not None and lon is not None:
+            key = (round(float(lat), DUPLICATE_PRECISION), round(float(lon), DUPLICATE_PRECISION))
+            seen[key] = seen.get(key, 0) + 1
+    results = {}
+    for attendance_id, lat, lon, distance in zip(ids, latitudes, longitudes, distances):
+        if math.isnan(distance):
+            results[attendance_id] = (NO_LOCATION, None)
+        elif seen[(round(float(lat), DUPLICATE_PRECISION), round(float(lon), DUPLICATE_PRECISION))] > 1:
+            results[attendance_id] = (DUPLICATE, round(distance, 1))
+        else:
+            results[attendance_id] = (INSIDE if distance <= float(radius) else OUTSIDE, round(distance, 1))
+    return results
+
+
+def parse_coordinates(latitude, longitude):
+    """A scan's (latitude, longitude) as floats, None where missing; ValueError when not a valid position."""
+    parsed = []
+    for name, value, limit in (('latitude', latitude, 90), ('longitude', longitude, 180)):
+        if value is None or value == '':
+            parsed.append(None)
+            continue
+        try:
+            number = float(value) if not isinstance(value, bool) else math.nan
+        except (TypeError, ValueError):
+            number = math.nan
+        if not -limit <= number <= limit:  # also false for NaN
+            raise ValueError(f"Invalid {name}: {value!r}")
+        parsed.append(number)
+    return tuple(parsed)
+
+
+def cached_fence(repo, schedule_id):
+    """The classroom fence behind a short per-process cache, for the scan write path."""
+    now = time.monotonic()
+    with _fences_lock:
+        hit = _fences.get(schedule_id)
+        if hit and now - hit[1] < GEOFENCE_TTL:
+            return hit[0]
+    fence = repo.classroom_fence(schedule_id)
+    with _fences_lock:
+        _fences[schedule_id] = (fence, now)
+    return fence
+
+
+def forget_fences():
+    """Drop cached fences after a classroom location changes."""
+    with _fences_lock:
+        _fences.clear()
+
+
+def same_spot(value):
+    """[low, high) range of the values that round to `value` at DUPLICATE_PRECISION."""
+    center = round(float(value), DUPLICATE_PRECISION)
+    half = 0.5 / 10 ** DUPLICATE_PRECISION
+    return center - half, center + half
+
+
+def scan_status(repo, student_id, schedule_id, when, latitude, longitude):
+    """Inline check for a single scan: (status, verdict, clustered).
+
+    A scan inside the fence is Present, unless another student already
+    scanned for the class that day from the same spot: then it is Pending as
+    DUPLICATE, and `clustered` holds the other students' locked rows for
+    `flag_clustered`. Everything else is Pending with its verdict.
+    """
+    fence = cached_fence(repo, schedule_id)
+    if fence is None:
+        return 'Pending', None, []
+    verdict, _ = evaluate([(None, latitude, longitude)], fence)[None]
+    if verdict == NO_LOCATION:
+        return 'Pending', verdict, []
+    clustered = [row for row in repo.lock_scans_at(schedule_id, when.date(), same_spot(latitude), same_spot(longitude))
+                 if row['student_id'] != student_id]
+    if clustered:
+        return 'Pending', DUPLICATE, clustered
+    return ('Present' if verdict == INSIDE else 'Pending'), verdict, []
+
+
+def flag_clustered(repo, clustered):
+    """Mark the rows `scan_status` found at the same spot DUPLICATE.
+
+    Pending rows keep their status and auto-approved (INSIDE) Present rows go
+    back to Pending. Rows a teacher has decided are left alone. Returns
+    (rollup transitions, ids of the rows no longer Present).
+    """
+    flagged = [row for row in clustered
+               if (row['status'] == 'Pending' and row['verification'] != DUPLICATE)
+               or (row['status'] == 'Present' and row['verification'] == INSIDE)]
+    if flagged:
+        repo.set_status([row['id'] for row in flagged], 'Pending', DUPLICATE)
+    return ([(row['student_id'], row['schedule_id'], row['date'], row['status'], 'Pending') for row in flagged],
+            [row['id'] for row in flagged if row['status'] == 'Present'])
@@ -0,0 +1,335 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from flask import current_app, has_app_context
+
+from common.metrics import record_journal
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): keep to one process per journal directory
+    fcntl = None
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ATTENDANCE_JOURNAL_DIR': 'attendance_journal',
+    'ATTENDANCE_JOURNAL_SEGMENT_BYTES': 64 * 1024 * 1024,
+    'ATTENDANCE_JOURNAL_FSYNC_EVERY': 32,       # records per fsync
+    'ATTENDANCE_JOURNAL_FSYNC_INTERVAL': 1.0,   # max seconds between fsyncs
+}
+
+SEGMENT_SUFFIX = '.ndjson'
+INDEX_SUFFIX = '.idx'
+LOCK_FILE = '.lock'
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+class AttendanceJournal:
+    """Append-only, segmented NDJSON log of attendance events.
+
+    Every scan is appended as a "mark" record and every teacher decision as a
+    "status" delta pointing back at the previous record for the same
+    attendance_id, so nothing is ever rewritten. Segments roll over by size and
+    by day. An in-memory offset index (persisted as a small `.idx` sidecar next
+    to each segment) maps attendance_id to its latest record.
+
+    Threads and processes (e.g. gunicorn workers) can share a directory: every
+    append holds an exclusive flock on it, catches up on the index entries
+    the other writers appended meanwhile, and takes its offset from the end of
+    the file, so offsets and `prev` links stay right and all writers fill the
+    same segments in one order. Catching up reads only the newest segment's
+    index and stats the name that would follow it; the directory is listed
+    once a day, so an append costs the same however long the journal grows.
+    """
+
+    def __init__(self, directory, max_segment_bytes=DEFAULT_CONFIG['ATTENDANCE_JOURNAL_SEGMENT_BYTES'],
+                 fsync_every=DEFAULT_CONFIG['ATTENDANCE_JOURNAL_FSYNC_EVERY'],
+                 fsync_interval=DEFAULT_CONFIG['ATTENDANCE_JOURNAL_FSYNC_INTERVAL']):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_read = {}  # segment -> bytes of its .idx already folded into _index
+        self._segment = None  # the segment the open files point at
+        self._newest = None   # the newest segment any writer has started, as far as this process knows
+        self._file = None
+        self._index_file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, LOCK_FILE), 'a')
+        with self._dir_lock():
+            self._load_index()
+
+    # --- Segments & index ---
+
+    def segments(self):
+        """Segment names in write order (the names sort chronologically)."""
+        return sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def _path(self, segment, suffix=SEGMENT_SUFFIX):
+        return os.path.join(self.directory, segment + suffix)
+
+    @staticmethod
+    def _first_segment(day):
+        return f"attendance-{day.strftime('%Y%m%d')}-0000"
+
+    @staticmethod
+    def _successor(segment):
+        prefix, number = segment.rsplit('-', 1)
+        return f"{prefix}-{int(number) + 1:04d}"
+
+    def _scan_segment(self, segment):
+        offset = 0
+        with open(self._path(segment), 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n'):
+                    attendance_id = json.loads(line).get('attendance_id')
+                    if attendance_id is not None:
+                        self._index[str(attendance_id)] = (segment, offset)
+                offset += len(line)
+
+    @contextmanager
+    def _dir_lock(self, exclusive=False):
+        """Hold the directory's flock, shared for readers and exclusive for writers, across processes."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self, segment):
+        """Fold in the .idx lines of `segment` written since the last read (by any process)."""
+        index_path = self._path(segment, INDEX_SUFFIX)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, 'rb') as f:
+            f.seek(self._index_read.get(segment, 0))
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._index_read[segment] = self._index_read.get(segment, 0) + len(line)
+                parts = line.split()
+                if len(parts) == 2:
+                    self._index[parts[0].decode()] = (segment, int(parts[1]))
+
+    def _load_index(self):
+        segments = self.segments()
+        self._newest = segments[-1] if segments else None
+        for i, segment in enumerate(segments):
+            index_path = self._path(segment, INDEX_SUFFIX)
+            # The newest segment may hold records whose sidecar entries were never written.
+            if i == len(segments) - 1 or not os.path.exists(index_path):
+                self._scan_segment(segment)
+                if os.path.exists(index_path):
+                    self._index_read[segment] = os.path.getsize(index_path)
+                continue
+            self._read_index(segment)
+
+    def _catch_up_listed(self):
+        """Fold in every segment newer than `_newest`, found by listing the directory."""
+        for segment in self.segments():
+            if self._newest is None or segment > self._newest:
+                self._read_index(segment)
+                self._newest = segment
+
+    def _catch_up(self, today):
+        """Fold in what other processes appended since this one last looked (holding the flock)."""
+        if self._newest is not None:
+            self._read_index(self._newest)
+        first = self._first_segment(today)
+        if (self._newest is None or self._newest < first) and os.path.exists(self._path(first)):
+            # Another writer started today's first segment; segments of days in between sort before it
+            self._catch_up_listed()
+        while self._newest is not None and os.path.exists(self._path(self._successor(self._newest))):
+            self._newest = self._successor(self._newest)
+            self._read_index(self._newest)
+
+    def _open_segment(self, today):
+        """Point at the segment every writer appends to now, starting the next one when full."""
+        segment, first = self._newest, self._first_segment(today)
+        if segment is None or segment < first:
+            # Nobody has written today (catching up would have found it)
+            self._catch_up_listed()
+            segment = first
+        elif os.path.getsize(self._path(segment)) >= self.max_segment_bytes:
+            segment = self._successor(segment)
+        if segment != self._segment:
+            self._close_files()
+            self._segment = self._newest = segment
+            self._file = open(self._path(segment), 'ab')
+            self._index_file = open(self._path(segment, INDEX_SUFFIX), 'ab')
+
+    def _close_files(self):
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._index_file.close()
+            self._file = self._index_file = None
+
+    # --- Writing ---
+
+    def _sync(self):
+        started = time.perf_counter()
+        self._file.flush()
+        self._index_file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        record_journal('fsync', time.perf_counter() - started)
+
+    def _append(self, record, today):
+        """Write one record; the caller holds the exclusive flock and has caught up to `today`."""
+        self._open_segment(today)
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode()
+        # Opened for append, so the write lands at the end the flock keeps still
+        offset = os.fstat(self._file.fileno()).st_size
+        self._file.write(line)
+        self._file.flush()
+        attendance_id = record.get('attendance_id')
+        if attendance_id is not None:
+            self._index[str(attendance_id)] = (self._segment, offset)
+            entry = f"{attendance_id} {offset}\n".encode()
+            self._index_file.write(entry)
+            self._index_file.flush()
+            self._index_read[self._segment] = self._index_read.get(self._segment, 0) + len(entry)
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+        return self._segment, offset
+
+    def append(self, record):
+        """Append a new event; returns the (segment, offset) it was written at."""
+        record = dict(record, op=record.get('op', 'mark'))
+        # Timed from before the lock, so waiting behind other writers shows up too
+        started = time.perf_counter()
+        with self._lock, self._dir_lock(exclusive=True):
+            today = date.today()
+            self._catch_up(today)
+            attendance_id = record.get('attendance_id')
+            if attendance_id is not None:
+                record['prev'] = self._index.get(str(attendance_id))
+            location = self._append(record, today)
+        record_journal('append', time.perf_counter() - started)
+        return location
+
+    def update_status(self, attendance_id, status, **fields):
+        """Record a status change as a delta instead of rewriting the original entry."""
+        return self.append(dict(fields, op='status', attendance_id=attendance_id, status=status,
+                                timestamp=fields.get('timestamp', time.strftime('%Y-%m-%d %H:%M:%S'))))
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+            self._lock_file.close()
+
+    def refresh(self):
+        """Pick up records other processes appended, before reading."""
+        with self._lock, self._dir_lock():
+            self._catch_up(date.today())
+
+    # --- Reading ---
+
+    def _read_at(self, segment, offset):
+        started = time.perf_counter()
+        with open(self._path(segment), 'rb') as f:
+            f.seek(offset)
+            line = f.readline()
+        record_journal('read', time.perf_counter() - started)
+        return json.loads(line)
+
+    def latest(self, attendance_id):
+        """The most recent record for an attendance_id, found with one seek."""
+        self.refresh()
+        location = self._index.get(str(attendance_id))
+        return self._read_at(*location) if location else None
+
+    def history(self, attendance_id):
+        """Every record for an attendance_id, newest first, by following `prev` links."""
+        records = []
+        self.refresh()
+        location = self._index.get(str(attendance_id))
+        while location:
+            record = self._read_at(*location)
+            records.append(record)
+            location = record.get('prev')
+        return records
+
+    def current_state(self, attendance_id):
+        """The original scan with all later status deltas folded in."""
+        state = {}
+        for record in reversed(self.history(attendance_id)):
+            state.update({k: v for k, v in record.items() if k not in ('op', 'prev')})
+        return state or None
+
+    def iter_raw(self, chunk_size=64 * 1024):
+        """Stream every segment's bytes in order, e.g. for a download."""
+        self.flush()
+        for segment in self.segments():
+            with open(self._path(segment), 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def records(self):
+        """Iterate over every record in write order."""
+        self.flush()
+        for segment in self.segments():
+            with open(self._path(segment), 'rb') as f:
+                for line in f:
+                    if line.endswith(b'\n'):
+                        yield json.loads(line)
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def get_journal():
+    """Return the process-wide attendance journal, opening it on first use."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = AttendanceJournal(
+                    config_value('ATTENDANCE_JOURNAL_DIR'),
+                    max_segment_bytes=config_value('ATTENDANCE_JOURNAL_SEGMENT_BYTES'),
+                    fsync_every=config_value('ATTENDANCE_JOURNAL_FSYNC_EVERY'),
+                    fsync_interval=config_value('ATTENDANCE_JOURNAL_FSYNC_INTERVAL'),
+                )
+    return _journal
+
+
+def _reset_after_fork():
+    # A forked child opens its own handles on first use
+    global _journal, _journal_lock
+    _journal, _journal_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def close_journal():
+    if _journal is not None:
+        _journal.close()
@@ -0,0 +1,283 @@
+"""Per-route latency, SQL, pool wait, journal I/O and template timings.
+
+`init_app(app)` times every request and serves everything recorded in this
+process at METRICS_PATH in the Prometheus text format. The repository,
+pool checkout and attendance journal report into the same registry through
+`record_sql`, `record_pool_wait` and `record_journal`, and while a request
+is running those calls also add up on its trace, which is what the slow
+request log (SLOW_REQUEST_MS) prints as a per-query breakdown.
+
+Counters are per process: with several workers, scrape each one.
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'METRICS_ENABLED': True,
+    'METRICS_PATH': '/metrics',
+    'SLOW_REQUEST_MS': None,        # log requests slower than this with their query breakdown
+    'SLOW_REQUEST_LOG': None,       # NDJSON file for the slow request log (default: app.logger)
+    'SLOW_REQUEST_TOP_QUERIES': 10, # statements listed per slow request, slowest first
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_slow_log_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Histogram:
+    """Bucketed observations per label set, rendered with cumulative `le` buckets."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            running = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                running += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels((*self.labels, 'le'), (*label_values, le))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {running}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('portal_request_duration_seconds', 'Time to build each response, by route.',
+                            ('endpoint', 'method', 'status'))
+REQUEST_SQL_STATEMENTS = Histogram('portal_request_sql_statements', 'SQL statements run per request, by route.',
+                                   ('endpoint',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('portal_request_sql_seconds', 'Time spent in SQL per request, by route.', ('endpoint',))
+SQL_SECONDS = Histogram('portal_sql_duration_seconds', 'Time per SQL statement, by statement type.', ('statement',))
+POOL_WAIT_SECONDS = Histogram('portal_pool_wait_seconds', 'Time to check a connection out of the pool.', ('backend',))
+JOURNAL_SECONDS = Histogram('portal_journal_io_seconds',
+                            'Attendance journal file I/O; an append includes any fsync it triggered.', ('op',))
+TEMPLATE_SECONDS = Histogram('portal_template_render_seconds', 'Template rendering time.', ('template',))
+
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, SQL_SECONDS,
+              POOL_WAIT_SECONDS, JOURNAL_SECONDS, TEMPLATE_SECONDS]
+
+
+class RequestTrace:
+    """What one request spent its time on, filled in as it runs."""
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'queries', 'pool_wait', 'journal_seconds',
+                 'template_seconds', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.queries = {}  # sql -> [count, seconds]
+        self.pool_wait = 0.0
+        self.journal_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_started = None
+
+
+def _trace():
+    return g.get('_metrics_trace') if has_request_context() else None
+
+
+def record_sql(sql, seconds, statements=1):
+    """One statement's execution time; `statements=0` adds time (e.g. fetching) to a statement already counted."""
+    if statements:
+        SQL_SECONDS.observe(seconds, sql.split(None, 1)[0].upper())
+    trace = _trace()
+    if trace is not None:
+        trace.sql_count += statements
+        trace.sql_seconds += seconds
+        entry = trace.queries.get(sql)
+        if entry is None:
+            entry = trace.queries[sql] = [0, 0.0]
+        entry[0] += statements
+        entry[1] += seconds
+
+
+@contextmanager
+def timed_sql(sql, statements=1):
+    """Time the block as one execution of `sql` (see `record_sql`)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_sql(sql, time.perf_counter() - started, statements)
+
+
+def record_pool_wait(backend, seconds):
+    POOL_WAIT_SECONDS.observe(seconds, backend)
+    trace = _trace()
+    if trace is not None:
+        trace.pool_wait += seconds
+
+
+def record_journal(op, seconds):
+    JOURNAL_SECONDS.observe(seconds, op)
+    trace = _trace()
+    if trace is not None and op != 'fsync':  # fsync time is already inside its append
+        trace.journal_seconds += seconds
+
+
+def _template_started(sender, template, context, **extra):
+    trace = _trace()
+    if trace is not None:
+        trace.template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    trace = _trace()
+    if trace is not None and trace.template_started is not None:
+        seconds = time.perf_counter() - trace.template_started
+        trace.template_started = None
+        trace.template_seconds += seconds
+        TEMPLATE_SECONDS.observe(seconds, template.name or '<string>')
+
+
+def _start_request():
+    g._metrics_trace = RequestTrace()
+
+
+def _finish_request(response):
+    trace = g.pop('_metrics_trace', None)
+    if trace is None:
+        return response
+    seconds = time.perf_counter() - trace.started
+    endpoint = request.endpoint or '<unmatched>'
+    REQUEST_SECONDS.observe(seconds, endpoint, request.method, str(response.status_code))
+    REQUEST_SQL_STATEMENTS.observe(trace.sql_count, endpoint)
+    REQUEST_SQL_SECONDS.observe(trace.sql_seconds, endpoint)
+    threshold = config_value('SLOW_REQUEST_MS')
+    if threshold is not None and seconds * 1000 >= threshold:
+        _log_slow_request(trace, seconds, endpoint, response.status_code)
+    return response
+
+
+def _log_slow_request(trace, seconds, endpoint, status):
+    queries = sorted(trace.queries.items(), key=lambda item: item[1][1], reverse=True)
+    entry = {
+        'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': status,
+        'ms': round(seconds * 1000, 2),
+        'sql_count': trace.sql_count,
+        'sql_ms': round(trace.sql_seconds * 1000, 2),
+        'pool_wait_ms': round(trace.pool_wait * 1000, 2),
+        'journal_ms': round(trace.journal_seconds * 1000, 2),
+        'template_ms': round(trace.template_seconds * 1000, 2),
+        'queries': [{'sql': ' '.join(sql.split())[:300], 'count': count, 'ms': round(total * 1000, 2)}
+                    for sql, (count, total) in queries[:config_value('SLOW_REQUEST_TOP_QUERIES')]],
+    }
+    path = config_value('SLOW_REQUEST_LOG')
+    if not path:
+        current_app.logger.warning("Slow request: %s", json.dumps(entry))
+        return
+    with _slow_log_lock, open(path, 'a') as handle:
+        handle.write(json.dumps(entry) + '\n')
+
+
+def _pool_lines():
+    """Gauges and counters from the connection pools' own bookkeeping."""
+    from common.repository import repository_stats
+
+    stats = repository_stats()
+    gauges = {'size': 'Configured pool size.', 'in_use': 'Connections checked out now.',
+              'idle': 'Idle connections kept open.'}
+    counters = {'checkouts': 'Connections checked out.', 'connects': 'Connections opened.',
+                'waits': 'Checkouts that had to wait for a free connection.',
+                'timeouts': 'Checkouts that gave up waiting.'}
+    lines = []
+    for kind, fields in (('gauge', gauges), ('counter', counters)):
+        for field, help_text in fields.items():
+            name = f"portal_pool_{field}" + ('_total' if kind == 'counter' else '')
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for database, pool in sorted(stats.get('pools', {}).items()):
+                if field in pool:
+                    lines.append(f"{name}{_labels(('backend', 'database'), (stats['backend'], database))} {pool[field]}")
+    statements = stats.get('statements')
+    if statements:
+        lines += ["# HELP portal_prepared_statements_total Prepared statement cache activity (MySQL).",
+                  "# TYPE portal_prepared_statements_total counter"]
+        lines += [f"portal_prepared_statements_total{_labels(('event',), (event,))} {count}"
+                  for event, count in sorted(statements.items())]
+    return lines
+
+
+def _admission_lines():
+    """Student requests by admission outcome, and the concurrency limiter's state now."""
+    from common.admission import admission_stats
+
+    stats = admission_stats()
+    lines = ["# HELP portal_admission_requests_total Student requests by admission outcome.",
+             "# TYPE portal_admission_requests_total counter"]
+    lines += [f"portal_admission_requests_total{_labels(('outcome',), (outcome,))} {count}"
+              for outcome, count in sorted(stats['counts'].items())]
+    for field, help_text in (('active', 'Student requests holding a slot now.'),
+                             ('waiting', 'Student requests waiting for a slot now.')):
+        lines += [f"# HELP portal_admission_{field} {help_text}", f"# TYPE portal_admission_{field} gauge",
+                  f"portal_admission_{field} {stats[field]}"]
+    return lines
+
+
+def render():
+    """Everything recorded in this process, in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    lines += _pool_lines()
+    lines += _admission_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule(app.config['METRICS_PATH'], 'metrics', metrics_view)
@@ -0,0 +1,241 @@
+"""Versioned schema migrations and the hot-query index check.
+
+Run from the sih/ directory:
+
+    python -m common.migrate            # apply pending migrations
+    python -m common.migrate status     # list applied / pending versions
+    python -m common.migrate check      # EXPLAIN every hot query, exit 1 on a full scan or filesort
+
+Migrations live in sih/migrations/ as NNNN_description.py files exposing
+`upgrade(cursor)`. Each one must be safe to re-run; the helpers below make
+DDL conditional because MySQL has no ADD COLUMN/INDEX IF NOT EXISTS.
+
+Migrations are MySQL only. With DB_BACKEND = 'sqlite' the whole current
+schema is created when the database is first opened, so `up` just does that.
+"""
+import importlib.util
+import os
+import re
+import sys
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.py$')
+LOCK_NAME = 'portal_schema_migrations'
+
+# Repository calls on the request hot path, with representative arguments.
+# `check` EXPLAINs the statements they actually send and fails if any of them
+# reads a whole table or index, or sorts rows it could have read in order.
+HOT_QUERIES = {
+    'teacher.today_attendance': lambda repo: repo.attendance_between('2025-01-01 00:00:00', '2025-01-02 00:00:00'),
+    'teacher.attendance_feed': lambda repo: repo.attendance_changes(1, ('2025-01-01 00:00:00', 0), 200, 0.2),
+    'teacher.attendance_roster': lambda repo: repo.roster(1, 1, '2025-01-01'),
+    'student.mark_attendance': lambda repo: repo.lock_scan(1, 1, '2025-01-01'),
+    'student.get_attendance': lambda repo: repo.attendance_log_page(1),
+    'student.get_attendance.next_page': lambda repo: repo.attendance_log_page(1, after=('2025-01-01 00:00:00', 100)),
+    'student.get_results': lambda repo: repo.results_page(1, after=(100, 100)),
+    'student.get_schedule': lambda repo: repo.timetable(batch='B1'),
+    'admin.get_schedules': lambda repo: repo.timetable(teacher_id=1),
+    'admin.schedule_conflict': lambda repo: repo.overlapping_schedules(1, 'B1', 1, 'Monday', '09:00:00', '10:00:00'),
+    'admin.attendance_report': lambda repo: repo.attendance_report('B1', '2025-01-01'),
+}
+# Hot queries that sort a result already narrowed to one class, batch or teacher;
+# a filesort is expected there (weekday order, student names, report groups).
+SORTED_RESULTS = frozenset({'teacher.attendance_roster', 'student.get_schedule', 'admin.get_schedules',
+                            'admin.attendance_report'})
+
+
+# --- Idempotent DDL helpers for migrations ---
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def column_type(cursor, table, column):
+    cursor.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    row = cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+
+def add_column(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_index(cursor, table, index, columns, unique=False):
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} ADD {'UNIQUE ' if unique else ''}INDEX {index} ({columns})")
+
+
+# --- Runner ---
+
+def discover():
+    """(version, name, path) for every migration file, in version order."""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return found
+
+
+def load(path):
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_version_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, log=print):
+    """Apply every pending migration in order; returns the versions applied."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Another migration run holds the schema lock.")
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for version, name, path in discover():
+            if version in done:
+                continue
+            log(f"Applying {version:04d}_{name} ...")
+            # DDL commits implicitly in MySQL, which is why every migration must be re-runnable.
+            load(path).upgrade(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+        log(f"Schema is at version {max(done | set(applied), default=0)}.")
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+
+
+def status(conn, log=print):
+    done = applied_versions(conn.cursor())
+    for version, name, _ in discover():
+        log(f"{version:04d}_{name}: {'applied' if version in done else 'pending'}")
+
+
+def hot_statements():
+    """(name, sql, params) for every statement the HOT_QUERIES calls send to MySQL."""
+    from common.repository.mysql_backend import MySQLRepository
+
+    class Recorder(MySQLRepository):
+        """Keeps the statements instead of running them; every SELECT comes back empty."""
+
+        def __init__(self):
+            self.sent = []
+
+        def _all(self, sql, params=()):
+            self.sent.append((sql, tuple(params)))
+            return []
+
+        def _stream(self, sql, params, size):
+            self.sent.append((sql, tuple(params)))
+            return iter(())
+
+    for name, call in HOT_QUERIES.items():
+        repo = Recorder()
+        call(repo)
+        for number, (sql, params) in enumerate(repo.sent, 1):
+            yield (name if len(repo.sent) == 1 else f"{name}#{number}"), sql, params
+
+
+def plan_problems(plan, sorted_result=False):
+    """What is wrong with an EXPLAIN plan: whole-table or whole-index reads and, unless expected, filesorts."""
+    problems = []
+    for row in plan:
+        table = row.get('table')
+        if not table or table.startswith('<'):  # derived and UNION results
+            continue
+        if row.get('type') == 'ALL':
+            problems.append(f"full scan of {table}")
+        elif row.get('type') == 'index':
+            problems.append(f"full index scan of {table} ({row.get('key')})")
+        if 'Using filesort' in (row.get('Extra') or '') and not sorted_result:
+            problems.append(f"filesort on {table}")
+    return problems
+
+
+def check_hot_queries(conn, log=print):
+    """EXPLAIN each hot query's statements; returns the names whose plan has a problem."""
+    cursor = conn.cursor(dictionary=True)
+    failures = []
+    for name, query, params in hot_statements():
+        cursor.execute("EXPLAIN " + query, params)
+        plan = cursor.fetchall()
+        problems = plan_problems(plan, name.split('#')[0] in SORTED_RESULTS)
+        if problems:
+            failures.append(name)
+            log(f"FAIL {name}: {', '.join(problems)}")
+        else:
+            log(f"ok   {name}: " + ', '.join(f"{row['table']}={row['type']}({row.get('key')})" for row in plan if row.get('table')))
+    return failures
+
+
+def main(argv):
+    from main import create_app
+    from common.db import pooled_connection
+    from common.repository import config_value, prepare_backend
+
+    command = argv[1] if len(argv) > 1 else 'up'
+    app = create_app()
+    with app.app_context():
+        if config_value('DB_BACKEND') == 'sqlite':
+            prepare_backend()
+            print("SQLite schema is up to date; migrations and `check` apply to MySQL only.")
+            return 0
+    with app.app_context(), pooled_connection() as conn:
+        if command == 'up':
+            migrate(conn)
+        elif command == 'status':
+            status(conn)
+        elif command == 'check':
+            return 1 if check_hot_queries(conn) else 0
+        else:
+            print(__doc__)
+            return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
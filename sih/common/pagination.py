@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from flask import request, jsonify
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values):
+    """Opaque continuation token for a keyset position such as (timestamp, id)."""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, *types):
+    """Inverse of `encode_cursor`, converting each value with `types` (datetime or int)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(datetime.fromisoformat(v) if t is datetime else t(v) for t, v in zip(types, values))
+    except (ValueError, TypeError, base64.binascii.Error) as err:
+        raise ValueError(f"Invalid cursor: {token}") from err
+
+
+def page_size(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE."""
+    return min(max(value or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+
+def date_window(args=None):
+    """The optional ?from=&to= (YYYY-MM-DD, inclusive) filters as (first_day, day_after_last).
+
+    Reads the current request's query string unless `args` is given.
+    """
+    args = request.args if args is None else args
+    date_from = date.fromisoformat(args['from']) if args.get('from') else None
+    date_before = date.fromisoformat(args['to']) + timedelta(days=1) if args.get('to') else None
+    return date_from, date_before
+
+
+def paged_response(rows, next_position):
+    """The rows as a JSON list, with the continuation token in an X-Next-Cursor header."""
+    response = jsonify(rows)
+    if next_position is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor(*next_position)
+    return response
@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'QR_TOKEN_SECRET': None,         # falls back to app.secret_key
+    'QR_TOKEN_ROTATE_SECONDS': 10,   # the teacher's screen shows a new code this often
+    'QR_TOKEN_GRACE_WINDOWS': 2,     # older windows still accepted, for slow scans and clock skew
+    'QR_REPLAY_CACHE_SIZE': 50000,   # (token, student) pairs remembered per process
+}
+
+TOKEN_VERSION = 'v1'
+SIGNATURE_BYTES = 12
+
+_replays = None
+_replays_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def _secret():
+    secret = config_value('QR_TOKEN_SECRET') or (current_app.secret_key if has_app_context() else None)
+    if not secret:
+        raise RuntimeError("QR_TOKEN_SECRET or app.secret_key must be set to sign QR tokens.")
+    return secret.encode() if isinstance(secret, str) else secret
+
+
+def _sign(schedule_id, window):
+    digest = hmac.new(_secret(), f"{TOKEN_VERSION}.{schedule_id}.{window}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode().rstrip('=')
+
+
+def issue_token(schedule_id, now=None):
+    """Signed token for the current rotation window; returns (token, seconds_until_rotation)."""
+    rotate = config_value('QR_TOKEN_ROTATE_SECONDS')
+    now = time.time() if now is None else now
+    window = int(now // rotate)
+    token = f"{TOKEN_VERSION}.{schedule_id}.{window}.{_sign(schedule_id, window)}"
+    return token, rotate - (now % rotate)
+
+
+def verify_token(token, now=None):
+    """schedule_id from a token signed within the accepted windows, or None.
+
+    Pure computation: no DB access, so forged or stale scans are rejected
+    before a connection is checked out.
+    """
+    if not isinstance(token, str):
+        return None
+    parts = token.split('.')
+    if len(parts) != 4 or parts[0] != TOKEN_VERSION:
+        return None
+    try:
+        schedule_id, window = int(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+    rotate = config_value('QR_TOKEN_ROTATE_SECONDS')
+    current = int((time.time() if now is None else now) // rotate)
+    if not current - config_value('QR_TOKEN_GRACE_WINDOWS') <= window <= current:
+        return None
+    if not hmac.compare_digest(parts[3], _sign(schedule_id, window)):
+        return None
+    return schedule_id
+
+
+class ReplayCache:
+    """Bounded LRU of recently accepted keys, each forgotten after `ttl` seconds.
+
+    A key only needs remembering while its token is still accepted, so the
+    TTL matches the token lifetime and the size bound caps memory under load.
+    """
+
+    def __init__(self, capacity, ttl):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'replayed': 0, 'evicted': 0}
+
+    def check_and_add(self, key, now=None):
+        """True the first time `key` is seen within the TTL, False for a replay."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            seen_at = self._entries.get(key)
+            if seen_at is not None and now - seen_at < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['replayed'] += 1
+                return False
+            self._entries[key] = now
+            self._entries.move_to_end(key)
+            # Oldest entries sit at the front; drop the expired ones and anything over capacity.
+            while self._entries:
+                oldest_key, oldest_at = next(iter(self._entries.items()))
+                if len(self._entries) <= self.capacity and now - oldest_at < self.ttl:
+                    break
+                del self._entries[oldest_key]
+                self._stats['evicted'] += 1
+            self._stats['accepted'] += 1
+            return True
+
+    def discard(self, key):
+        """Forget `key`, e.g. when the write it guarded failed and may be retried."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), capacity=self.capacity)
+
+
+def get_replay_cache():
+    """Process-wide replay cache, sized from the app config on first use."""
+    global _replays
+    with _replays_lock:
+        if _replays is None:
+            ttl = config_value('QR_TOKEN_ROTATE_SECONDS') * (config_value('QR_TOKEN_GRACE_WINDOWS') + 1)
+            _replays = ReplayCache(config_value('QR_REPLAY_CACHE_SIZE'), ttl)
+        return _replays
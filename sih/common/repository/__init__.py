@@ -0,0 +1,117 @@
+"""The data access layer: every query the portals run, for MySQL or SQLite.
+
+Pick the backend with DB_BACKEND ('mysql' or 'sqlite'). Routes call
+`get_repository()` for the connection checked out for the current request;
+scripts and background jobs use `repository_session()`. Both hand back a
+`Repository` (see base.py) whose methods return dicts and raise
+RepositoryError / DuplicateKey / ForeignKeyError whatever the driver.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context
+
+from common.db import config_value as db_config_value
+from common.metrics import record_pool_wait
+from common.repository.base import Repository, RepositoryError, DuplicateKey, ForeignKeyError
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'DB_BACKEND': 'mysql',                # or 'sqlite' to run without a database server
+    'DB_STATEMENT_CACHE_SIZE': 64,        # prepared statements kept per MySQL connection
+    'SQLITE_PATH': 'portal.db',
+    'SQLITE_BUSY_TIMEOUT': 5.0,           # seconds a writer waits for the write lock
+}
+
+# Backend chosen for each database on first use, so background threads without
+# an app context keep using what the app was configured with.
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+def _backend_for(database):
+    entry = _backends.get(database)
+    if entry is None:
+        with _backends_lock:
+            entry = _backends.get(database)
+            if entry is None:
+                name = config_value('DB_BACKEND')
+                if name == 'mysql':
+                    from common.repository import mysql_backend as module
+                elif name == 'sqlite':
+                    from common.repository import sqlite_backend as module
+                else:
+                    raise ValueError(f"Unknown DB_BACKEND: {name}")
+                settings = {key: config_value(key) for key in DEFAULT_CONFIG}
+                settings['DB_POOL_SIZE'] = db_config_value('DB_POOL_SIZE')
+                entry = _backends[database] = (module, settings)
+    return entry
+
+
+def prepare_backend(database=None):
+    """Pick the backend and set up its pool for `database` while the app config is available."""
+    database = database or db_config_value('DB_NAME')
+    module, settings = _backend_for(database)
+    module.prepare(database, settings)
+
+
+def open_repository(database=None):
+    """Check out a connection wrapped in a Repository; the caller must `close()` it."""
+    database = database or db_config_value('DB_NAME')
+    module, settings = _backend_for(database)
+    started = time.perf_counter()
+    repo = module.open_repository(database, settings)
+    # Includes opening a new connection when the pool has no idle one
+    record_pool_wait(settings['DB_BACKEND'], time.perf_counter() - started)
+    return repo
+
+
+@contextmanager
+def repository_session(database=None):
+    """A repository outside of a request (scripts, background jobs)."""
+    repo = open_repository(database)
+    try:
+        yield repo
+    finally:
+        repo.close()
+
+
+def get_repository(database=None):
+    """The repository checked out for the current request, or None if the database is unreachable."""
+    database = database or db_config_value('DB_NAME')
+    repos = g.setdefault('_repositories', {})
+    if database not in repos:
+        try:
+            repos[database] = open_repository(database)
+        except RepositoryError as e:
+            print(f"Error while connecting to the database: {e}")
+            return None
+    return repos[database]
+
+
+def close_repositories(exc=None):
+    """Give every repository opened by this request back, rolling back anything uncommitted."""
+    for repo in g.pop('_repositories', {}).values():
+        repo.close()
+
+
+def repository_stats():
+    """Pool usage (and prepared statement reuse on MySQL) for the configured backend."""
+    if config_value('DB_BACKEND') == 'sqlite':
+        from common.repository import sqlite_backend as module
+    else:
+        from common.repository import mysql_backend as module
+    return module.stats()
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.teardown_appcontext(close_repositories)
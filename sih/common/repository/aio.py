@@ -0,0 +1,56 @@
+"""Repository access for coroutines (the ASGI entry point, asgi.py).
+
+Neither backend's driver is async, so the pool runs each unit of work (a
+function taking a Repository, e.g. a whole scan transaction) on a thread
+that owns one pooled connection for the duration. There are only as many
+threads as connections: any number of coroutines can be in flight, but the
+ones beyond that wait on the event loop, which costs a few KB each instead
+of a blocked OS thread per student.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from common.repository import open_repository, prepare_backend
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ASYNC_DB_THREADS': None,   # threads running repository work for coroutines (default: DB_POOL_SIZE)
+}
+
+
+class AsyncRepositoryPool:
+    """Runs `work(repo, *args)` off the event loop, one checked-out repository per call."""
+
+    def __init__(self, app, database, threads):
+        self.app = app
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='repository-aio')
+
+    def _call(self, work, args):
+        # Threads have no app context of their own; helpers read the config through it
+        with self.app.app_context():
+            repo = open_repository(self.database)
+            try:
+                return work(repo, *args)
+            except BaseException:
+                repo.rollback()
+                raise
+            finally:
+                repo.close()
+
+    async def run(self, work, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, work, args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def create_pool(app, database=None):
+    """Pick the backend and size the thread pool from the app config; call once at startup."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    with app.app_context():
+        database = database or app.config.get('DB_NAME')
+        prepare_backend(database)
+    threads = app.config['ASYNC_DB_THREADS'] or app.config['DB_POOL_SIZE']
+    return AsyncRepositoryPool(app, database, threads)
@@ -0,0 +1,628 @@
+"""Every query the portals run, written once for both backends.
+
+Statements use %s placeholders. Where MySQL and SQLite disagree (row locks,
+INSERT IGNORE, upserts, "now") the difference is a class attribute or a
+small hook that the backend overrides. Rows come back as dicts.
+"""
+from datetime import timedelta
+
+
+class RepositoryError(Exception):
+    """Any database failure, whichever backend raised it."""
+
+
+class DuplicateKey(RepositoryError):
+    """A UNIQUE constraint rejected the write."""
+
+
+class ForeignKeyError(RepositoryError):
+    """The row is still referenced, or references a row that does not exist."""
+
+
+# Login tables and their primary keys.
+USER_TABLES = {'Admins': 'admin_id', 'Teachers': 'teacher_id', 'Students': 'student_id'}
+
+INSERT_USERS = {
+    'student': "INSERT INTO Students (name, email, password, batch) VALUES (%s, %s, %s, %s)",
+    'teacher': "INSERT INTO Teachers (name, email, password) VALUES (%s, %s, %s)",
+}
+
+LOOKUPS = {
+    'classes': "SELECT class_id AS id, class_name AS name FROM Classes ORDER BY name",
+    'subjects': "SELECT subject_id AS id, subject_name AS name FROM Subjects ORDER BY subject_name",
+    'teachers': "SELECT teacher_id AS id, name FROM Teachers ORDER BY name",
+    'batches': "SELECT batch_id AS id, batch_name AS name FROM Batches ORDER BY name",
+}
+
+SCHEDULE_COLUMNS = "SELECT schedule_id, class_id, subject_id, teacher_id, batch, day_of_week, start_time, end_time FROM Schedules"
+INSERT_SCHEDULE = """
+    INSERT INTO Schedules (class_id, subject_id, teacher_id, batch, day_of_week, start_time, end_time)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+# Portable stand-in for MySQL's FIELD(): weekdays in calendar order.
+DAY_ORDER = ("CASE s.day_of_week WHEN 'Monday' THEN 1 WHEN 'Tuesday' THEN 2 WHEN 'Wednesday' THEN 3 "
+             "WHEN 'Thursday' THEN 4 WHEN 'Friday' THEN 5 WHEN 'Saturday' THEN 6 ELSE 7 END")
+
+FEED_QUERY = """
+    SELECT a.id, s.name, a.date, a.status, a.latitude, a.longitude, a.schedule_id, a.updated_at
+    FROM attendance a
+    JOIN Students s ON a.student_id = s.student_id
+    WHERE a.schedule_id = %s
+      AND (a.updated_at > %s OR (a.updated_at = %s AND a.id > %s))
+      AND a.updated_at <= {settled}
+    ORDER BY a.updated_at, a.id
+    LIMIT %s
+"""
+
+REPORT_STUDENTS = """
+    SELECT st.student_id, st.name, SUM(r.present) AS present, SUM(r.denied) AS denied, SUM(r.pending) AS pending,
+           SUM(r.absent) AS absent
+    FROM Students st
+    JOIN attendance_rollup r ON r.student_id = st.student_id
+    WHERE {where}
+    GROUP BY st.student_id, st.name
+    ORDER BY st.name
+"""
+REPORT_SCHEDULES = """
+    SELECT r.schedule_id, sub.subject_name, s.day_of_week, s.start_time,
+           SUM(r.present) AS present, SUM(r.denied) AS denied, SUM(r.pending) AS pending,
+           SUM(r.absent) AS absent
+    FROM Students st
+    JOIN attendance_rollup r ON r.student_id = st.student_id
+    JOIN Schedules s ON r.schedule_id = s.schedule_id
+    JOIN Subjects sub ON s.subject_id = sub.subject_id
+    WHERE {where}
+    GROUP BY r.schedule_id, sub.subject_name, s.day_of_week, s.start_time
+    ORDER BY sub.subject_name
+"""
+
+# Slots of one weekday that ended by a cutoff, were held (someone scanned) and are not finalized yet.
+DUE_SLOTS = """
+    SELECT s.schedule_id, s.batch, s.start_time, s.end_time
+    FROM Schedules s
+    WHERE s.day_of_week = %s{ended}
+      AND EXISTS (SELECT 1 FROM attendance a WHERE a.schedule_id = s.schedule_id AND a.attendance_date = %s)
+      AND NOT EXISTS (SELECT 1 FROM finalized_slots f WHERE f.schedule_id = s.schedule_id AND f.class_date = %s)
+    ORDER BY s.end_time, s.schedule_id
+"""
+# Anti-join: one Absent row per student of the batch without a row for that class.
+INSERT_ABSENCES = """
+    {insert_ignore} INTO attendance (student_id, schedule_id, date, status, verification)
+    SELECT st.student_id, %s, %s, 'Absent', 'no_scan'
+    FROM Students st
+    WHERE st.batch = %s
+      AND NOT EXISTS (
+          SELECT 1 FROM attendance a
+          WHERE a.student_id = st.student_id AND a.schedule_id = %s AND a.attendance_date = %s
+      )
+"""
+# Rows of one batch in [start, end), copied into the archive before they are deleted.
+ARCHIVE_QUERIES = {
+    'attendance': """
+        SELECT a.id, a.student_id, st.name, a.schedule_id, a.date, a.status, a.verification,
+               a.latitude, a.longitude, a.updated_at
+        FROM attendance a
+        JOIN Students st ON a.student_id = st.student_id
+        WHERE st.batch = %s AND a.date >= %s AND a.date < %s
+        ORDER BY a.id
+    """,
+    'attendance_log': """
+        SELECT l.id, l.student_id, l.qr_code, l.latitude, l.longitude, l.timestamp
+        FROM attendance_log l
+        JOIN Students st ON l.student_id = st.student_id
+        WHERE st.batch = %s AND l.timestamp >= %s AND l.timestamp < %s
+        ORDER BY l.id
+    """,
+}
+ROSTER = """
+    SELECT st.student_id, st.name AS student_name, st.email AS student_email,
+           a.id AS attendance_id, a.status, a.verification, a.date AS timestamp,
+           f.finalized_at
+    FROM Schedules s
+    JOIN Students st ON st.batch = s.batch
+    LEFT JOIN attendance a
+        ON a.student_id = st.student_id AND a.schedule_id = s.schedule_id AND a.attendance_date = %s
+    LEFT JOIN finalized_slots f ON f.schedule_id = s.schedule_id AND f.class_date = %s
+    WHERE s.schedule_id = %s AND s.teacher_id = %s
+    ORDER BY st.name, st.student_id
+"""
+
+
+def clock(value):
+    """'HH:MM:SS' for a TIME column, which MySQL returns as a timedelta and SQLite as text."""
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)
+
+
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+class Repository:
+    """Typed access to the portal schema over one checked-out connection.
+
+    A repository belongs to one request or job at a time. Writes join the
+    current transaction; the caller decides when to `commit` or `rollback`.
+    """
+
+    backend = None
+    # Appended to SELECTs that lock the rows they read
+    FOR_UPDATE = " FOR UPDATE"
+    INSERT_IGNORE = "INSERT IGNORE"
+    UPSERT_ROLLUP = None
+    REBUILD_ROLLUP = None
+    ROLLUP_ABSENCES = None
+
+    # --- Backend primitives ---
+
+    def _all(self, sql, params=()):
+        """Every row of a SELECT, as dicts."""
+        raise NotImplementedError
+
+    def _one(self, sql, params=()):
+        rows = self._all(sql, params)
+        return rows[0] if rows else None
+
+    def _write(self, sql, params=()):
+        """Run one INSERT/UPDATE/DELETE; returns (rowcount, lastrowid)."""
+        raise NotImplementedError
+
+    def _write_many(self, sql, rows):
+        raise NotImplementedError
+
+    def _stream(self, sql, params, size):
+        """Yield a large result `size` rows at a time without buffering it all."""
+        raise NotImplementedError
+
+    def _lock_rows(self):
+        """Called before reading rows that will be updated; FOR UPDATE covers it where supported."""
+
+    def _settled(self, seconds):
+        """SQL for "now minus `seconds`" on the database clock, and its parameter."""
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def rollback(self):
+        raise NotImplementedError
+
+    def close(self, discard=False):
+        """Give the connection back; `discard` drops it instead (e.g. with a result left unread)."""
+        raise NotImplementedError
+
+    # --- Logins and users ---
+
+    def find_login(self, table, email, columns='*') -> dict | None:
+        """`columns` of the user with this email, plus their stored hash as `stored_password`."""
+        return self._one(f"SELECT {columns}, password AS stored_password FROM {table} WHERE email = %s", (email,))
+
+    def set_password(self, table, user_id, password_hash) -> None:
+        self._write(f"UPDATE {table} SET password = %s WHERE {USER_TABLES[table]} = %s", (password_hash, user_id))
+
+    def create_user(self, user_type, name, email, password_hash, batch=None) -> int:
+        if user_type == 'student':
+            return self._write(INSERT_USERS['student'], (name, email, password_hash, batch))[1]
+        return self._write(INSERT_USERS['teacher'], (name, email, password_hash))[1]
+
+    def insert_users(self, user_type, rows) -> None:
+        """Bulk insert of (name, email, password_hash[, batch]) tuples."""
+        self._write_many(INSERT_USERS[user_type], rows)
+
+    def existing_emails(self, user_type, emails) -> set[str]:
+        if not emails:
+            return set()
+        table = 'Students' if user_type == 'student' else 'Teachers'
+        emails = list(emails)
+        rows = self._all(f"SELECT LOWER(email) AS email FROM {table} WHERE email IN ({placeholders(emails)})", emails)
+        return {row['email'] for row in rows}
+
+    def lock_batch(self, batch) -> bool:
+        """Lock a batch row so concurrent inserts into it are serialized; False if it doesn't exist."""
+        self._lock_rows()
+        return self._one(f"SELECT batch_name FROM Batches WHERE batch_name = %s{self.FOR_UPDATE}", (batch,)) is not None
+
+    def lock_batches(self) -> list[str]:
+        self._lock_rows()
+        return [row['batch_name'] for row in self._all(f"SELECT batch_name FROM Batches{self.FOR_UPDATE}")]
+
+    def count_students(self, batch) -> int:
+        return self._one("SELECT COUNT(*) AS students FROM Students WHERE batch = %s", (batch,))['students']
+
+    def student_batch(self, student_id) -> str | None:
+        row = self._one("SELECT batch FROM Students WHERE student_id = %s", (student_id,))
+        return row['batch'] if row else None
+
+    def students_per_batch(self) -> dict[str, int]:
+        rows = self._all("SELECT batch, COUNT(*) AS students FROM Students GROUP BY batch")
+        return {row['batch']: row['students'] for row in rows}
+
+    # --- Reference data ---
+
+    def lookup(self, name) -> list[dict]:
+        """id/name pairs for one of LOOKUPS (classes, subjects, teachers, batches)."""
+        return self._all(LOOKUPS[name])
+
+    def add_class(self, name, latitude=None, longitude=None, radius_m=50) -> int:
+        return self._write(
+            "INSERT INTO Classes (class_name, latitude, longitude, radius_m) VALUES (%s, %s, %s, %s)",
+            (name, latitude, longitude, radius_m)
+        )[1]
+
+    def remove_class(self, class_id) -> bool:
+        return self._write("DELETE FROM Classes WHERE class_id = %s", (class_id,))[0] > 0
+
+    def set_class_location(self, class_id, latitude, longitude, radius_m) -> bool:
+        return self._write(
+            "UPDATE Classes SET latitude = %s, longitude = %s, radius_m = %s WHERE class_id = %s",
+            (latitude, longitude, radius_m, class_id)
+        )[0] > 0
+
+    def add_subject(self, name) -> int:
+        return self._write("INSERT INTO Subjects (subject_name) VALUES (%s)", (name,))[1]
+
+    def remove_subject(self, subject_id) -> bool:
+        return self._write("DELETE FROM Subjects WHERE subject_id = %s", (subject_id,))[0] > 0
+
+    def add_batch(self, name) -> int:
+        return self._write("INSERT INTO Batches (batch_name) VALUES (%s)", (name,))[1]
+
+    def batch_name(self, batch_id) -> str | None:
+        row = self._one("SELECT batch_name FROM Batches WHERE batch_id = %s", (batch_id,))
+        return row['batch_name'] if row else None
+
+    def batch_in_use(self, batch) -> str | None:
+        """'students' or 'schedules' when something still refers to the batch, else None."""
+        if self._one("SELECT 1 AS used FROM Students WHERE batch = %s LIMIT 1", (batch,)):
+            return 'students'
+        if self._one("SELECT 1 AS used FROM Schedules WHERE batch = %s LIMIT 1", (batch,)):
+            return 'schedules'
+        return None
+
+    def remove_batch(self, batch_id) -> bool:
+        return self._write("DELETE FROM Batches WHERE batch_id = %s", (batch_id,))[0] > 0
+
+    # --- Schedules ---
+
+    def timetable(self, teacher_id=None, batch=None) -> list[dict]:
+        """The weekly timetable of one teacher or one batch, Monday first."""
+        column, value = ("s.teacher_id", teacher_id) if teacher_id is not None else ("s.batch", batch)
+        rows = self._all(f"""
+            SELECT s.schedule_id, s.day_of_week, s.start_time, s.end_time, s.batch, s.teacher_id,
+                   c.class_name, sub.subject_name
+            FROM Schedules s
+            JOIN Classes c ON s.class_id = c.class_id
+            JOIN Subjects sub ON s.subject_id = sub.subject_id
+            WHERE {column} = %s
+            ORDER BY {DAY_ORDER}, s.start_time
+        """, (value,))
+        for row in rows:
+            row['start_time'], row['end_time'] = clock(row['start_time']), clock(row['end_time'])
+        return rows
+
+    def overlapping_schedules(self, teacher_id, batch, class_id, day_of_week, start_time, end_time) -> list[dict]:
+        """Schedules that share the teacher, batch or classroom and overlap the slot ('HH:MM:SS' times)."""
+        # One indexed lookup per resource (idx_schedules_*_day) instead of an OR that scans the table
+        overlap = "day_of_week = %s AND %s < end_time AND %s > start_time"
+        return self._all(f"""
+            {SCHEDULE_COLUMNS} WHERE teacher_id = %s AND {overlap}
+            UNION
+            {SCHEDULE_COLUMNS} WHERE batch = %s AND {overlap}
+            UNION
+            {SCHEDULE_COLUMNS} WHERE class_id = %s AND {overlap}
+        """, tuple(value for resource in (teacher_id, batch, class_id)
+                   for value in (resource, day_of_week, start_time, end_time)))
+
+    def lock_schedules(self) -> list[dict]:
+        """The whole timetable, locked so nothing is added between a check and an insert."""
+        self._lock_rows()
+        return self._all(f"{SCHEDULE_COLUMNS}{self.FOR_UPDATE}")
+
+    def insert_schedules(self, rows) -> None:
+        """Insert (class_id, subject_id, teacher_id, batch, day_of_week, start_time, end_time) tuples."""
+        if len(rows) == 1:
+            self._write(INSERT_SCHEDULE, rows[0])
+        elif rows:
+            self._write_many(INSERT_SCHEDULE, rows)
+
+    def remove_schedule(self, schedule_id) -> dict | None:
+        """Delete a schedule; returns its batch and teacher_id, or None if it did not exist."""
+        self._lock_rows()
+        row = self._one(f"SELECT batch, teacher_id FROM Schedules WHERE schedule_id = %s{self.FOR_UPDATE}", (schedule_id,))
+        if row:
+            self._write("DELETE FROM Schedules WHERE schedule_id = %s", (schedule_id,))
+        return row
+
+    def teaches(self, teacher_id, schedule_id) -> bool:
+        return self._one("SELECT 1 AS teaches FROM Schedules WHERE schedule_id = %s AND teacher_id = %s",
+                         (schedule_id, teacher_id)) is not None
+
+    def schedules_on(self, day_of_week) -> list[dict]:
+        return self._all(
+            "SELECT schedule_id, batch, teacher_id FROM Schedules WHERE day_of_week = %s ORDER BY start_time, schedule_id",
+            (day_of_week,)
+        )
+
+    def classroom_fence(self, schedule_id) -> tuple | None:
+        """(latitude, longitude, radius_m) of a schedule's classroom, or None if it has no fence."""
+        row = self._one("""
+            SELECT c.latitude, c.longitude, c.radius_m
+            FROM Schedules s
+            JOIN Classes c ON s.class_id = c.class_id
+            WHERE s.schedule_id = %s
+        """, (schedule_id,))
+        if not row:
+            return None
+        values = (row['latitude'], row['longitude'], row['radius_m'])
+        return values if None not in values else None
+
+    # --- Attendance ---
+
+    def attendance_between(self, start, end) -> list[dict]:
+        return self._all("""
+            SELECT a.id, s.name, a.date, a.status, a.latitude, a.longitude, a.schedule_id
+            FROM attendance a
+            JOIN Students s ON a.student_id = s.student_id
+            WHERE a.date >= %s AND a.date < %s
+            ORDER BY a.date DESC
+        """, (start, end))
+
+    def attendance_changes(self, schedule_id, position, limit, settle_seconds) -> list[dict]:
+        """Rows of a schedule changed after `position` ((updated_at, id)), oldest first.
+
+        Rows younger than `settle_seconds` are held back so a slower
+        concurrent commit with an earlier updated_at cannot be skipped.
+        """
+        updated_at, last_id = position
+        settled, settle_param = self._settled(settle_seconds)
+        return self._all(FEED_QUERY.format(settled=settled),
+                         (schedule_id, updated_at, updated_at, last_id, settle_param, limit))
+
+    def lock_attendance(self, ids, teacher_id=None) -> dict:
+        """Lock attendance rows by id; returns {id: (student_id, schedule_id, date, status)}.
+
+        With `teacher_id`, rows of schedules that teacher does not teach are left out.
+        """
+        if not ids:
+            return {}
+        ids = list(ids)
+        owned = "" if teacher_id is None else " AND schedule_id IN (SELECT schedule_id FROM Schedules WHERE teacher_id = %s)"
+        self._lock_rows()
+        rows = self._all(
+            f"SELECT id, student_id, schedule_id, date, status FROM attendance WHERE id IN ({placeholders(ids)}){owned}{self.FOR_UPDATE}",
+            ids + ([] if teacher_id is None else [teacher_id])
+        )
+        return {row['id']: (row['student_id'], row['schedule_id'], row['date'], row['status']) for row in rows}
+
+    def lock_scans(self, schedule_id, start, end, status) -> list[dict]:
+        """Lock one schedule's scans with `status` taken in [start, end)."""
+        self._lock_rows()
+        return self._all(f"""
+            SELECT id, latitude, longitude, student_id, schedule_id, date, status FROM attendance
+            WHERE schedule_id = %s AND date >= %s AND date < %s AND status = %s{self.FOR_UPDATE}
+        """, (schedule_id, start, end, status))
+
+    def lock_scans_at(self, schedule_id, day, latitudes, longitudes) -> list[dict]:
+        """Lock one schedule's scans on `day` taken in a [low, high) latitude and longitude box."""
+        self._lock_rows()
+        return self._all(f"""
+            SELECT id, student_id, schedule_id, date, status, verification FROM attendance
+            WHERE schedule_id = %s AND attendance_date = %s
+              AND latitude >= %s AND latitude < %s AND longitude >= %s AND longitude < %s{self.FOR_UPDATE}
+        """, (schedule_id, day, *latitudes, *longitudes))
+
+    def set_status(self, ids, status, verification=None) -> int:
+        """One set-based UPDATE; `verification` is only written when given."""
+        ids = list(ids)
+        if not ids:
+            return 0
+        if verification is None:
+            return self._write(f"UPDATE attendance SET status = %s WHERE id IN ({placeholders(ids)})", [status, *ids])[0]
+        return self._write(f"UPDATE attendance SET status = %s, verification = %s WHERE id IN ({placeholders(ids)})",
+                           [status, verification, *ids])[0]
+
+    def insert_scan(self, student_id, schedule_id, when, status, verification, latitude, longitude) -> int | None:
+        """Insert a scan; returns its id, or None when the student already scanned that day."""
+        count, new_id = self._write(f"""
+            {self.INSERT_IGNORE} INTO attendance (student_id, schedule_id, date, status, verification, latitude, longitude)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (student_id, schedule_id, when, status, verification, latitude, longitude))
+        return new_id if count == 1 else None
+
+    def lock_scan(self, student_id, schedule_id, day) -> dict | None:
+        """id and status of a student's scan for a schedule on `day`, locked."""
+        self._lock_rows()
+        return self._one(f"""
+            SELECT id, status FROM attendance
+            WHERE student_id = %s AND schedule_id = %s AND attendance_date = %s{self.FOR_UPDATE}
+        """, (student_id, schedule_id, day))
+
+    def refresh_scan(self, attendance_id, when, status, verification, latitude, longitude) -> None:
+        self._write("""
+            UPDATE attendance
+            SET date = %s, status = %s, verification = %s, latitude = %s, longitude = %s
+            WHERE id = %s
+        """, (when, status, verification, latitude, longitude, attendance_id))
+
+    def export_rows(self, chunk_size, date_from=None, date_to=None, batch=None, schedule_id=None,
+                    student_id=None, teacher_id=None):
+        """Yield filtered attendance in id order, `chunk_size` rows at a time; dates are inclusive days."""
+        query = """
+            SELECT a.id, a.student_id, s.name, s.batch, a.schedule_id, a.date, a.status, a.latitude, a.longitude
+            FROM attendance a
+            JOIN Students s ON a.student_id = s.student_id
+        """
+        conditions, params = [], []
+        if teacher_id is not None:
+            query += " JOIN Schedules sc ON a.schedule_id = sc.schedule_id"
+            conditions.append("sc.teacher_id = %s")
+            params.append(teacher_id)
+        if date_from:
+            conditions.append("a.date >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("a.date < %s")
+            params.append(date_to + timedelta(days=1))
+        for column, value in (("s.batch", batch), ("a.schedule_id", schedule_id), ("a.student_id", student_id)):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return self._stream(query + " ORDER BY a.id", params, chunk_size)
+
+    # --- Monthly rollup ---
+
+    def add_to_rollup(self, rows) -> None:
+        """Add (student_id, schedule_id, month, present, denied, pending, absent) deltas, creating rows as needed."""
+        if rows:
+            self._write_many(self.UPSERT_ROLLUP, rows)
+
+    def rebuild_rollup(self) -> int:
+        """Recompute attendance_rollup from attendance in the current transaction; returns its row count."""
+        self._write("DELETE FROM attendance_rollup")
+        return self._write(self.REBUILD_ROLLUP)[0]
+
+    def add_absences_to_rollup(self, schedule_id, day, month) -> None:
+        """Count the Absent rows `insert_absences` wrote for a class, in one INSERT ... SELECT."""
+        self._write(self.ROLLUP_ABSENCES, (month, schedule_id, day))
+
+    def attendance_report(self, batch, month_from=None, month_to=None, student_id=None) -> tuple[list, list]:
+        """Summed rollup counts for a batch as (per student, per schedule) rows; months are inclusive."""
+        conditions, params = ["st.batch = %s"], [batch]
+        if month_from:
+            conditions.append("r.month >= %s")
+            params.append(month_from)
+        if month_to:
+            conditions.append("r.month <= %s")
+            params.append(month_to)
+        if student_id:
+            conditions.append("st.student_id = %s")
+            params.append(student_id)
+        where = " AND ".join(conditions)
+        students = self._all(REPORT_STUDENTS.format(where=where), params)
+        schedules = self._all(REPORT_SCHEDULES.format(where=where), params)
+        for row in schedules:
+            row['start_time'] = clock(row['start_time'])
+        return students, schedules
+
+    # --- Absence finalization ---
+
+    def due_slots(self, day_of_week, day, ended_by=None) -> list[dict]:
+        """Held, unfinalized classes on `day` whose end_time is at or before `ended_by` (any time if None)."""
+        ended, params = "", [day_of_week]
+        if ended_by is not None:
+            ended = " AND s.end_time <= %s"
+            params.append(ended_by)
+        return self._all(DUE_SLOTS.format(ended=ended), params + [day, day])
+
+    def next_slot_end(self, day_of_week, after) -> str | None:
+        """'HH:MM:SS' of the first class on `day_of_week` ending after `after`, or None."""
+        row = self._one("SELECT MIN(end_time) AS end_time FROM Schedules WHERE day_of_week = %s AND end_time > %s",
+                        (day_of_week, after))
+        return clock(row['end_time']) if row and row['end_time'] is not None else None
+
+    def claim_slot(self, schedule_id, day) -> bool:
+        """Mark a class as finalized in the current transaction; False if another run already did."""
+        self._lock_rows()
+        count, _ = self._write(f"{self.INSERT_IGNORE} INTO finalized_slots (schedule_id, class_date) VALUES (%s, %s)",
+                               (schedule_id, day))
+        return count == 1
+
+    def insert_absences(self, schedule_id, batch, day, started_at) -> int:
+        """Absent rows for the batch's students with no row for this class; returns how many."""
+        return self._write(INSERT_ABSENCES.format(insert_ignore=self.INSERT_IGNORE),
+                           (schedule_id, started_at, batch, schedule_id, day))[0]
+
+    def record_finalized(self, schedule_id, day, absent, expired) -> None:
+        self._write("UPDATE finalized_slots SET absent = %s, expired = %s WHERE schedule_id = %s AND class_date = %s",
+                    (absent, expired, schedule_id, day))
+
+    def roster(self, teacher_id, schedule_id, day) -> list[dict]:
+        """Every student of the class's batch with their row for `day`, if any; empty unless `teacher_id` teaches it."""
+        return self._all(ROSTER, (day, day, schedule_id, teacher_id))
+
+    # --- Archiving ---
+
+    def archive_rows(self, table, batch, start, end, chunk_size):
+        """Yield a batch's `attendance` or `attendance_log` rows in [start, end), `chunk_size` at a time."""
+        return self._stream(ARCHIVE_QUERIES[table], (batch, start, end), chunk_size)
+
+    def lock_updated_at(self, ids) -> dict:
+        """Lock attendance rows by id; returns {id: updated_at}."""
+        if not ids:
+            return {}
+        ids = list(ids)
+        self._lock_rows()
+        rows = self._all(f"SELECT id, updated_at FROM attendance WHERE id IN ({placeholders(ids)}){self.FOR_UPDATE}", ids)
+        return {row['id']: row['updated_at'] for row in rows}
+
+    def delete_by_id(self, table, ids) -> int:
+        ids = list(ids)
+        if not ids:
+            return 0
+        return self._write(f"DELETE FROM {table} WHERE id IN ({placeholders(ids)})", ids)[0]
+
+    def delete_rollup(self, batch, start, end) -> int:
+        """Drop the batch's rollup months in [start, end)."""
+        return self._write("""
+            DELETE FROM attendance_rollup
+            WHERE month >= %s AND month < %s
+              AND student_id IN (SELECT student_id FROM Students WHERE batch = %s)
+        """, (start, end, batch))[0]
+
+    # --- Student portal ---
+
+    def results_page(self, student_id, after=None, limit=50) -> tuple[list, tuple | None]:
+        return self._page("SELECT * FROM results", ["student_id = %s"], [student_id], "id", "id", after, limit)
+
+    def attendance_log_page(self, student_id=None, date_from=None, date_before=None, after=None, limit=50) -> tuple[list, tuple | None]:
+        """One newest-first page of attendance_log; `date_before` is exclusive."""
+        conditions, params = [], []
+        for condition, value in (("student_id = %s", student_id), ("timestamp >= %s", date_from),
+                                 ("timestamp < %s", date_before)):
+            if value:
+                conditions.append(condition)
+                params.append(value)
+        # Keyset pages over idx_attendance_log_student_time: week 1 and year 4 cost the same
+        return self._page("SELECT * FROM attendance_log", conditions, params, "timestamp", "id", after, limit)
+
+    def log_scan(self, student_id, qr_code, latitude, longitude) -> None:
+        self._write("INSERT INTO attendance_log (student_id, qr_code, latitude, longitude) VALUES (%s, %s, %s, %s)",
+                    (student_id, qr_code, latitude, longitude))
+
+    def _page(self, select, conditions, params, sort_column, id_column, after, limit):
+        """Fetch one newest-first page after the `after` position (a (sort_value, id) tuple).
+
+        With an index on (..., sort_column, id_column) every page is a range
+        read of `limit` rows, however deep into the history it is.
+        Returns (rows, next_position) where next_position is None on the last page.
+        """
+        conditions, params = list(conditions), list(params)
+        if after is not None:
+            conditions.append(f"({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))")
+            params += [after[0], after[0], after[1]]
+        query = select
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {sort_column} DESC, {id_column} DESC LIMIT %s"
+        rows = self._all(query, params + [limit + 1])
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1][sort_column], rows[-1][id_column])
+
+    # --- Bulk loading (bench seed) ---
+
+    def clear_tables(self, tables) -> None:
+        for table in tables:
+            self._write(f"DELETE FROM {table}")
+
+    def insert_rows(self, table, columns, rows) -> None:
+        self._write_many(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders(columns)})", rows)
+
+    def select_rows(self, table, columns) -> list[dict]:
+        """`columns` of every row, ordered by the first one."""
+        return self._all(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {columns[0]}")
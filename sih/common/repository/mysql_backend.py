@@ -0,0 +1,167 @@
+"""MySQL backend: pooled connections (common.db) and server-side prepared statements.
+
+Each statement is prepared once per connection and kept on its own cursor,
+so later executions send only the parameters. The per-connection cache is
+bounded and evicts the least recently used statement, which also keeps the
+server under max_prepared_stmt_count with a pool of any size.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from mysql.connector import Error
+
+from common.db import get_pool, pool_stats
+from common.metrics import timed_sql
+from common.repository.base import Repository, RepositoryError, DuplicateKey, ForeignKeyError
+
+ERRORS = {1062: DuplicateKey, 1451: ForeignKeyError, 1452: ForeignKeyError}
+
+UPSERT_ROLLUP = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        present = present + VALUES(present),
+        denied = denied + VALUES(denied),
+        pending = pending + VALUES(pending),
+        absent = absent + VALUES(absent)
+"""
+
+REBUILD_ROLLUP = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    SELECT student_id, schedule_id, DATE_FORMAT(date, '%Y-%m-01'),
+           SUM(status = 'Present'), SUM(status = 'Denied'), SUM(status = 'Pending'),
+           SUM(status = 'Absent')
+    FROM attendance
+    WHERE schedule_id IS NOT NULL
+    GROUP BY student_id, schedule_id, DATE_FORMAT(date, '%Y-%m-01')
+"""
+
+ROLLUP_ABSENCES = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    SELECT student_id, schedule_id, %s, 0, 0, 0, 1
+    FROM attendance
+    WHERE schedule_id = %s AND attendance_date = %s AND status = 'Absent' AND verification = 'no_scan'
+    ON DUPLICATE KEY UPDATE absent = absent + 1
+"""
+
+_stats = {'prepared': 0, 'reused': 0, 'evicted': 0}
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def translated():
+    """Re-raise connector errors as the repository's own exception types."""
+    try:
+        yield
+    except Error as err:
+        raise ERRORS.get(err.errno, RepositoryError)(str(err)) from err
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+class StatementCache:
+    """Prepared cursors for one connection, one server-side statement each."""
+
+    def __init__(self, conn, capacity):
+        self.conn = conn
+        self.capacity = capacity
+        self._cursors = OrderedDict()  # sql -> (sql, cursor)
+
+    def get(self, sql):
+        """(sql, cursor) to execute; the connector only skips re-preparing for the identical string object."""
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            _count('reused')
+            return entry
+        entry = self._cursors[sql] = (sql, self.conn.cursor(prepared=True, buffered=False))
+        _count('prepared')
+        if len(self._cursors) > self.capacity:
+            _, (_, oldest) = self._cursors.popitem(last=False)
+            oldest.close()  # deallocates the server-side statement
+            _count('evicted')
+        return entry
+
+
+class MySQLRepository(Repository):
+    backend = 'mysql'
+    UPSERT_ROLLUP = UPSERT_ROLLUP
+    REBUILD_ROLLUP = REBUILD_ROLLUP
+    ROLLUP_ABSENCES = ROLLUP_ABSENCES
+
+    def __init__(self, database, statement_cache_size):
+        self.database = database
+        with translated():
+            self.conn = get_pool(database).acquire()
+        # The cache lives on the connection, so it survives check-in and dies with a reconnect
+        statements = getattr(self.conn, 'portal_statements', None)
+        if statements is None:
+            statements = self.conn.portal_statements = StatementCache(self.conn, statement_cache_size)
+        self.statements = statements
+
+    def _all(self, sql, params=()):
+        with translated(), timed_sql(sql):
+            sql, cursor = self.statements.get(sql)
+            cursor.execute(sql, tuple(params))
+            names = cursor.column_names
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def _write(self, sql, params=()):
+        with translated(), timed_sql(sql):
+            sql, cursor = self.statements.get(sql)
+            cursor.execute(sql, tuple(params))
+            return cursor.rowcount, cursor.lastrowid
+
+    def _write_many(self, sql, rows):
+        # A plain cursor: executemany folds INSERT ... VALUES into one multi-row statement,
+        # where a prepared cursor would send one round trip per row
+        with translated(), timed_sql(sql):
+            cursor = self.conn.cursor()
+            cursor.executemany(sql, list(rows))
+            cursor.close()
+
+    def _stream(self, sql, params, size):
+        with translated():
+            cursor = self.conn.cursor(dictionary=True, buffered=False)
+            with timed_sql(sql):
+                cursor.execute(sql, params)
+            while True:
+                # Only the fetches are timed, not the caller's work between chunks
+                with timed_sql(sql, statements=0):
+                    rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+
+    def _settled(self, seconds):
+        return "NOW(6) - INTERVAL %s MICROSECOND", int(seconds * 1_000_000)
+
+    def commit(self):
+        with translated(), timed_sql("COMMIT"):
+            self.conn.commit()
+
+    def rollback(self):
+        with translated(), timed_sql("ROLLBACK"):
+            self.conn.rollback()
+
+    def close(self, discard=False):
+        get_pool(self.database).release(self.conn, discard=discard)
+
+
+def prepare(database, settings):
+    get_pool(database)
+
+
+def open_repository(database, settings):
+    return MySQLRepository(database, settings['DB_STATEMENT_CACHE_SIZE'])
+
+
+def stats():
+    with _stats_lock:
+        statements = dict(_stats)
+    return {'backend': 'mysql', 'pools': pool_stats(), 'statements': statements}
@@ -0,0 +1,382 @@
+"""SQLite backend for single-node sites, tests and benchmarks: one WAL-mode file, no server.
+
+WAL lets readers run alongside the single writer. Writes and row locks
+open the transaction with BEGIN IMMEDIATE, which takes the write lock up
+front; that is the SQLite stand-in for SELECT ... FOR UPDATE and avoids
+the deadlock of two readers upgrading at once. Statements are compiled
+once per connection by sqlite3's own statement cache.
+
+The schema below mirrors the MySQL migrations and is created on first
+connect; timestamps are stored as local-time text with microseconds so
+they compare correctly as strings.
+"""
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from functools import lru_cache
+
+from common.metrics import timed_sql
+from common.repository.base import Repository, RepositoryError, DuplicateKey, ForeignKeyError
+
+CACHED_STATEMENTS = 256
+NOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000')"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS Admins (
+    admin_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Teachers (
+    teacher_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Batches (
+    batch_id INTEGER PRIMARY KEY,
+    batch_name TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
+CREATE TABLE IF NOT EXISTS Classes (
+    class_id INTEGER PRIMARY KEY,
+    class_name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    latitude REAL,
+    longitude REAL,
+    radius_m INTEGER NOT NULL DEFAULT 50
+);
+CREATE TABLE IF NOT EXISTS Subjects (
+    subject_id INTEGER PRIMARY KEY,
+    subject_name TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
+CREATE TABLE IF NOT EXISTS Students (
+    student_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password TEXT NOT NULL,
+    batch TEXT NOT NULL COLLATE NOCASE,
+    class_id INTEGER REFERENCES Classes(class_id)
+);
+CREATE INDEX IF NOT EXISTS idx_students_batch ON Students (batch);
+CREATE TABLE IF NOT EXISTS Schedules (
+    schedule_id INTEGER PRIMARY KEY,
+    class_id INTEGER REFERENCES Classes(class_id) ON DELETE SET NULL,
+    subject_id INTEGER REFERENCES Subjects(subject_id) ON DELETE SET NULL,
+    teacher_id INTEGER REFERENCES Teachers(teacher_id) ON DELETE CASCADE,
+    batch TEXT NOT NULL COLLATE NOCASE,
+    day_of_week TEXT NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_schedules_teacher_day ON Schedules (teacher_id, day_of_week, start_time);
+CREATE INDEX IF NOT EXISTS idx_schedules_batch_day ON Schedules (batch, day_of_week, start_time);
+CREATE INDEX IF NOT EXISTS idx_schedules_class_day ON Schedules (class_id, day_of_week, start_time);
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES Students(student_id) ON DELETE CASCADE,
+    schedule_id INTEGER REFERENCES Schedules(schedule_id) ON DELETE CASCADE,
+    date DATETIME NOT NULL DEFAULT {NOW},
+    attendance_date DATE GENERATED ALWAYS AS (date(date)) STORED,
+    status TEXT NOT NULL DEFAULT 'Pending',
+    verification TEXT,
+    latitude REAL,
+    longitude REAL,
+    updated_at TIMESTAMP NOT NULL DEFAULT {NOW},
+    UNIQUE (student_id, schedule_id, attendance_date)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date);
+CREATE INDEX IF NOT EXISTS idx_attendance_feed ON attendance (schedule_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_attendance_schedule_status ON attendance (schedule_id, status, date);
+CREATE INDEX IF NOT EXISTS idx_attendance_schedule_day ON attendance (schedule_id, attendance_date);
+-- MySQL's ON UPDATE CURRENT_TIMESTAMP(6)
+CREATE TRIGGER IF NOT EXISTS attendance_touch AFTER UPDATE ON attendance
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE attendance SET updated_at = {NOW} WHERE id = NEW.id;
+END;
+CREATE TABLE IF NOT EXISTS attendance_rollup (
+    student_id INTEGER NOT NULL REFERENCES Students(student_id) ON DELETE CASCADE,
+    schedule_id INTEGER NOT NULL REFERENCES Schedules(schedule_id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    present INTEGER NOT NULL DEFAULT 0,
+    denied INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, schedule_id, month)
+);
+CREATE INDEX IF NOT EXISTS idx_rollup_schedule_month ON attendance_rollup (schedule_id, month);
+CREATE TABLE IF NOT EXISTS finalized_slots (
+    schedule_id INTEGER NOT NULL REFERENCES Schedules(schedule_id) ON DELETE CASCADE,
+    class_date DATE NOT NULL,
+    finalized_at TIMESTAMP NOT NULL DEFAULT {NOW},
+    absent INTEGER NOT NULL DEFAULT 0,
+    expired INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (schedule_id, class_date)
+);
+CREATE TABLE IF NOT EXISTS attendance_log (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER REFERENCES Students(student_id),
+    qr_code TEXT,
+    latitude REAL,
+    longitude REAL,
+    timestamp TIMESTAMP DEFAULT {NOW}
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_log_student_time ON attendance_log (student_id, timestamp);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER REFERENCES Students(student_id),
+    subject TEXT,
+    marks INTEGER,
+    grade TEXT
+);
+CREATE TABLE IF NOT EXISTS schedule (
+    id INTEGER PRIMARY KEY,
+    day TEXT,
+    time TEXT,
+    subject TEXT
+);
+INSERT OR IGNORE INTO Admins (name, email, password) VALUES ('Admin User', 'admin@example.com', 'admin123');
+INSERT OR IGNORE INTO Batches (batch_name) VALUES ('B1'), ('B2'), ('B3'), ('B4'), ('B5'), ('B6');
+"""
+
+UPSERT_ROLLUP = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (student_id, schedule_id, month) DO UPDATE SET
+        present = present + excluded.present,
+        denied = denied + excluded.denied,
+        pending = pending + excluded.pending,
+        absent = absent + excluded.absent
+"""
+
+REBUILD_ROLLUP = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    SELECT student_id, schedule_id, strftime('%Y-%m-01', date),
+           SUM(status = 'Present'), SUM(status = 'Denied'), SUM(status = 'Pending'),
+           SUM(status = 'Absent')
+    FROM attendance
+    WHERE schedule_id IS NOT NULL
+    GROUP BY student_id, schedule_id, strftime('%Y-%m-01', date)
+"""
+
+ROLLUP_ABSENCES = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending, absent)
+    SELECT student_id, schedule_id, %s, 0, 0, 0, 1
+    FROM attendance
+    WHERE schedule_id = %s AND attendance_date = %s AND status = 'Absent' AND verification = 'no_scan'
+    ON CONFLICT (student_id, schedule_id, month) DO UPDATE SET absent = absent + 1
+"""
+
+# Columns added since the schema above was first released: (table, column, definition).
+# CREATE TABLE IF NOT EXISTS leaves older database files without them.
+ADDED_COLUMNS = (
+    ('attendance_rollup', 'absent', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+PARAM_RE = re.compile(r'%s')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _parse_date(value):
+    return date.fromisoformat(value.decode()[:10])
+
+
+# Fixed-width text so stored timestamps sort and compare like the values they hold
+sqlite3.register_adapter(datetime, lambda value: value.strftime('%Y-%m-%d %H:%M:%S.%f'))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(time, lambda value: value.strftime('%H:%M:%S'))
+sqlite3.register_converter('DATETIME', _parse_datetime)
+sqlite3.register_converter('TIMESTAMP', _parse_datetime)
+sqlite3.register_converter('DATE', _parse_date)
+
+
+@lru_cache(maxsize=1024)
+def qmark(sql):
+    """The statement with %s placeholders rewritten to sqlite3's ?."""
+    return PARAM_RE.sub('?', sql)
+
+
+@contextmanager
+def translated():
+    """Re-raise sqlite3 errors as the repository's own exception types."""
+    try:
+        yield
+    except sqlite3.IntegrityError as err:
+        message = str(err)
+        if message.startswith('UNIQUE') or message.startswith('PRIMARY KEY'):
+            raise DuplicateKey(message) from err
+        if message.startswith('FOREIGN KEY'):
+            raise ForeignKeyError(message) from err
+        raise RepositoryError(message) from err
+    except sqlite3.Error as err:
+        raise RepositoryError(str(err)) from err
+
+
+class SQLitePool:
+    """Reusable connections to one database file; idle ones beyond `size` are closed."""
+
+    def __init__(self, path, size, busy_timeout):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {'checkouts': 0, 'connects': 0, 'max_in_use': 0}
+        with translated():
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            for table, column, definition in ADDED_COLUMNS:
+                if column not in {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self._idle.put(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                               isolation_level=None, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # durable at each checkpoint, not each commit
+        conn.execute("PRAGMA foreign_keys = ON")
+        with self._lock:
+            self._stats['connects'] += 1
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with translated():
+                conn = self._connect()
+        with self._lock:
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            self._stats['max_in_use'] = max(self._stats['max_in_use'], self._in_use)
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        if discard or self._idle.qsize() >= self.size:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(path=self.path, size=self.size, in_use=self._in_use, idle=self._idle.qsize())
+        return stats
+
+
+def get_pool(database, settings):
+    """The pool for `database`, opening (and creating) the file on first use."""
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                pool = _pools[database] = SQLitePool(settings['SQLITE_PATH'], settings['DB_POOL_SIZE'],
+                                                     settings['SQLITE_BUSY_TIMEOUT'])
+    return pool
+
+
+def _reset_after_fork():
+    # SQLite connections must not be used across a fork; the child opens its own
+    global _pools_lock
+    _inherited_at_fork.append(dict(_pools))
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+_inherited_at_fork = []
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class SQLiteRepository(Repository):
+    backend = 'sqlite'
+    # BEGIN IMMEDIATE in _lock_rows already holds the write lock
+    FOR_UPDATE = ""
+    INSERT_IGNORE = "INSERT OR IGNORE"
+    UPSERT_ROLLUP = UPSERT_ROLLUP
+    REBUILD_ROLLUP = REBUILD_ROLLUP
+    ROLLUP_ABSENCES = ROLLUP_ABSENCES
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = pool.acquire()
+
+    def _lock_rows(self):
+        if not self.conn.in_transaction:
+            with translated(), timed_sql("BEGIN IMMEDIATE"):
+                self.conn.execute("BEGIN IMMEDIATE")
+
+    def _all(self, sql, params=()):
+        with translated(), timed_sql(sql):
+            return [dict(row) for row in self.conn.execute(qmark(sql), tuple(params)).fetchall()]
+
+    def _write(self, sql, params=()):
+        self._lock_rows()
+        with translated(), timed_sql(sql):
+            cursor = self.conn.execute(qmark(sql), tuple(params))
+            return cursor.rowcount, cursor.lastrowid
+
+    def _write_many(self, sql, rows):
+        self._lock_rows()
+        with translated(), timed_sql(sql):
+            self.conn.executemany(qmark(sql), rows)
+
+    def _stream(self, sql, params, size):
+        with translated():
+            with timed_sql(sql):
+                cursor = self.conn.execute(qmark(sql), tuple(params))
+            while True:
+                # Only the fetches are timed, not the caller's work between chunks
+                with timed_sql(sql, statements=0):
+                    rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+            cursor.close()
+
+    def _settled(self, seconds):
+        return "(strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime', %s) || '000')", f"-{seconds:.6f} seconds"
+
+    def commit(self):
+        with translated(), timed_sql("COMMIT"):
+            self.conn.commit()
+
+    def rollback(self):
+        with translated(), timed_sql("ROLLBACK"):
+            self.conn.rollback()
+
+    def close(self, discard=False):
+        self.pool.release(self.conn, discard=discard)
+
+
+def prepare(database, settings):
+    get_pool(database, settings)
+
+
+def open_repository(database, settings):
+    return SQLiteRepository(get_pool(database, settings))
+
+
+def stats():
+    return {'backend': 'sqlite', 'pools': {database: pool.stats() for database, pool in list(_pools.items())}}
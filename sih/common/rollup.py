@@ -0,0 +1,112 @@
+"""Per student x schedule x month attendance counts, kept in step with `attendance`.
+
+Every code path that inserts a scan or changes a status reports the
+transition here, inside its own transaction, so reports read a handful of
+rollup rows instead of aggregating the whole attendance history.
+
+Run from the sih/ directory to recompute the table from scratch:
+
+    python -m common.rollup rebuild
+"""
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+
+# Statuses with a counter column; anything else is not counted.
+COUNTED = {'Present': 'present', 'Denied': 'denied', 'Pending': 'pending', 'Absent': 'absent'}
+
+
+class ScanRefused(ValueError):
+    """A repeat scan for a row that is no longer Pending (decided by the teacher, or finalized)."""
+
+
+def month_of(when):
+    return date(when.year, when.month, 1)
+
+
+def apply(repo, transitions):
+    """Fold (student_id, schedule_id, when, old_status, new_status) transitions into the rollup.
+
+    `old_status` is None for a newly inserted scan. Transitions are summed
+    per key first, so a bulk update costs one upsert per affected student
+    and month rather than one per row.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTED.values(), 0))
+    for student_id, schedule_id, when, old_status, new_status in transitions:
+        if schedule_id is None or old_status == new_status:
+            continue
+        key = (student_id, schedule_id, month_of(when))
+        if old_status in COUNTED:
+            deltas[key][COUNTED[old_status]] -= 1
+        if new_status in COUNTED:
+            deltas[key][COUNTED[new_status]] += 1
+    repo.add_to_rollup([key + tuple(d[column] for column in COUNTED.values())
+                        for key, d in deltas.items() if any(d.values())])
+
+
+def record_scan(repo, student_id, schedule_id, status, verification, latitude, longitude, scanned_at=None):
+    """Insert or refresh today's scan for (student, schedule); returns (attendance_id, transition).
+
+    A first scan is a single INSERT. A repeat scan locks the existing row to
+    learn the status it is replacing, which the rollup needs, and only
+    replaces a Pending one: a Present or Denied decision and a finalized
+    Absent raise ScanRefused.
+    """
+    when = scanned_at or datetime.now()
+    attendance_id = repo.insert_scan(student_id, schedule_id, when, status, verification, latitude, longitude)
+    if attendance_id is not None:
+        return attendance_id, (student_id, schedule_id, when, None, status)
+    existing = repo.lock_scan(student_id, schedule_id, when.date())
+    if existing is None:
+        # INSERT IGNORE also swallows foreign key failures
+        raise ValueError(f"Unknown student or schedule: {student_id}, {schedule_id}")
+    if existing['status'] != 'Pending':
+        raise ScanRefused(f"Attendance for this class is already {existing['status']}.")
+    repo.refresh_scan(existing['id'], when, status, verification, latitude, longitude)
+    return existing['id'], (student_id, schedule_id, when, existing['status'], status)
+
+
+def status_transitions(locked, ids, new_status):
+    """Transitions for setting `new_status` on `ids`, from rows returned by `Repository.lock_attendance`."""
+    return [(locked[i][0], locked[i][1], locked[i][2], locked[i][3], new_status) for i in ids if i in locked]
+
+
+def with_percentage(row):
+    """Counts as ints plus `percentage` present out of all counted scans (None when there are none)."""
+    for column in COUNTED.values():
+        row[column] = int(row[column] or 0)
+    total = sum(row[column] for column in COUNTED.values())
+    row['percentage'] = round(100.0 * row['present'] / total, 1) if total else None
+    return row
+
+
+def rebuild(repo, log=print):
+    """Recompute the whole rollup in one transaction.
+
+    INSERT ... SELECT share-locks the attendance rows it reads, so status
+    changes made meanwhile wait for the commit instead of being lost.
+    """
+    try:
+        rows = repo.rebuild_rollup()
+        repo.commit()
+    except Exception:
+        repo.rollback()
+        raise
+    log(f"Rebuilt attendance_rollup: {rows} rows.")
+    return rows
+
+
+def main(argv):
+    from main import create_app
+    from common.repository import repository_session
+
+    if len(argv) < 2 or argv[1] != 'rebuild':
+        print(__doc__)
+        return 2
+    with create_app().app_context(), repository_session() as repo:
+        rebuild(repo)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
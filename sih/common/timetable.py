@@ -0,0 +1,61 @@
+"""Weekly timetables per batch and per teacher, materialized in the reference cache.
+
+Each timetable is the Schedules ⋈ Classes ⋈ Subjects rows of one batch or one
+teacher, queried and serialized once and then served from the cache (with an
+ETag) until a timetable write invalidates exactly the batch and the teacher it
+touched. Removing a class or a subject drops rows from the join, so it
+invalidates every timetable. Other worker processes catch up within
+REFERENCE_CACHE_TTL, as for the other lookups.
+"""
+from common.cache import cached_entry, cached_json, fresh_entry, reference_cache
+
+PREFIX = 'timetable:'
+
+
+def batch_key(batch):
+    return f"{PREFIX}batch:{batch}"
+
+
+def teacher_key(teacher_id):
+    return f"{PREFIX}teacher:{int(teacher_id)}"
+
+
+def batch_timetable(repo, batch):
+    """The student-facing payload: the batch's classes as a plain list."""
+    return repo.timetable(batch=batch)
+
+
+def teacher_timetable(repo, teacher_id):
+    return {'success': True, 'data': repo.timetable(teacher_id=teacher_id)}
+
+
+def cached_batch_timetable(get_repo, batch):
+    """Response for a batch timetable; `get_repo()` (raising RepositoryError) is only called on a miss."""
+    return cached_json(batch_key(batch), lambda: batch_timetable(get_repo(), batch))
+
+
+def cached_teacher_timetable(get_repo, teacher_id):
+    return cached_json(teacher_key(teacher_id), lambda: teacher_timetable(get_repo(), teacher_id))
+
+
+def fresh_batch_timetable(batch):
+    """The cached entry for `batch` if fresh, else None (the async path checks before taking a connection)."""
+    return fresh_entry(batch_key(batch))
+
+
+def load_batch_timetable(repo, batch):
+    """The cache entry for `batch`, loading it with `repo` on a miss."""
+    return cached_entry(batch_key(batch), lambda: batch_timetable(repo, batch))
+
+
+def invalidate(*schedules):
+    """Rebuild the timetables of the batches and teachers of these schedule rows on next use."""
+    keys = set()
+    for row in schedules:
+        keys.add(batch_key(row['batch']))
+        keys.add(teacher_key(row['teacher_id']))
+    reference_cache.invalidate(*keys)
+
+
+def invalidate_all():
+    reference_cache.invalidate_prefix(PREFIX)
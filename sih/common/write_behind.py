@@ -0,0 +1,242 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from common.repository import RepositoryError, prepare_backend, repository_session
+from common.journal import get_journal
+from common.feed import attendance_changes
+from common.geofence import scan_status, flag_clustered
+from common import rollup
+
+# Defaults used when the Flask config does not override them.
+DEFAULT_CONFIG = {
+    'ATTENDANCE_WRITE_BEHIND': False,
+    'WRITE_BEHIND_QUEUE_SIZE': 5000,   # scans buffered before falling back to direct writes
+    'WRITE_BEHIND_MAX_ROWS': 200,      # flush once this many scans are waiting
+    'WRITE_BEHIND_INTERVAL_MS': 50,    # ...or once the oldest has waited this long
+    'WRITE_BEHIND_FAILED_LOG': 'write_behind_failed.ndjson',  # scans that could not be written, one JSON per line
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def config_value(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULT_CONFIG[key])
+    return DEFAULT_CONFIG[key]
+
+
+class WriteBehindQueue:
+    """Buffers attendance scans and commits them in batches from one background thread.
+
+    Scans are acknowledged as soon as they are queued. The flusher groups up to
+    `max_rows` of them, or whatever arrived within `interval` seconds, into one
+    transaction and one commit. Each scan still runs its own statements (the
+    geofence check, the insert and, for a repeat scan, the lock and refresh),
+    because its status and rollup transition depend on the row it replaces;
+    what the batch saves is the commits.
+
+    If the batch fails, each of its scans is retried in a transaction of its
+    own, and those that fail again are appended to `failed_log` rather than lost.
+    A repeat scan of a row that is no longer Pending is refused there (and
+    counted), as the direct write would answer it with 409.
+    """
+
+    def __init__(self, database, capacity, max_rows, interval, failed_log):
+        self.database = database
+        self.max_rows = max_rows
+        self.interval = interval
+        self.failed_log = failed_log
+        self._queue = queue.Queue(maxsize=capacity)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'flushed_rows': 0,
+            'failed_rows': 0,
+            'refused_rows': 0,
+            'commits': 0,
+            'max_depth': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='attendance-write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, student_id, schedule_id, latitude, longitude):
+        """Queue a scan; returns False when the buffer is full or draining."""
+        if self._stop.is_set():
+            return False
+        try:
+            self._queue.put_nowait((student_id, schedule_id, datetime.now(), latitude, longitude))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Write `batch` in one transaction; returns the rows for the journal and the ids no longer Present."""
+        with repository_session(self.database) as repo:
+            try:
+                rows, transitions, unapproved = [], [], []
+                for student_id, schedule_id, scanned_at, latitude, longitude in batch:
+                    status, verification, clustered = scan_status(repo, student_id, schedule_id, scanned_at,
+                                                                  latitude, longitude)
+                    attendance_id, transition = rollup.record_scan(
+                        repo, student_id, schedule_id, status, verification, latitude, longitude, scanned_at)
+                    flagged, taken_back = flag_clustered(repo, clustered)
+                    rows.append((attendance_id, student_id, schedule_id, scanned_at, status, verification, latitude, longitude))
+                    transitions += [transition, *flagged]
+                    unapproved += taken_back
+                rollup.apply(repo, transitions)
+                repo.commit()
+            except (RepositoryError, ValueError):
+                repo.rollback()
+                raise
+        return rows, unapproved
+
+    def _keep_failed(self, scan, error):
+        """Append a scan that could not be written to the failed log, so it can be replayed by hand."""
+        student_id, schedule_id, scanned_at, latitude, longitude = scan
+        print(f"❌ Write-behind scan of student {student_id} for schedule {schedule_id} failed: {error}")
+        line = json.dumps({"student_id": student_id, "schedule_id": schedule_id,
+                           "timestamp": scanned_at.strftime("%Y-%m-%d %H:%M:%S"),
+                           "latitude": latitude, "longitude": longitude, "error": str(error)})
+        try:
+            with open(self.failed_log, 'a') as handle:
+                handle.write(line + '\n')
+                handle.flush()
+                os.fsync(handle.fileno())
+        except OSError as e:
+            print(f"❌ Could not keep the failed scan in {self.failed_log} ({e}): {line}")
+        with self._lock:
+            self._stats['failed_rows'] += 1
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        commits = 1
+        try:
+            rows, unapproved = self._write(batch)
+        except (RepositoryError, ValueError):
+            # One bad scan must not take the rest of the batch with it
+            rows, unapproved, commits = [], [], 0
+            for scan in batch:
+                try:
+                    scan_rows, scan_unapproved = self._write([scan])
+                    rows += scan_rows
+                    unapproved += scan_unapproved
+                    commits += 1
+                except rollup.ScanRefused:
+                    with self._lock:
+                        self._stats['refused_rows'] += 1
+                except (RepositoryError, ValueError) as row_error:
+                    self._keep_failed(scan, row_error)
+            if not rows:
+                return
+
+        journal = get_journal()
+        for attendance_id, student_id, schedule_id, scanned_at, status, verification, latitude, longitude in rows:
+            journal.append({
+                "attendance_id": attendance_id,
+                "student_id": student_id,
+                "schedule_id": schedule_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "timestamp": scanned_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": status,
+                "verification": verification
+            })
+        for row_id in unapproved:
+            journal.update_status(row_id, "Pending")
+        attendance_changes.notify()
+
+        with self._lock:
+            self._stats['flushed_rows'] += len(rows)
+            self._stats['commits'] += commits
+            self._stats['last_batch_size'] = len(rows)
+            self._stats['last_flush_ms'] = (time.monotonic() - started) * 1000
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def drain(self, timeout=10.0):
+        """Stop accepting scans and block until everything queued is committed."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(depth=self._queue.qsize(), capacity=self._queue.maxsize,
+                     draining=self._stop.is_set())
+        return stats
+
+
+def enabled():
+    return config_value('ATTENDANCE_WRITE_BEHIND')
+
+
+def get_write_behind(database):
+    """Return the process-wide scan queue, starting its flusher on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                # Set up the pool now, while the app config is available to pick and size it.
+                prepare_backend(database)
+                _queue = WriteBehindQueue(
+                    database,
+                    capacity=config_value('WRITE_BEHIND_QUEUE_SIZE'),
+                    max_rows=config_value('WRITE_BEHIND_MAX_ROWS'),
+                    interval=config_value('WRITE_BEHIND_INTERVAL_MS') / 1000,
+                    failed_log=config_value('WRITE_BEHIND_FAILED_LOG'),
+                )
+    return _queue
+
+
+def _reset_after_fork():
+    # The flusher thread was not copied; scans still queued are the parent's to commit
+    global _queue, _queue_lock
+    _queue, _queue_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def drain_write_behind():
+    if _queue is not None:
+        _queue.drain()
+
+
+def write_behind_stats():
+    return _queue.stats() if _queue is not None else None
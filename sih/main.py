@@ -1,22 +1,105 @@
-from flask import Flask, redirect, url_for, render_template
-from admin.app import admin_bp
+"""Builds the portal app. Nothing here connects to the database.
+
+Pools, connections, the login verifier processes and the caches are created on
+first use by the process that needs them, and a forked worker drops whatever it
+inherited, so a pre-fork server can build the app once and fork:
+
+    gunicorn -w 4 --preload 'main:create_app()'
+
+Set WARM_UP to have a worker open its connections, fill the lookup caches and
+start the login verifiers before its first request (see `warm_up`).
+"""
+from flask import Flask
+from admin.app import admin_bp, warm_lookups
 from student.app import student_bp
-from teacher.teacher_app import teacher_bp
+from teacher.teacher_app import teacher_bp, teacher_api_bp
+from common import absences, assets, db, repository, metrics
+from common.credentials import shutdown_executor, start_executor
+from common.journal import close_journal
+from common.repository import RepositoryError, repository_session
+from common.write_behind import drain_write_behind
+import atexit
+
+# Defaults used when neither the environment nor create_app's config overrides them.
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'super_secret_key',
+    'DB_POOL_SIZE': 10,
+    # Set to True to acknowledge QR scans immediately and commit them in batches
+    'ATTENDANCE_WRITE_BEHIND': False,
+    # Warm each worker up at startup (asgi.py's lifespan, `python main.py`)
+    'WARM_UP': False,
+}
+
+# Flush any batched attendance journal writes on shutdown, after
+# the write-behind queue has committed what it still holds
+atexit.register(close_journal)
+atexit.register(drain_write_behind)
+atexit.register(shutdown_executor)
+atexit.register(absences.stop_finalizer)
+
+
+def create_app(config=None):
+    """The portal app, configured from DEFAULT_CONFIG, FLASK_* environment variables and `config`."""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    # e.g. FLASK_DB_HOST, FLASK_SECRET_KEY, FLASK_DEBUG=1
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+
+    # Shared MySQL connection pool, returned to the pool after each request
+    db.init_app(app)
+    # Data access layer; set DB_BACKEND = "sqlite" to run on a local SQLite file instead of MySQL
+    repository.init_app(app)
+    # Per-route latency, SQL and journal timings at /metrics; set SLOW_REQUEST_MS to log slow requests
+    metrics.init_app(app)
+    # Absent rows for students who never scanned; set ABSENCE_FINALIZER to finalize classes as they end
+    absences.init_app(app)
+    # Bundled, precompressed page scripts and styles at /assets/ (build them with `python -m common.assets build`)
+    assets.init_app(app)
 
-app = Flask(__name__)
-app.secret_key = "super_secret_key"
+    # Register blueprints
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(student_bp)
+    app.register_blueprint(teacher_bp)
+    app.register_blueprint(teacher_api_bp)
+    app.add_url_rule("/", "index", index)
+    return app
 
-# Register blueprints
-app.register_blueprint(admin_bp)
-app.register_blueprint(student_bp)
-app.register_blueprint(teacher_bp)
 
 # Default route
-@app.route("/")
 def index():
     # Now it will look for templates/index.html
-    return render_template("index.html")
+    return assets.render_page("index.html")
+
+
+def warm_up(app):
+    """Open a connection per database, fill the lookup caches and start the background workers.
+
+    Call it in each worker after the fork (e.g. gunicorn's post_worker_init);
+    anything opened before the fork is dropped by the child anyway.
+    """
+    with app.app_context():
+        try:
+            for database in {app.config['DB_NAME'], app.config['STUDENT_DB_NAME']}:
+                with repository_session(database):
+                    pass
+            warm_lookups()
+        except RepositoryError as e:
+            app.logger.warning("Warm-up skipped the database: %s", e)
+        start_executor()
+        absences.start_finalizer(app)
 
-if __name__ == "__main__":
-    app.run(debug=True)
 
+def __getattr__(name):
+    # `from main import app` and `gunicorn main:app` still work; the app is built on first access
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    app = create_app()
+    if app.config["WARM_UP"]:
+        warm_up(app)
+    app.run(debug=app.config["DEBUG"])
@@ -0,0 +1,150 @@
+"""Reconcile sqlquery (portal) and dataset_student_portal.sql (adm) into one schema.
+
+Both scripts defined an attendance table with different shapes. The app
+writes the scan shape (id, schedule_id, date, status, latitude, longitude),
+so that becomes the only `attendance` table; any earlier per-day
+`Attendance`/`attendance` table is renamed to *_legacy and its rows copied in.
+"""
+from common.migrate import table_exists, column_exists, column_type, add_column, add_index
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS Admins (
+        admin_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Teachers (
+        teacher_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Batches (
+        batch_id INT AUTO_INCREMENT PRIMARY KEY,
+        batch_name VARCHAR(50) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Classes (
+        class_id INT AUTO_INCREMENT PRIMARY KEY,
+        class_name VARCHAR(255) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Subjects (
+        subject_id INT AUTO_INCREMENT PRIMARY KEY,
+        subject_name VARCHAR(255) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Students (
+        student_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        batch VARCHAR(50) NOT NULL,
+        class_id INT NULL,
+        INDEX (batch),
+        CONSTRAINT fk_students_classes FOREIGN KEY (class_id) REFERENCES Classes(class_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Schedules (
+        schedule_id INT AUTO_INCREMENT PRIMARY KEY,
+        class_id INT,
+        subject_id INT,
+        teacher_id INT,
+        batch VARCHAR(50) NOT NULL,
+        day_of_week VARCHAR(20) NOT NULL,
+        start_time TIME NOT NULL,
+        end_time TIME NOT NULL,
+        FOREIGN KEY (class_id) REFERENCES Classes(class_id) ON DELETE SET NULL,
+        FOREIGN KEY (subject_id) REFERENCES Subjects(subject_id) ON DELETE SET NULL,
+        FOREIGN KEY (teacher_id) REFERENCES Teachers(teacher_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        student_id INT NOT NULL,
+        schedule_id INT NULL,
+        date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        attendance_date DATE GENERATED ALWAYS AS (DATE(date)) STORED,
+        status VARCHAR(20) NOT NULL DEFAULT 'Pending',
+        latitude DECIMAL(10, 8),
+        longitude DECIMAL(11, 8),
+        updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+        UNIQUE KEY uq_attendance_daily (student_id, schedule_id, attendance_date),
+        FOREIGN KEY (student_id) REFERENCES Students(student_id) ON DELETE CASCADE,
+        FOREIGN KEY (schedule_id) REFERENCES Schedules(schedule_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance_log (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        student_id INT,
+        qr_code VARCHAR(255),
+        latitude DECIMAL(10, 8),
+        longitude DECIMAL(11, 8),
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (student_id) REFERENCES Students(student_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        student_id INT,
+        subject VARCHAR(100),
+        marks INT,
+        grade VARCHAR(5),
+        FOREIGN KEY (student_id) REFERENCES Students(student_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS schedule (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        day VARCHAR(50),
+        time VARCHAR(50),
+        subject VARCHAR(100)
+    )
+    """,
+]
+
+
+def upgrade(cursor):
+    # Per-day attendance tables from sqlquery (attendance_date, ENUM status) move aside.
+    legacy = []
+    for name in ('Attendance', 'attendance'):
+        if table_exists(cursor, name) and column_exists(cursor, name, 'attendance_date') \
+                and not column_exists(cursor, name, 'latitude'):
+            cursor.execute(f"RENAME TABLE {name} TO {name}_legacy")
+            legacy.append(f"{name}_legacy")
+
+    for ddl in TABLES:
+        cursor.execute(ddl)
+
+    # An attendance table created from dataset_student_portal.sql gains the missing columns.
+    add_column(cursor, 'attendance', 'schedule_id', "INT NULL AFTER student_id")
+    if column_type(cursor, 'attendance', 'date') == 'timestamp':
+        cursor.execute("ALTER TABLE attendance MODIFY date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP")
+    add_column(cursor, 'attendance', 'attendance_date', "DATE GENERATED ALWAYS AS (DATE(date)) STORED AFTER date")
+    add_column(cursor, 'attendance', 'updated_at',
+               "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+    add_index(cursor, 'attendance', 'uq_attendance_daily', 'student_id, schedule_id, attendance_date', unique=True)
+
+    for table in legacy:
+        cursor.execute(f"""
+            INSERT IGNORE INTO attendance (student_id, schedule_id, date, status)
+            SELECT student_id, schedule_id, COALESCE(timestamp, attendance_date),
+                   CONCAT(UPPER(LEFT(status, 1)), SUBSTRING(status, 2))
+            FROM {table}
+        """)
+
+    cursor.execute("INSERT IGNORE INTO Admins (name, email, password) VALUES ('Admin User', 'admin@example.com', 'admin123')")
+    cursor.execute("INSERT IGNORE INTO Batches (batch_name) VALUES ('B1'), ('B2'), ('B3'), ('B4'), ('B5'), ('B6')")
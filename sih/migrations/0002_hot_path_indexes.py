@@ -0,0 +1,15 @@
+"""Indexes for the queries registered in common.migrate.HOT_QUERIES."""
+from common.migrate import add_index
+
+
+def upgrade(cursor):
+    # today_attendance: date range for the current day
+    add_index(cursor, 'attendance', 'idx_attendance_date', 'date')
+    # attendance_feed: changes for one schedule after a (updated_at, id) cursor
+    add_index(cursor, 'attendance', 'idx_attendance_feed', 'schedule_id, updated_at, id')
+    # get_attendance / get_attendance_logs: one student's history, newest first
+    add_index(cursor, 'attendance_log', 'idx_attendance_log_student_time', 'student_id, timestamp')
+    # get_schedules and the teacher/batch/classroom conflict checks
+    add_index(cursor, 'Schedules', 'idx_schedules_teacher_day', 'teacher_id, day_of_week, start_time')
+    add_index(cursor, 'Schedules', 'idx_schedules_batch_day', 'batch, day_of_week, start_time')
+    add_index(cursor, 'Schedules', 'idx_schedules_class_day', 'class_id, day_of_week, start_time')
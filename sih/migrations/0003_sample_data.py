@@ -0,0 +1,33 @@
+"""Sample teacher, students and results previously inserted by the hand-run scripts."""
+
+
+def upgrade(cursor):
+    cursor.execute("INSERT IGNORE INTO Teachers (name, email, password) VALUES ('Shubham Shubhi', 'shubhamshubhi@tr.com', '123')")
+    cursor.execute("""
+        INSERT IGNORE INTO Students (name, email, password, batch) VALUES
+        ('Mradul Goyal', 'mradul@example.com', '12345', 'B1'),
+        ('Rashmi Sharma', 'rashmi@example.com', 'abc123', 'B1')
+    """)
+    cursor.execute("SELECT COUNT(*) FROM schedule")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO schedule (day, time, subject) VALUES
+            ('Monday', '9:00 - 11:00', 'Mathematics'),
+            ('Tuesday', '10:00 - 12:00', 'Physics'),
+            ('Wednesday', '11:00 - 1:00', 'Chemistry')
+        """)
+    cursor.execute("SELECT COUNT(*) FROM results")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO results (student_id, subject, marks, grade)
+            SELECT s.student_id, r.subject, r.marks, r.grade
+            FROM Students s
+            JOIN (
+                SELECT 'mradul@example.com' AS email, 'Math' AS subject, 88 AS marks, 'A' AS grade
+                UNION ALL SELECT 'mradul@example.com', 'Physics', 79, 'B+'
+                UNION ALL SELECT 'mradul@example.com', 'Chemistry', 92, 'A+'
+                UNION ALL SELECT 'rashmi@example.com', 'Math', 75, 'B'
+                UNION ALL SELECT 'rashmi@example.com', 'Physics', 85, 'A'
+                UNION ALL SELECT 'rashmi@example.com', 'Chemistry', 80, 'B+'
+            ) r ON r.email = s.email
+        """)
@@ -0,0 +1,12 @@
+"""Classroom coordinates and radius for geofence checks, plus the verdict on each scan."""
+from common.migrate import add_column, add_index
+
+
+def upgrade(cursor):
+    add_column(cursor, 'Classes', 'latitude', "DECIMAL(10, 8) NULL")
+    add_column(cursor, 'Classes', 'longitude', "DECIMAL(11, 8) NULL")
+    add_column(cursor, 'Classes', 'radius_m', "INT NOT NULL DEFAULT 50")
+    # inside / outside / no_location / duplicate_location, NULL when the room has no fence
+    add_column(cursor, 'attendance', 'verification', "VARCHAR(32) NULL AFTER status")
+    # the verification sweep reads one schedule's pending scans
+    add_index(cursor, 'attendance', 'idx_attendance_schedule_status', 'schedule_id, status, date')
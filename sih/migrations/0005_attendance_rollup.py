@@ -0,0 +1,31 @@
+"""Monthly per student x schedule attendance counts, backfilled from the existing rows."""
+
+# The backfill as of this version; the table gains columns in later migrations
+BACKFILL = """
+    INSERT INTO attendance_rollup (student_id, schedule_id, month, present, denied, pending)
+    SELECT student_id, schedule_id, DATE_FORMAT(date, '%Y-%m-01'),
+           SUM(status = 'Present'), SUM(status = 'Denied'), SUM(status = 'Pending')
+    FROM attendance
+    WHERE schedule_id IS NOT NULL
+    GROUP BY student_id, schedule_id, DATE_FORMAT(date, '%Y-%m-01')
+"""
+
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_rollup (
+            student_id INT NOT NULL,
+            schedule_id INT NOT NULL,
+            month DATE NOT NULL,
+            present INT NOT NULL DEFAULT 0,
+            denied INT NOT NULL DEFAULT 0,
+            pending INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, schedule_id, month),
+            INDEX idx_rollup_schedule_month (schedule_id, month),
+            FOREIGN KEY (student_id) REFERENCES Students(student_id) ON DELETE CASCADE,
+            FOREIGN KEY (schedule_id) REFERENCES Schedules(schedule_id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("SELECT COUNT(*) FROM attendance_rollup")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(BACKFILL)
@@ -0,0 +1,20 @@
+"""Absent rows for students who never scanned: a rollup counter, the finalized-class ledger and its index."""
+from common.migrate import add_column, add_index
+
+
+def upgrade(cursor):
+    add_column(cursor, 'attendance_rollup', 'absent', "INT NOT NULL DEFAULT 0 AFTER pending")
+    # one class's rows on one day: the finalizer's held check and the roster's absentee count
+    add_index(cursor, 'attendance', 'idx_attendance_schedule_day', 'schedule_id, attendance_date')
+    # a row per (class, day) already finalized; the primary key is the claim that makes re-runs no-ops
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS finalized_slots (
+            schedule_id INT NOT NULL,
+            class_date DATE NOT NULL,
+            finalized_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            absent INT NOT NULL DEFAULT 0,
+            expired INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (schedule_id, class_date),
+            FOREIGN KEY (schedule_id) REFERENCES Schedules(schedule_id) ON DELETE CASCADE
+        )
+    """)
@@ -0,0 +1,117 @@
+"""Coroutine versions of the student scan and read endpoints, served by asgi.py.
+
+They take the parsed request and the shared AsyncRepositoryPool and return
+(payload, status[, headers]); asgi.py runs them inside an app context and
+serializes the payload. The sync views in app.py stay registered on the
+blueprint and keep serving WSGI deployments.
+"""
+import asyncio
+from datetime import datetime
+from operator import methodcaller
+
+from werkzeug.http import parse_etags
+
+from common import rollup, write_behind
+from common.db import config_value
+from common.feed import attendance_changes
+from common.geofence import parse_coordinates
+from common.pagination import decode_cursor, encode_cursor, page_size, date_window
+from common.qr_tokens import verify_token, get_replay_cache
+from common.repository import RepositoryError
+from common.timetable import fresh_batch_timetable
+from student.app import store_scan, journal_entry, journal_scan, scan_message, load_schedule
+
+
+def db_unavailable():
+    return {"status": "fail", "message": "DB connection failed"}, 500
+
+
+def paged(rows, next_position):
+    headers = {"X-Next-Cursor": encode_cursor(*next_position)} if next_position is not None else {}
+    return rows, 200, headers
+
+
+async def mark_attendance(request, db):
+    student_id = request.session.get("student_id")
+    if student_id is None:
+        return {"status": "fail", "message": "Unauthorized"}, 403
+
+    data = request.get_json() or {}
+    token = data.get("qr_code")
+    try:
+        latitude, longitude = parse_coordinates(data.get("latitude"), data.get("longitude"))
+    except ValueError as e:
+        return {"status": "fail", "message": str(e)}, 400
+
+    # Forged, expired and replayed scans are turned away without a DB round trip
+    schedule_id = verify_token(token)
+    if schedule_id is None:
+        return {"status": "fail", "message": "QR code is invalid or has expired. Scan the current code."}, 400
+    replays = get_replay_cache()
+    replay_key = (token, student_id)
+    if not replays.check_and_add(replay_key):
+        return {"status": "fail", "message": "Attendance already submitted for this code."}, 409
+
+    if write_behind.enabled():
+        scans = write_behind.get_write_behind(config_value("STUDENT_DB_NAME"))
+        if scans.submit(student_id, schedule_id, latitude, longitude):
+            return {"status": "success", "message": scan_message("Pending")}, 200
+
+    try:
+        # The whole transaction is one hop to a DB thread; this coroutine just waits for it
+        attendance_id, status, verification, unapproved = await db.run(
+            store_scan, student_id, schedule_id, latitude, longitude)
+    except rollup.ScanRefused as e:
+        return {"status": "fail", "message": str(e)}, 409
+    except Exception as e:
+        replays.discard(replay_key)
+        return {"status": "fail", "message": str(e)}, 500
+
+    entry = journal_entry(attendance_id, student_id, schedule_id, latitude, longitude, status, verification)
+    await asyncio.get_running_loop().run_in_executor(None, journal_scan, entry, unapproved)
+    attendance_changes.notify()
+    return {"status": "success", "message": scan_message(status)}, 200
+
+
+async def get_schedule(request, db):
+    student_id = request.session.get("student_id")
+    if student_id is None:
+        return {"status": "fail", "message": "Unauthorized"}, 403
+    batch = request.session.get("batch")
+    # A cached timetable is served without taking a DB thread at all
+    entry = fresh_batch_timetable(batch) if batch is not None else None
+    if entry is None:
+        try:
+            entry = await db.run(load_schedule, student_id, batch)
+        except RepositoryError:
+            return db_unavailable()
+    headers = {"ETag": f'"{entry.etag}"', "Cache-Control": "no-cache"}
+    if parse_etags(request.headers.get("if-none-match")).contains(entry.etag):
+        return b"", 304, headers
+    return entry.body, 200, headers
+
+
+async def get_results(request, db, student_id):
+    try:
+        after = decode_cursor(request.args["cursor"], int, int) if request.args.get("cursor") else None
+    except ValueError as e:
+        return {"status": "fail", "message": str(e)}, 400
+    try:
+        return paged(*await db.run(methodcaller(
+            "results_page", student_id, after, page_size(request.args.get("limit", type=int)))))
+    except RepositoryError:
+        return db_unavailable()
+
+
+async def get_attendance(request, db, student_id):
+    try:
+        after = decode_cursor(request.args["cursor"], datetime, int) if request.args.get("cursor") else None
+        date_from, date_before = date_window(request.args)
+    except ValueError as e:
+        return {"status": "fail", "message": str(e)}, 400
+    try:
+        return paged(*await db.run(methodcaller(
+            "attendance_log_page", student_id, date_from, date_before, after,
+            page_size(request.args.get("limit", type=int)))))
+    except RepositoryError:
+        return db_unavailable()
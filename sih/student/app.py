@@ -1,8 +1,17 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, session
-import mysql.connector
-import json
-import os
-from datetime import datetime
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from datetime import datetime, date
+from common.db import config_value
+from common.repository import get_repository, RepositoryError
+from common.journal import get_journal
+from common import admission, write_behind, rollup
+from common.feed import attendance_changes
+from common.export import stream_export
+from common.geofence import parse_coordinates, scan_status, flag_clustered
+from common.qr_tokens import verify_token, get_replay_cache
+from common.credentials import authenticate, LoginBusy
+from common.pagination import page_size, decode_cursor, date_window, paged_response
+from common.timetable import cached_batch_timetable, load_batch_timetable
+from common.assets import render_page
 
 # Create Blueprint for student
 student_bp = Blueprint(
@@ -11,29 +20,96 @@ student_bp = Blueprint(
     template_folder='templates'
 )
 
-# MySQL Database Connection
-db = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="adm"
-)
-cursor = db.cursor(dictionary=True)
+# Rate and concurrency limits for the scan path (see common/admission.py)
+student_bp.before_request(admission.admit_request)
+student_bp.teardown_request(admission.release_request)
+
+# Repository for the student database (pooled connection, checked out per request)
+def get_student_db():
+    return get_repository(config_value("STUDENT_DB_NAME"))
+
+def db_unavailable():
+    return jsonify({"status": "fail", "message": "DB connection failed"}), 500
+
+def required_student_db():
+    db = get_student_db()
+    if not db:
+        raise RepositoryError("DB connection failed")
+    return db
+
+def load_schedule(db, student_id, batch=None):
+    """Cache entry for the student's batch timetable; looks the batch up when the session predates it."""
+    if batch is None:
+        batch = db.student_batch(student_id)
+    return load_batch_timetable(db, batch)
+
+def store_scan(db, student_id, schedule_id, latitude, longitude):
+    """Writes one scan and its rollup counts in a single transaction.
+
+    Returns (attendance_id, status, verification, unapproved): the last are
+    ids of other students' scans from the same spot that went back to Pending.
+    """
+    scanned_at = datetime.now()
+    # ✅ Geofence check: scans inside the classroom fence are approved right away,
+    # unless another student already scanned from the very same spot
+    status, verification, clustered = scan_status(db, student_id, schedule_id, scanned_at, latitude, longitude)
+    # ✅ Insert attendance (anything not auto-approved stays Pending for the teacher)
+    attendance_id, transition = rollup.record_scan(db, student_id, schedule_id, status, verification,
+                                                   latitude, longitude, scanned_at)
+    flagged, unapproved = flag_clustered(db, clustered)
+    # ✅ Keep the monthly attendance counts in step, in the same transaction
+    rollup.apply(db, [transition, *flagged])
+    db.commit()
+    return attendance_id, status, verification, unapproved
+
+def journal_entry(attendance_id, student_id, schedule_id, latitude, longitude, status, verification):
+    return {
+        "attendance_id": attendance_id,
+        "student_id": student_id,
+        "schedule_id": schedule_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": status,
+        "verification": verification
+    }
+
+def journal_scan(entry, unapproved):
+    """Journals a stored scan and the same-spot scans it took back from Present."""
+    journal = get_journal()
+    journal.append(entry)
+    for row_id in unapproved:
+        journal.update_status(row_id, "Pending")
+
+def scan_message(status):
+    if status == "Present":
+        return "Attendance marked present."
+    return "Attendance submitted. Waiting for teacher approval."
 
 # Routes
 @student_bp.route("/")
 def home():
-    return render_template("full_style.html")
+    return render_page("full_style.html")
 
 @student_bp.route("/login", methods=["POST"])
 def login():
     email = request.form.get("email")
     password = request.form.get("password")
-    cursor.execute("SELECT * FROM students WHERE email=%s AND password=%s", (email, password))
-    user = cursor.fetchone()
+    db = get_student_db()
+    if not db:
+        return db_unavailable()
+    try:
+        user = authenticate(db, "Students", email, password,
+                            columns="student_id, name, email, batch, class_id")
+    except LoginBusy:
+        return jsonify({"status": "fail", "message": "Too many logins right now, please try again."}), 503, {"Retry-After": "1"}
+    except RepositoryError as e:
+        return jsonify({"status": "fail", "message": str(e)}), 500
     if user:
+        db.commit()  # keeps an upgraded password hash
         # ✅ Save student session
         session["student_id"] = user["student_id"]
+        session["batch"] = user["batch"]
         return jsonify({"status": "success", "user": user})
     else:
         return jsonify({"status": "fail", "message": "Invalid Email or Password"})
@@ -44,84 +120,131 @@ def mark_attendance():
     if "student_id" not in session:
         return jsonify({"status": "fail", "message": "Unauthorized"}), 403
 
-    data = request.get_json()
+    data = request.get_json() or {}
     student_id = session["student_id"]         # ✅ from session
-    schedule_id = data.get("schedule_id")      # ✅ from QR code
-    latitude = data.get("latitude")
-    longitude = data.get("longitude")
-
-    if not schedule_id:
-        return jsonify({"status": "fail", "message": "Schedule ID is required"}), 400
-
+    token = data.get("qr_code")                # ✅ signed, rotating token from the teacher's screen
     try:
-        # ✅ Insert attendance as Pending (teacher will approve/deny)
-        cursor.execute(
-            """
-            INSERT INTO attendance (student_id, schedule_id, date, status, latitude, longitude)
-            VALUES (%s, %s, NOW(), 'Pending', %s, %s)
-            ON DUPLICATE KEY UPDATE
-                date = NOW(),
-                latitude = VALUES(latitude),
-                longitude = VALUES(longitude),
-                status = 'Pending'
-            """,
-            (student_id, schedule_id, latitude, longitude)
-        )
-        db.commit()
-
-        # ✅ Save in JSON log for backup
-        log_entry = {
-            "student_id": student_id,
-            "schedule_id": schedule_id,
-            "latitude": latitude,
-            "longitude": longitude,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "status": "Pending"
-        }
-
-        log_file = "attendance_log.json"
-        if os.path.exists(log_file):
-            with open(log_file, "r") as f:
-                logs = json.load(f)
-        else:
-            logs = []
-
-        logs.append(log_entry)
+        latitude, longitude = parse_coordinates(data.get("latitude"), data.get("longitude"))
+    except ValueError as e:
+        return jsonify({"status": "fail", "message": str(e)}), 400
+
+    # ✅ Checked without touching the DB: forged, expired and replayed scans stop here
+    schedule_id = verify_token(token)
+    if schedule_id is None:
+        return jsonify({"status": "fail", "message": "QR code is invalid or has expired. Scan the current code."}), 400
+    replays = get_replay_cache()
+    replay_key = (token, student_id)
+    if not replays.check_and_add(replay_key):
+        return jsonify({"status": "fail", "message": "Attendance already submitted for this code."}), 409
+
+    # ✅ Write-behind mode: acknowledge now, commit in batches in the background
+    if write_behind.enabled():
+        scans = write_behind.get_write_behind(config_value("STUDENT_DB_NAME"))
+        if scans.submit(student_id, schedule_id, latitude, longitude):
+            return jsonify({"status": "success", "message": scan_message("Pending")})
+        # Buffer full or draining: fall through to a direct write
+
+    db = get_student_db()
+    if not db:
+        replays.discard(replay_key)
+        return db_unavailable()
+    try:
+        attendance_id, status, verification, unapproved = store_scan(db, student_id, schedule_id, latitude, longitude)
 
-        with open(log_file, "w") as f:
-            json.dump(logs, f, indent=4)
+        # ✅ Append to the attendance journal for backup (no rewrite of history)
+        journal_scan(journal_entry(attendance_id, student_id, schedule_id, latitude, longitude, status, verification),
+                     unapproved)
+        attendance_changes.notify()
 
-        return jsonify({"status": "success", "message": "Attendance submitted. Waiting for teacher approval."})
+        return jsonify({"status": "success", "message": scan_message(status)})
 
+    except rollup.ScanRefused as e:
+        db.rollback()
+        return jsonify({"status": "fail", "message": str(e)}), 409
     except Exception as e:
         db.rollback()
+        replays.discard(replay_key)
         return jsonify({"status": "fail", "message": str(e)}), 500
 
-# ✅ Download JSON Log
+# ✅ Download Attendance Export (filtered, streamed from the DB, optional gzip)
 @student_bp.route("/download_attendance_log")
 def download_attendance_log():
-    log_file = "attendance_log.json"
-    if os.path.exists(log_file):
-        return send_file(log_file, as_attachment=True)
+    """Streams attendance as NDJSON or CSV.
+
+    Query params: from, to (YYYY-MM-DD, inclusive), batch, schedule_id,
+    student_id, format (ndjson|csv), gzip (1/true). Students only ever get
+    their own rows and teachers only their own schedules.
+    """
+    if session.get("admin_logged_in"):
+        scope = {}
+    elif session.get("user_type") == "teacher":
+        scope = {"teacher_id": session.get("user_id")}
+    elif "student_id" in session:
+        scope = {"student_id": session["student_id"]}
     else:
-        return jsonify({"status": "fail", "message": "Log file not found"}), 404
+        return jsonify({"status": "fail", "message": "Unauthorized"}), 403
 
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"status": "fail", "message": "format must be ndjson or csv"}), 400
+    try:
+        filters = {
+            "date_from": date.fromisoformat(request.args["from"]) if request.args.get("from") else None,
+            "date_to": date.fromisoformat(request.args["to"]) if request.args.get("to") else None,
+            "batch": request.args.get("batch") or None,
+            "schedule_id": request.args.get("schedule_id", type=int),
+            "student_id": request.args.get("student_id", type=int),
+        }
+    except ValueError:
+        return jsonify({"status": "fail", "message": "Dates must be YYYY-MM-DD"}), 400
+    filters.update(scope)
+    compress = request.args.get("gzip", "").lower() in ("1", "true")
+
+    filename = f"attendance.{fmt}" + (".gz" if compress else "")
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    return Response(
+        stream_with_context(stream_export(filters, fmt, compress, config_value("STUDENT_DB_NAME"))),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ✅ Weekly timetable of the student's batch, from the per-batch cache
 @student_bp.route("/get_schedule")
 def get_schedule():
-    cursor.execute("SELECT * FROM schedule")
-    return jsonify(cursor.fetchall())
+    if "student_id" not in session:
+        return jsonify({"status": "fail", "message": "Unauthorized"}), 403
+    try:
+        if "batch" not in session:
+            session["batch"] = required_student_db().student_batch(session["student_id"])
+        return cached_batch_timetable(required_student_db, session["batch"])
+    except RepositoryError:
+        return db_unavailable()
 
 @student_bp.route("/get_results/<int:student_id>")
 def get_results(student_id):
-    cursor.execute("SELECT * FROM results WHERE student_id=%s", (student_id,))
-    return jsonify(cursor.fetchall())
+    db = get_student_db()
+    if not db:
+        return db_unavailable()
+    try:
+        after = decode_cursor(request.args["cursor"], int, int) if request.args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"status": "fail", "message": str(e)}), 400
+    rows, next_position = db.results_page(student_id, after, page_size(request.args.get("limit", type=int)))
+    return paged_response(rows, next_position)
 
 @student_bp.route("/get_attendance/<int:student_id>")
 def get_attendance(student_id):
-    cursor.execute(
-        "SELECT * FROM attendance_log WHERE student_id=%s ORDER BY timestamp DESC",
-        (student_id,)
-    )
-    return jsonify(cursor.fetchall())
+    db = get_student_db()
+    if not db:
+        return db_unavailable()
+    try:
+        after = decode_cursor(request.args["cursor"], datetime, int) if request.args.get("cursor") else None
+        date_from, date_before = date_window()
+    except ValueError as e:
+        return jsonify({"status": "fail", "message": str(e)}), 400
+    # Keyset pages over idx_attendance_log_student_time: week 1 and year 4 cost the same
+    rows, next_position = db.attendance_log_page(student_id, date_from, date_before, after,
+                                                 page_size(request.args.get("limit", type=int)))
+    return paged_response(rows, next_position)
 
 
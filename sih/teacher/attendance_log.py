@@ -1,40 +1,26 @@
-import mysql.connector
-from mysql.connector import Error
-
-# Database connection
-db = mysql.connector.connect(
-    host="localhost",
-    user="root",  # apna DB user
-    password="Oj@svigupt@17",  # apna DB password
-    database="adm"
-)
-cursor = db.cursor(dictionary=True)
+from datetime import timedelta
+from common.db import config_value
+from common.repository import repository_session, RepositoryError
+from common.pagination import page_size, DEFAULT_PAGE_SIZE
 
 # Function to log attendance
 def log_attendance(student_id, qr_code, latitude, longitude):
     try:
-        query = """
-        INSERT INTO attendance_log (student_id, qr_code, latitude, longitude)
-        VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(query, (student_id, qr_code, latitude, longitude))
-        db.commit()
+        with repository_session(config_value("STUDENT_DB_NAME")) as repo:
+            repo.log_scan(student_id, qr_code, latitude, longitude)
+            repo.commit()
         print(f"✅ Attendance logged for student_id={student_id}")
-    except Error as e:
+    except RepositoryError as e:
         print(f"❌ Error logging attendance: {e}")
 
 
-# Function to fetch all logs
-def get_attendance_logs(student_id=None):
+# Function to fetch logs one page at a time (newest first)
+def get_attendance_logs(student_id=None, limit=DEFAULT_PAGE_SIZE, after=None, date_from=None, date_to=None):
+    """Returns (rows, next_after); pass next_after back as `after` for the following page."""
+    date_before = date_to + timedelta(days=1) if date_to else None
     try:
-        if student_id:
-            cursor.execute(
-                "SELECT * FROM attendance_log WHERE student_id=%s ORDER BY timestamp DESC",
-                (student_id,)
-            )
-        else:
-            cursor.execute("SELECT * FROM attendance_log ORDER BY timestamp DESC")
-        return cursor.fetchall()
-    except Error as e:
+        with repository_session(config_value("STUDENT_DB_NAME")) as repo:
+            return repo.attendance_log_page(student_id, date_from, date_before, after, page_size(limit))
+    except RepositoryError as e:
         print(f"❌ Error fetching logs: {e}")
-        return []
+        return [], None
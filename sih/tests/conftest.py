@@ -0,0 +1,45 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import create_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """A portal on a throwaway SQLite database, with cheap password hashing and logins in-process."""
+    directory = tmp_path_factory.mktemp("portal")
+    return create_app({
+        "TESTING": True,
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": str(directory / "portal.db"),
+        "ATTENDANCE_JOURNAL_DIR": str(directory / "journal"),
+        "LOGIN_WORKERS": 0,
+        "IMPORT_HASH_WORKERS": 0,
+        "PASSWORD_HASH_ALGORITHM": "pbkdf2_sha256",
+        "PASSWORD_PBKDF2_ITERATIONS": 1000,
+    })
+
+
+@pytest.fixture(scope="session")
+def admin(app):
+    client = app.test_client()
+    client.post("/admin/", data={"email": "admin@example.com", "password": "admin123"})
+    return client
+
+
+def login(app, path, email, password="pw", json=False):
+    client = app.test_client()
+    if json:
+        client.post(path, json={"email": email, "password": password})
+    else:
+        client.post(path, data={"email": email, "password": password})
+    return client
+
+
+def today():
+    return datetime.now().strftime("%A")
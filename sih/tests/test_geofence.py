@@ -0,0 +1,43 @@
+from datetime import date
+
+from common.repository import repository_session
+
+from conftest import login, today
+
+FENCE = {"latitude": 12.9716, "longitude": 77.5946, "radius_m": 100}
+
+
+def test_scans_from_the_same_spot_are_not_auto_approved(app, admin):
+    admin.post("/admin/api/manage_classes", json={"action": "add", "class_name": "Geo room", **FENCE})
+    admin.post("/admin/api/manage_subjects", json={"action": "add", "subject_name": "Geo"})
+    admin.post("/admin/api/manage_batches", json={"action": "add", "batch_name": "GEO"})
+    admin.post("/admin/api/create_user", json={"user_type": "teacher", "name": "Geo teacher",
+                                               "email": "geo-teacher@example.com", "password": "pw"})
+    for name in ("one", "two", "three"):
+        admin.post("/admin/api/create_user", json={"user_type": "student", "name": f"Geo {name}",
+                                                   "email": f"geo-{name}@example.com", "password": "pw", "batch": "GEO"})
+    with app.app_context(), repository_session() as repo:
+        class_id = next(row["id"] for row in repo.lookup("classes") if row["name"] == "Geo room")
+        subject_id = next(row["id"] for row in repo.lookup("subjects") if row["name"] == "Geo")
+        teacher_id = next(row["id"] for row in repo.lookup("teachers") if row["name"] == "Geo teacher")
+    admin.post("/admin/api/schedule_class", json={"class_id": class_id, "subject_id": subject_id, "teacher_id": teacher_id,
+                                                  "batch": "GEO", "day_of_week": today(),
+                                                  "start_time": "00:00", "end_time": "23:59"})
+    with app.app_context(), repository_session() as repo:
+        schedule_id = repo.timetable(teacher_id=teacher_id)[0]["schedule_id"]
+
+    teacher = login(app, "/teacher/login", "geo-teacher@example.com", json=True)
+    token = teacher.get(f"/teacher/qr_token/{schedule_id}").get_json()["token"]
+    spot = {"latitude": FENCE["latitude"], "longitude": FENCE["longitude"]}
+    elsewhere = {"latitude": FENCE["latitude"] + 0.0002, "longitude": FENCE["longitude"]}  # ~22 m away, still inside
+    for name, position in (("one", spot), ("two", spot), ("three", elsewhere)):
+        student = login(app, "/student/login", f"geo-{name}@example.com")
+        response = student.post("/student/mark_attendance", json={"qr_code": token, **position})
+        assert response.status_code == 200, response.get_json()
+
+    with app.app_context(), repository_session() as repo:
+        rows = {row["student_name"]: row for row in repo.roster(teacher_id, schedule_id, date.today())}
+    for name in ("Geo one", "Geo two"):
+        assert rows[name]["status"] == "Pending"
+        assert rows[name]["verification"] == "duplicate_location"
+    assert rows["Geo three"]["status"] == "Present"
@@ -0,0 +1,26 @@
+from admin.schedule_conflicts import find_conflicts, from_db, normalize
+
+
+def slot(batch, start, end, teacher_id, class_id):
+    return {"class_id": class_id, "subject_id": 1, "teacher_id": teacher_id, "batch": batch,
+            "day_of_week": "Monday", "start_time": start, "end_time": end}
+
+
+def test_batch_names_conflict_whatever_their_case():
+    existing = [from_db(dict(slot("B1", "09:00:00", "10:00:00", 1, 1), schedule_id=7))]
+    new, error = normalize(slot("b1", "09:30", "10:30", 2, 2))
+    assert error is None
+
+    conflicts = find_conflicts(existing, [dict(new, ref={"row": 1})])
+
+    assert [(c["resource"], c["value"], c["conflicts_with"]) for c in conflicts] == [("batch", "b1", {"schedule_id": 7})]
+    assert new["batch"] == "b1"  # stored as given; only the comparison ignores case
+
+
+def test_mixed_case_batches_inside_one_upload_conflict():
+    rows = [normalize(slot(batch, "11:00", "12:00", teacher_id, teacher_id))[0]
+            for teacher_id, batch in ((1, "CSE-A"), (2, "cse-a"), (3, "CSE-B"))]
+
+    conflicts = find_conflicts([], [dict(row, ref={"row": n}) for n, row in enumerate(rows, 1)])
+
+    assert [(c["schedule"], c["conflicts_with"]) for c in conflicts] == [({"row": 2}, {"row": 1})]